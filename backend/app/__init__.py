@@ -3,4 +3,6 @@ from app.auth.models import User
 from app.patients.models import Patient
 from app.medications.models import Medication, PatientMedication, InactiveMedication
 from app.reminders.models import Reminder, ReminderSchedule, WhatsAppMessage, NotificationPreference
-from app.adherence.models import MedicationLog, AdherenceStats, AdherenceGoal
\ No newline at end of file
+from app.adherence.models import MedicationLog, AdherenceStats, AdherenceStreakState, DailyAdherenceRollup, MaterializerCheckpoint, AdherenceGoal
+from app.analytics.models import AnalyticsSnapshot
+from app.cache.models import DataVersion
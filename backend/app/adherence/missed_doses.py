@@ -0,0 +1,265 @@
+"""
+Missed-dose materializer
+Expands active patient medications into expected dose slots and records a `missed`
+log for every slot that is past the grace window without any log
+"""
+import json
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, time as dt_time, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert, or_
+from sqlalchemy.orm import Session
+
+from app.adherence.models import MedicationLog, MaterializerCheckpoint, MedicationLogStatusEnum
+from app.adherence.stats_engine import AdherenceStatsEngine
+from app.cache.versions import DataVersions
+from app.config.settings import settings
+from app.database.dialects import conflict_insert
+from app.medications.models import PatientMedication, MedicationStatusEnum
+from app.reminders.models import ReminderSchedule
+
+JOB_NAME = "missed_doses"
+
+# Dose times used when a medication has no active reminder schedule
+DEFAULT_DOSE_TIMES = {
+    1: ["08:00"],
+    2: ["08:00", "20:00"],
+    3: ["08:00", "14:00", "20:00"],
+    4: ["08:00", "12:00", "16:00", "20:00"],
+}
+
+# A log this close to a slot counts as that slot's log (patients rarely log the exact minute);
+# narrowed to half the gap between neighbouring slots so one log never covers two
+SLOT_MATCH_MINUTES = 90
+
+
+def dose_times(times_per_day: int, reminder_times=None) -> List[dt_time]:
+    """Times of day a dose is expected, from the reminder schedule or times_per_day"""
+    if reminder_times:
+        if isinstance(reminder_times, str):
+            reminder_times = json.loads(reminder_times)
+        labels = reminder_times
+    elif times_per_day in DEFAULT_DOSE_TIMES:
+        labels = DEFAULT_DOSE_TIMES[times_per_day]
+    elif times_per_day and times_per_day > 0:
+        # Spread evenly between 08:00 and 20:00
+        step = 12 * 60 // (times_per_day - 1)
+        labels = [f"{(8 * 60 + i * step) // 60:02d}:{(8 * 60 + i * step) % 60:02d}" for i in range(times_per_day)]
+    else:
+        labels = []
+
+    return sorted({datetime.strptime(label, "%H:%M").time() for label in labels})
+
+
+def match_windows(times: List[dt_time]) -> Dict[dt_time, timedelta]:
+    """
+    How far from each dose time a log may be and still count as that dose:
+    SLOT_MATCH_MINUTES, or half the gap to the nearest neighbouring dose (across midnight) if smaller
+    """
+    minutes = [dose_time.hour * 60 + dose_time.minute for dose_time in times]
+    windows = {}
+    for index, dose_time in enumerate(times):
+        if len(times) == 1:
+            gap = 24 * 60
+        else:
+            previous_gap = (minutes[index] - minutes[index - 1]) % (24 * 60)
+            next_gap = (minutes[(index + 1) % len(times)] - minutes[index]) % (24 * 60)
+            gap = min(previous_gap, next_gap)
+        windows[dose_time] = timedelta(minutes=min(SLOT_MATCH_MINUTES, gap / 2))
+    return windows
+
+
+class MissedDoseMaterializer:
+    """Background job that writes `missed` logs in chunks, resumable from a checkpoint"""
+
+    @staticmethod
+    def run(db: Session, now: Optional[datetime] = None, chunk_size: Optional[int] = None) -> Dict[str, int]:
+        """
+        Materialize missed doses up to now minus the grace window.
+        Each chunk of patient medications is committed with the checkpoint, so a rerun
+        after a crash picks up at the next chunk; completed runs are never repeated.
+        """
+        now = now or datetime.now()
+        chunk_size = chunk_size or settings.MISSED_DOSE_CHUNK_SIZE
+
+        checkpoint = MissedDoseMaterializer._load_checkpoint(db)
+        resumed = checkpoint.run_cutoff is not None
+        if not resumed:
+            checkpoint.run_cutoff = now - timedelta(minutes=settings.MISSED_DOSE_GRACE_MINUTES)
+            checkpoint.last_patient_medication_id = 0
+            db.commit()
+
+        cutoff = checkpoint.run_cutoff
+        window_start = checkpoint.materialized_through or cutoff - timedelta(days=settings.MISSED_DOSE_LOOKBACK_DAYS)
+        summary = {"resumed": int(resumed), "chunks": 0, "medications_scanned": 0, "missed_logged": 0}
+
+        while window_start < cutoff:
+            chunk = MissedDoseMaterializer._next_chunk(
+                db, checkpoint.last_patient_medication_id, window_start, cutoff, chunk_size
+            )
+            if not chunk:
+                break
+
+            logged, patient_ids = MissedDoseMaterializer._materialize_chunk(db, chunk, window_start, cutoff)
+            summary["missed_logged"] += logged
+            summary["medications_scanned"] += len(chunk)
+            summary["chunks"] += 1
+
+            checkpoint.last_patient_medication_id = chunk[-1].id
+            for patient_id in patient_ids:
+                DataVersions.bump(db, "medication_logs", patient_id)
+            db.commit()
+
+        checkpoint.materialized_through = max(cutoff, checkpoint.materialized_through or cutoff)
+        checkpoint.run_cutoff = None
+        checkpoint.last_patient_medication_id = 0
+        db.commit()
+
+        return summary
+
+    # ==================== INTERNAL HELPERS ====================
+
+    @staticmethod
+    def _load_checkpoint(db: Session) -> MaterializerCheckpoint:
+        """Get (or create) this job's checkpoint row"""
+        checkpoint = db.query(MaterializerCheckpoint).filter(MaterializerCheckpoint.job_name == JOB_NAME).first()
+        if checkpoint is None:
+            checkpoint = MaterializerCheckpoint(job_name=JOB_NAME, last_patient_medication_id=0)
+            db.add(checkpoint)
+            db.flush()
+        return checkpoint
+
+    @staticmethod
+    def _next_chunk(db: Session, after_id: int, window_start: datetime, cutoff: datetime, chunk_size: int) -> list:
+        """Next page of active patient medications (keyset on id) with their schedule times"""
+        return db.query(
+            PatientMedication.id,
+            PatientMedication.patient_id,
+            PatientMedication.times_per_day,
+            PatientMedication.start_date,
+            PatientMedication.end_date,
+            ReminderSchedule.reminder_times,
+            ReminderSchedule.is_active.label('schedule_active')
+        ).outerjoin(
+            ReminderSchedule, ReminderSchedule.patient_medication_id == PatientMedication.id
+        ).filter(
+            PatientMedication.id > after_id,
+            PatientMedication.status == MedicationStatusEnum.active,
+            PatientMedication.start_date <= cutoff.date(),
+            or_(PatientMedication.end_date.is_(None), PatientMedication.end_date >= window_start.date())
+        ).order_by(PatientMedication.id).limit(chunk_size).all()
+
+    @staticmethod
+    def _expected_slots(row, window_start: datetime, cutoff: datetime) -> List[tuple]:
+        """(slot, match window) of each dose of one patient medication in (window_start, cutoff]"""
+        times = dose_times(row.times_per_day, row.reminder_times if row.schedule_active else None)
+        windows = match_windows(times)
+        first_day = max(row.start_date, window_start.date())
+        last_day = min(row.end_date or cutoff.date(), cutoff.date())
+
+        slots = []
+        day = first_day
+        while day <= last_day:
+            for dose_time in times:
+                slot = datetime.combine(day, dose_time)
+                if window_start < slot <= cutoff:
+                    slots.append((slot, windows[dose_time]))
+            day += timedelta(days=1)
+        return slots
+
+    @staticmethod
+    def _materialize_chunk(db: Session, chunk: list, window_start: datetime, cutoff: datetime) -> tuple:
+        """
+        Insert missed logs for one chunk, then recount the stats and rebuild the rollup days
+        once per affected patient; the caller commits. Returns (logs inserted, affected patient ids)
+        """
+        expected = {row.id: (row, MissedDoseMaterializer._expected_slots(row, window_start, cutoff)) for row in chunk}
+        expected = {pm_id: value for pm_id, value in expected.items() if value[1]}
+        if not expected:
+            return 0, []
+
+        # Every log near the window for the whole chunk in one query
+        match_window = timedelta(minutes=SLOT_MATCH_MINUTES)
+        logged = defaultdict(list)
+        for pm_id, scheduled_time in db.query(MedicationLog.patient_medication_id, MedicationLog.scheduled_time).filter(
+            MedicationLog.patient_medication_id.in_(expected.keys()),
+            MedicationLog.scheduled_time > window_start - match_window,
+            MedicationLog.scheduled_time <= cutoff + match_window
+        ).all():
+            logged[pm_id].append(scheduled_time)
+
+        rows = []
+        for pm_id, (row, slots) in expected.items():
+            times = sorted(logged[pm_id])
+            for slot, slot_window in slots:
+                if MissedDoseMaterializer._has_log_near(times, slot, slot_window):
+                    continue
+                rows.append({
+                    "patient_medication_id": pm_id,
+                    "patient_id": row.patient_id,
+                    "scheduled_time": slot,
+                    "scheduled_date": slot.date(),
+                    "status": MedicationLogStatusEnum.missed,
+                    "on_time": False,
+                    "logged_via": "auto",
+                })
+
+        if not rows:
+            return 0, []
+
+        inserted = MissedDoseMaterializer._insert_missed(db, rows)
+
+        # One recount per patient covers the whole batch, as in log_medications_bulk
+        medication_ids = defaultdict(set)
+        changed_dates = defaultdict(set)
+        for _, patient_id, pm_id, scheduled_date in inserted:
+            medication_ids[patient_id].add(pm_id)
+            changed_dates[patient_id].add(scheduled_date)
+
+        for patient_id in sorted(medication_ids):
+            AdherenceStatsEngine.refresh(
+                db, patient_id,
+                patient_medication_ids=medication_ids[patient_id],
+                changed_dates=changed_dates[patient_id]
+            )
+
+        return len(inserted), sorted(medication_ids)
+
+    @staticmethod
+    def _insert_missed(db: Session, rows: List[dict]) -> List[tuple]:
+        """
+        Insert missed logs, skipping slots logged meanwhile (the unique index decides).
+        Returns (id, patient_id, patient_medication_id, scheduled_date) of the rows actually inserted.
+        """
+        table = MedicationLog.__table__
+        returned = (table.c.id, table.c.patient_id, table.c.patient_medication_id, table.c.scheduled_date)
+        dialect = db.get_bind().dialect
+
+        stmt = conflict_insert(table, dialect.name)
+        if stmt is not None:
+            stmt = stmt.on_conflict_do_nothing(index_elements=["patient_medication_id", "scheduled_time"])
+        else:
+            stmt = insert(table)
+
+        if dialect.insert_executemany_returning:
+            return [tuple(row) for row in db.execute(stmt.returning(*returned), rows)]
+
+        inserted = []
+        for row in rows:
+            result = db.execute(stmt.values(**row))
+            if result.rowcount:
+                inserted.append((
+                    result.inserted_primary_key[0], row["patient_id"], row["patient_medication_id"], row["scheduled_date"]
+                ))
+        return inserted
+
+    @staticmethod
+    def _has_log_near(sorted_times: List[datetime], slot: datetime, match_window: timedelta) -> bool:
+        """
+        Whether a logged time lies in [slot - match_window, slot + match_window); half-open,
+        so a log exactly halfway between two slots belongs to the later one only
+        """
+        index = bisect_left(sorted_times, slot - match_window)
+        return index < len(sorted_times) and sorted_times[index] < slot + match_window
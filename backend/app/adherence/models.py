@@ -2,7 +2,7 @@
 Adherence tracking models
 Track medication taking behavior and calculate adherence metrics
 """
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Float, Date, Text, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Float, Date, Text, Enum as SQLEnum, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -24,6 +24,14 @@ class MedicationLog(Base):
     Core table for adherence tracking
     """
     __tablename__ = "medication_logs"
+    __table_args__ = (
+        # One log per dose slot; log_medication relies on this instead of a pre-query
+        Index("uq_medication_logs_medication_time", "patient_medication_id", "scheduled_time", unique=True),
+        # Per-patient date-range counts (stats, streaks, analytics)
+        Index("ix_medication_logs_patient_date_status", "patient_id", "scheduled_date", "status"),
+        # Keyset pagination of a patient's logs by (scheduled_time, id)
+        Index("ix_medication_logs_patient_time_id", "patient_id", "scheduled_time", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     patient_medication_id = Column(Integer, ForeignKey("patient_medications.id"), nullable=False)
@@ -83,6 +91,7 @@ class AdherenceStats(Base):
     total_taken = Column(Integer, default=0)  # Doses taken (on time or late)
     total_skipped = Column(Integer, default=0)  # Intentionally skipped
     total_missed = Column(Integer, default=0)  # Missed (forgot/didn't take)
+    on_time_taken = Column(Integer, default=0)  # Taken within 30 minutes (null on rows written before this column)
     
     # Calculated scores (0-100)
     adherence_score = Column(Float, default=0.0)  # (taken / scheduled) * 100
@@ -104,6 +113,81 @@ class AdherenceStats(Base):
         return f"<AdherenceStats(patient_id={self.patient_id}, period={self.period_type}, score={self.adherence_score})>"
 
 
+class AdherenceStreakState(Base):
+    """
+    Persisted streak bookkeeping per patient (and optionally per medication)
+    Lets a new log extend the latest streak without rescanning the log history
+    """
+    __tablename__ = "adherence_streak_states"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    patient_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    patient_medication_id = Column(Integer, ForeignKey("patient_medications.id"), nullable=True)  # Null = overall streak
+    
+    # Most recent run of consecutive days with 100% adherence
+    run_start = Column(Date, nullable=True)
+    run_end = Column(Date, nullable=True)
+    
+    # Best run ever seen
+    longest_streak = Column(Integer, default=0)
+    
+    # Timestamps
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<AdherenceStreakState(patient_id={self.patient_id}, run={self.run_start}..{self.run_end}, longest={self.longest_streak})>"
+
+
+class DailyAdherenceRollup(Base):
+    """
+    Per-day dose counts for each patient medication
+    Maintained in the same transaction as every MedicationLog write so reports
+    aggregate days x medications instead of individual doses
+    """
+    __tablename__ = "daily_adherence_rollup"
+    __table_args__ = (
+        UniqueConstraint("patient_id", "patient_medication_id", "date", name="uq_daily_adherence_rollup_key"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    patient_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    patient_medication_id = Column(Integer, ForeignKey("patient_medications.id"), nullable=False)
+    date = Column(Date, nullable=False, index=True)
+    
+    # Dose counts for the day
+    taken_count = Column(Integer, nullable=False, default=0)
+    skipped_count = Column(Integer, nullable=False, default=0)
+    missed_count = Column(Integer, nullable=False, default=0)
+    on_time_count = Column(Integer, nullable=False, default=0)  # Taken within the time window
+    
+    def __repr__(self):
+        return f"<DailyAdherenceRollup(patient_id={self.patient_id}, medication={self.patient_medication_id}, date={self.date})>"
+
+
+class MaterializerCheckpoint(Base):
+    """
+    Progress of a background job that walks patient medications in id order
+    Committed with each chunk so an interrupted run resumes where it stopped
+    """
+    __tablename__ = "materializer_checkpoints"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_name = Column(String(50), nullable=False, unique=True)
+    
+    # Everything up to this time has been materialized by a completed run
+    materialized_through = Column(DateTime, nullable=True)
+    
+    # Run in progress (null when idle)
+    run_cutoff = Column(DateTime, nullable=True)
+    last_patient_medication_id = Column(Integer, nullable=False, default=0)
+    
+    # Timestamps
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<MaterializerCheckpoint(job={self.job_name}, through={self.materialized_through}, last_id={self.last_patient_medication_id})>"
+
+
 class AdherenceGoal(Base):
     """
     Patient or doctor-set adherence goals
@@ -0,0 +1,161 @@
+"""
+Daily adherence rollup
+Keeps DailyAdherenceRollup in step with MedicationLog writes and rebuilds it from the log table
+"""
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import and_, case, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.adherence.models import MedicationLog, DailyAdherenceRollup, MedicationLogStatusEnum
+from app.database.dialects import conflict_insert
+
+ROLLUP_COUNTERS = ("taken_count", "skipped_count", "missed_count", "on_time_count")
+
+STATUS_COUNTER = {
+    MedicationLogStatusEnum.taken: "taken_count",
+    MedicationLogStatusEnum.skipped: "skipped_count",
+    MedicationLogStatusEnum.missed: "missed_count",
+}
+
+
+class AdherenceRollup:
+    """Maintains and reads the per-day, per-medication dose counts"""
+
+    @staticmethod
+    def totals() -> list:
+        """Labelled SUM columns over rollup rows (scheduled, taken, skipped, missed, on_time)"""
+        taken = func.coalesce(func.sum(DailyAdherenceRollup.taken_count), 0)
+        skipped = func.coalesce(func.sum(DailyAdherenceRollup.skipped_count), 0)
+        missed = func.coalesce(func.sum(DailyAdherenceRollup.missed_count), 0)
+        return [
+            (taken + skipped + missed).label('scheduled'),
+            taken.label('taken'),
+            skipped.label('skipped'),
+            missed.label('missed'),
+            func.coalesce(func.sum(DailyAdherenceRollup.on_time_count), 0).label('on_time'),
+        ]
+
+    @staticmethod
+    def apply_change(
+        db: Session,
+        patient_id: int,
+        patient_medication_id: int,
+        before,
+        after
+    ) -> None:
+        """
+        Apply one log insert (before=None), update, or delete (after=None) to the rollup.
+        Takes the engine's LogSnapshot values; the caller commits.
+        """
+        deltas: Dict[date, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(ROLLUP_COUNTERS, 0))
+        for snapshot, sign in ((before, -1), (after, 1)):
+            if snapshot is None:
+                continue
+            counters = deltas[snapshot.scheduled_date]
+            counters[STATUS_COUNTER[snapshot.status]] += sign
+            if snapshot.status == MedicationLogStatusEnum.taken and snapshot.on_time:
+                counters["on_time_count"] += sign
+
+        for day, counters in deltas.items():
+            if not any(counters.values()):
+                continue
+            AdherenceRollup._increment(db, patient_id, patient_medication_id, day, counters)
+            if any(value < 0 for value in counters.values()):
+                AdherenceRollup._prune(db, patient_id, patient_medication_id, day)
+
+    @staticmethod
+    def rebuild(
+        db: Session,
+        patient_id: Optional[int] = None,
+        patient_medication_ids: Optional[Iterable[int]] = None,
+        dates: Optional[Iterable[date]] = None
+    ) -> int:
+        """
+        Recount rollup rows from medication_logs with one DELETE and one INSERT ... SELECT.
+        With no arguments the whole table is rebuilt (backfill). Returns the rows written.
+        """
+        rollup_filters = []
+        log_filters = []
+        if patient_id is not None:
+            rollup_filters.append(DailyAdherenceRollup.patient_id == patient_id)
+            log_filters.append(MedicationLog.patient_id == patient_id)
+        if patient_medication_ids is not None:
+            patient_medication_ids = list(set(patient_medication_ids))
+            rollup_filters.append(DailyAdherenceRollup.patient_medication_id.in_(patient_medication_ids))
+            log_filters.append(MedicationLog.patient_medication_id.in_(patient_medication_ids))
+        if dates is not None:
+            dates = list(set(dates))
+            rollup_filters.append(DailyAdherenceRollup.date.in_(dates))
+            log_filters.append(MedicationLog.scheduled_date.in_(dates))
+
+        db.execute(
+            delete(DailyAdherenceRollup).where(*rollup_filters),
+            execution_options={"synchronize_session": False}
+        )
+
+        taken = MedicationLog.status == MedicationLogStatusEnum.taken
+        counts = select(
+            MedicationLog.patient_id,
+            MedicationLog.patient_medication_id,
+            MedicationLog.scheduled_date,
+            func.sum(case((taken, 1), else_=0)),
+            func.sum(case((MedicationLog.status == MedicationLogStatusEnum.skipped, 1), else_=0)),
+            func.sum(case((MedicationLog.status == MedicationLogStatusEnum.missed, 1), else_=0)),
+            func.sum(case((and_(taken, MedicationLog.on_time == True), 1), else_=0)),
+        ).where(*log_filters).group_by(
+            MedicationLog.patient_id, MedicationLog.patient_medication_id, MedicationLog.scheduled_date
+        )
+
+        result = db.execute(
+            insert(DailyAdherenceRollup).from_select(
+                ["patient_id", "patient_medication_id", "date", *ROLLUP_COUNTERS], counts
+            )
+        )
+        return result.rowcount
+
+    # ==================== INTERNAL HELPERS ====================
+
+    @staticmethod
+    def _increment(db: Session, patient_id: int, patient_medication_id: int, day: date, counters: Dict[str, int]) -> None:
+        """Add counter deltas to one rollup row, creating it if needed"""
+        table = DailyAdherenceRollup.__table__
+        stmt = conflict_insert(table, db.get_bind().dialect.name)
+
+        # A missing row means there is nothing to subtract from, so new rows never go negative
+        initial = {field: max(value, 0) for field, value in counters.items()}
+        increments = {field: table.c[field] + value for field, value in counters.items() if value}
+
+        if stmt is not None:
+            db.execute(
+                stmt.values(patient_id=patient_id, patient_medication_id=patient_medication_id, date=day, **initial)
+                .on_conflict_do_update(index_elements=["patient_id", "patient_medication_id", "date"], set_=increments)
+            )
+            return
+
+        result = db.execute(
+            update(table).where(
+                table.c.patient_id == patient_id,
+                table.c.patient_medication_id == patient_medication_id,
+                table.c.date == day
+            ).values(**increments)
+        )
+        if result.rowcount == 0:
+            db.execute(
+                insert(table).values(patient_id=patient_id, patient_medication_id=patient_medication_id, date=day, **initial)
+            )
+
+    @staticmethod
+    def _prune(db: Session, patient_id: int, patient_medication_id: int, day: date) -> None:
+        """Drop a rollup row once its day has no doses left"""
+        table = DailyAdherenceRollup.__table__
+        db.execute(
+            delete(table).where(
+                table.c.patient_id == patient_id,
+                table.c.patient_medication_id == patient_medication_id,
+                table.c.date == day,
+                table.c.taken_count + table.c.skipped_count + table.c.missed_count <= 0
+            )
+        )
@@ -1,14 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response, status, Query
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 
 from app.database.db import get_db
 from app.auth.services import get_current_user
 from app.auth.models import User, RoleEnum
-from app.adherence.services import AdherenceService
+from app.adherence.services import AdherenceService, CHART_MAX_DAYS, dashboard_cache, dashboard_version_keys
+from app.cache.versions import check_not_modified
 from app.adherence.schemas import (
-    MedicationLogCreate, MedicationLogUpdate, MedicationLogResponse,
-    AdherenceStatsResponse, AdherenceChartData, AdherenceDashboard
+    MedicationLogCreate, MedicationLogUpdate, MedicationLogResponse, MedicationLogPage,
+    AdherenceStatsResponse, AdherenceChartData, AdherenceDashboard,
+    BulkLogCreate, BulkLogResponse, CacheStatsResponse
 )
 
 router = APIRouter(prefix="/adherence", tags=["Adherence"])
@@ -29,6 +31,19 @@ def log_medication(
     return AdherenceService.log_medication(db, log_data, current_user.id)
 
 
+@router.post("/logs/bulk", response_model=BulkLogResponse, status_code=status.HTTP_201_CREATED)
+def log_medications_bulk(
+    bulk_data: BulkLogCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Log many medication doses in one request (e.g., offline sync)
+    Each entry is reported as created, duplicate, or error
+    """
+    return AdherenceService.log_medications_bulk(db, bulk_data, current_user.id)
+
+
 @router.put("/logs/{log_id}", response_model=MedicationLogResponse)
 def update_medication_log(
     log_id: int,
@@ -43,20 +58,23 @@ def update_medication_log(
     return AdherenceService.update_medication_log(db, log_id, log_data, current_user.id)
 
 
-@router.get("/logs", response_model=List[MedicationLogResponse])
+@router.get("/logs", response_model=Union[List[MedicationLogResponse], MedicationLogPage])
 def get_medication_logs(
     patient_medication_id: Optional[int] = Query(None, description="Filter by specific medication assignment"),
-    status: Optional[str] = Query(None, description="Filter by status: taken, skipped, missed"),
+    status_filter: Optional[str] = Query(None, alias="status", description="Filter by status: taken, skipped, missed"),
     start_date: Optional[str] = Query(None, description="Filter from date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="Filter to date (YYYY-MM-DD)"),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="Keyset pagination: empty for the first page, then next_cursor"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Get medication logs for current patient
     Can filter by medication, status, and date range
+    Without `cursor` returns a list paged by skip/limit; with `cursor` returns
+    {items, next_cursor} paged by (scheduled_time, id)
     """
     from datetime import date as date_type
     
@@ -64,11 +82,23 @@ def get_medication_logs(
     start_date_obj = date_type.fromisoformat(start_date) if start_date else None
     end_date_obj = date_type.fromisoformat(end_date) if end_date else None
     
+    if cursor is not None:
+        return AdherenceService.get_patient_logs_page(
+            db,
+            patient_id=current_user.id,
+            patient_medication_id=patient_medication_id,
+            status_filter=status_filter,
+            start_date=start_date_obj,
+            end_date=end_date_obj,
+            limit=limit,
+            cursor=cursor
+        )
+    
     return AdherenceService.get_patient_logs(
         db,
         patient_id=current_user.id,
         patient_medication_id=patient_medication_id,
-        status_filter=status,
+        status_filter=status_filter,
         start_date=start_date_obj,
         end_date=end_date_obj,
         skip=skip,
@@ -94,6 +124,7 @@ def delete_medication_log(
 
 @router.get("/stats", response_model=AdherenceStatsResponse)
 def get_adherence_stats(
+    background_tasks: BackgroundTasks,
     period: str = Query("weekly", description="Period: daily, weekly, monthly, overall"),
     patient_medication_id: Optional[int] = Query(None, description="Filter by specific medication"),
     current_user: User = Depends(get_current_user),
@@ -113,13 +144,14 @@ def get_adherence_stats(
         db,
         patient_id=current_user.id,
         period_type=period,
-        patient_medication_id=patient_medication_id
+        patient_medication_id=patient_medication_id,
+        background_tasks=background_tasks
     )
 
 
 @router.get("/chart", response_model=List[AdherenceChartData])
 def get_adherence_chart_data(
-    days: int = Query(7, ge=1, le=90, description="Number of days to include"),
+    days: int = Query(7, ge=1, le=CHART_MAX_DAYS, description="Number of days to include"),
     patient_medication_id: Optional[int] = Query(None, description="Filter by specific medication"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -131,20 +163,26 @@ def get_adherence_chart_data(
     return AdherenceService.get_chart_data(
         db,
         patient_id=current_user.id,
-        days=days
+        days=days,
+        patient_medication_id=patient_medication_id
     )
 
 
 @router.get("/dashboard", response_model=AdherenceDashboard)
 def get_adherence_dashboard(
+    request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Get complete adherence dashboard with all stats and recent logs
     Includes overall, weekly, and daily stats plus chart data
+    Answers If-None-Match with 304 while the patient's logs and medications are unchanged
     """
-    return AdherenceService.get_dashboard(db, current_user.id)
+    versions = check_not_modified(request, response, db, dashboard_version_keys(current_user.id))
+    return AdherenceService.get_dashboard(db, current_user.id, background_tasks, versions)
 
 
 # ==================== ADMIN ROUTES ====================
@@ -152,6 +190,7 @@ def get_adherence_dashboard(
 @router.get("/patients/{patient_id}/stats", response_model=AdherenceStatsResponse)
 def get_patient_adherence_stats(
     patient_id: int,
+    background_tasks: BackgroundTasks,
     period: str = Query("weekly", description="Period: daily, weekly, monthly, overall"),
     patient_medication_id: Optional[int] = Query(None, description="Filter by specific medication"),
     current_user: User = Depends(get_current_user),
@@ -176,24 +215,27 @@ def get_patient_adherence_stats(
         db,
         patient_id=patient_id,
         period_type=period,
-        patient_medication_id=patient_medication_id
+        patient_medication_id=patient_medication_id,
+        background_tasks=background_tasks
     )
 
 
-@router.get("/patients/{patient_id}/logs", response_model=List[MedicationLogResponse])
+@router.get("/patients/{patient_id}/logs", response_model=Union[List[MedicationLogResponse], MedicationLogPage])
 def get_patient_logs_admin(
     patient_id: int,
     patient_medication_id: Optional[int] = Query(None, description="Filter by specific medication assignment"),
-    status: Optional[str] = Query(None, description="Filter by status: taken, skipped, missed"),
+    status_filter: Optional[str] = Query(None, alias="status", description="Filter by status: taken, skipped, missed"),
     start_date: Optional[str] = Query(None, description="Filter from date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="Filter to date (YYYY-MM-DD)"),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="Keyset pagination: empty for the first page, then next_cursor"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Get medication logs for a specific patient (Admin only)
+    Supports the same offset and cursor pagination as /adherence/logs
     """
     if current_user.role != RoleEnum.admin:
         raise HTTPException(
@@ -207,11 +249,23 @@ def get_patient_logs_admin(
     start_date_obj = date_type.fromisoformat(start_date) if start_date else None
     end_date_obj = date_type.fromisoformat(end_date) if end_date else None
     
+    if cursor is not None:
+        return AdherenceService.get_patient_logs_page(
+            db,
+            patient_id=patient_id,
+            patient_medication_id=patient_medication_id,
+            status_filter=status_filter,
+            start_date=start_date_obj,
+            end_date=end_date_obj,
+            limit=limit,
+            cursor=cursor
+        )
+    
     return AdherenceService.get_patient_logs(
         db,
         patient_id=patient_id,
         patient_medication_id=patient_medication_id,
-        status_filter=status,
+        status_filter=status_filter,
         start_date=start_date_obj,
         end_date=end_date_obj,
         skip=skip,
@@ -222,6 +276,9 @@ def get_patient_logs_admin(
 @router.get("/patients/{patient_id}/dashboard", response_model=AdherenceDashboard)
 def get_patient_dashboard_admin(
     patient_id: int,
+    request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -234,4 +291,21 @@ def get_patient_dashboard_admin(
             detail="Only admins can view other patients' dashboards"
         )
     
-    return AdherenceService.get_dashboard(db, patient_id)
+    versions = check_not_modified(request, response, db, dashboard_version_keys(patient_id))
+    return AdherenceService.get_dashboard(db, patient_id, background_tasks, versions)
+
+
+@router.get("/cache/stats", response_model=CacheStatsResponse)
+def get_dashboard_cache_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get dashboard cache hit/miss counters for this worker (Admin only)
+    """
+    if current_user.role != RoleEnum.admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can view cache statistics"
+        )
+    
+    return dashboard_cache.stats()
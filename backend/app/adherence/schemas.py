@@ -80,6 +80,12 @@ class MedicationLogResponse(BaseModel):
         from_attributes = True
 
 
+class MedicationLogPage(BaseModel):
+    """One page of logs in cursor mode; pass next_cursor back to get the following page"""
+    items: List[MedicationLogResponse]
+    next_cursor: Optional[str] = None
+
+
 class MedicationLogDetailed(MedicationLogResponse):
     """Detailed log with medication info"""
     medication_name: str
@@ -91,7 +97,7 @@ class MedicationLogDetailed(MedicationLogResponse):
 
 class AdherenceStatsResponse(BaseModel):
     """Adherence statistics response"""
-    id: int
+    id: Optional[int] = None  # None when computed on read and not stored yet
     patient_id: int
     patient_medication_id: Optional[int]
     period_type: str  # daily, weekly, monthly, overall
@@ -174,16 +180,26 @@ class AdherenceGoalResponse(BaseModel):
 # ==================== BULK OPERATIONS ====================
 
 class BulkLogCreate(BaseModel):
-    """Create multiple logs at once (e.g., from scheduled reminders)"""
-    logs: List[MedicationLogCreate]
+    """Create multiple logs at once (e.g., from scheduled reminders or an offline sync)"""
+    logs: List[MedicationLogCreate] = Field(..., min_length=1, max_length=500)
+
+
+class BulkLogItemResult(BaseModel):
+    """Outcome for one entry of a bulk log request"""
+    index: int  # Position in the submitted list
+    status: str  # created, duplicate, error
+    log_id: Optional[int] = None
+    detail: Optional[str] = None
 
 
 class BulkLogResponse(BaseModel):
     """Response for bulk log creation"""
     created_count: int
+    duplicate_count: int = 0
     failed_count: int
     created_ids: List[int]
     errors: List[str]
+    results: List[BulkLogItemResult] = []
 
 
 # ==================== ANALYTICS SCHEMAS ====================
@@ -209,3 +225,17 @@ class PatientAdherenceSummary(BaseModel):
     current_streak: int
     last_missed_date: Optional[date]
     status: str  # excellent, good, needs_attention, critical
+
+
+# ==================== CACHE SCHEMAS ====================
+
+class CacheStatsResponse(BaseModel):
+    """Hit/miss counters of a cache (this worker process)"""
+    backend: str
+    namespace: str
+    hits: int
+    misses: int
+    hit_rate: float
+    sets: int
+    invalidations: int
+    errors: int
@@ -2,19 +2,60 @@
 Adherence tracking service
 Business logic for medication adherence tracking and analytics
 """
+import base64
+import json
+import logging
+import threading
+import time
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func, extract
-from datetime import datetime, date, timedelta
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import and_, or_, func, extract, case, select
+from datetime import datetime, date, timedelta, timezone
 from typing import List, Optional, Dict
-from fastapi import HTTPException, status
+from fastapi import BackgroundTasks, HTTPException, status
 
-from app.adherence.models import MedicationLog, AdherenceStats, AdherenceGoal, MedicationLogStatusEnum
+from app.adherence.models import (
+    MedicationLog, AdherenceStats, AdherenceStreakState, DailyAdherenceRollup, AdherenceGoal, MedicationLogStatusEnum
+)
+from app.adherence.rollup import AdherenceRollup
 from app.adherence.schemas import (
-    MedicationLogCreate, MedicationLogUpdate, MedicationLogDetailed,
-    AdherenceChartData, AdherenceDashboard, AdherenceReport
+    MedicationLogCreate, MedicationLogUpdate, MedicationLogDetailed, MedicationLogPage,
+    AdherenceChartData, AdherenceDashboard, AdherenceReport,
+    BulkLogCreate, BulkLogResponse, BulkLogItemResult
 )
+from app.adherence.stats_engine import AdherenceStatsEngine, PERIOD_TYPES, period_bounds
+from app.cache.backends import create_cache
+from app.cache.versions import DataVersions, version_key
+from app.config.settings import settings
+from app.database.dialects import day_number
+from app.database.migrations import unique_index_missing
 from app.medications.models import PatientMedication
 
+logger = logging.getLogger(__name__)
+
+# Longest window the chart endpoint will aggregate
+CHART_MAX_DAYS = 90
+
+# Assembled AdherenceDashboard per patient, as JSON
+dashboard_cache = create_cache("adherence_dashboard")
+
+
+def dashboard_version_keys(patient_id: int) -> list:
+    """Data versions a patient's dashboard depends on"""
+    return [version_key("medication_logs", patient_id), version_key("patient_medications", patient_id)]
+
+
+def dashboard_cache_key(patient_id: int, versions: Dict[str, int]) -> str:
+    """Cache key of a patient's dashboard at the given data versions, for today's date windows"""
+    parts = [str(patient_id)] + [str(versions[key]) for key in dashboard_version_keys(patient_id)]
+    return ":".join(parts + [date.today().isoformat()])
+
+# Stats refreshes queued by stale reads, so polling does not queue duplicates
+# (key -> monotonic time queued; entries expire in case a queued task never ran)
+_refreshes_in_flight = {}
+_refresh_lock = threading.Lock()
+REFRESH_IN_FLIGHT_SECONDS = 300
+
 
 class AdherenceService:
     """Service for adherence tracking operations"""
@@ -36,18 +77,126 @@ class AdherenceService:
                 detail="Patient medication not found"
             )
         
-        # Check if log already exists for this scheduled time
-        existing_log = db.query(MedicationLog).filter(
+        # A database that still held duplicates when the unique index was added has no index to rely on
+        if unique_index_missing("uq_medication_logs_medication_time") and db.query(MedicationLog.id).filter(
             MedicationLog.patient_medication_id == log_data.patient_medication_id,
             MedicationLog.scheduled_time == log_data.scheduled_time
-        ).first()
+        ).first():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Log already exists for this scheduled time. Use update endpoint to modify."
+            )
         
-        if existing_log:
+        # Create log entry; the unique (patient_medication_id, scheduled_time) index rejects duplicates
+        log_entry = AdherenceService._build_log_entry(log_data, patient_id)
+        
+        db.add(log_entry)
+        try:
+            db.flush()
+        except IntegrityError:
+            db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Log already exists for this scheduled time. Use update endpoint to modify."
             )
         
+        # Apply this dose to the stored stats in the same transaction
+        AdherenceStatsEngine.apply_change(
+            db, patient_id, log_data.patient_medication_id,
+            before=None, after=AdherenceStatsEngine.snapshot(log_entry), log_id=log_entry.id
+        )
+        
+        DataVersions.bump(db, "medication_logs", patient_id)
+        db.commit()
+        db.refresh(log_entry)
+        
+        return log_entry
+    
+    @staticmethod
+    def log_medications_bulk(db: Session, bulk_data: BulkLogCreate, patient_id: int) -> BulkLogResponse:
+        """
+        Log many doses at once (e.g., an offline mobile client syncing)
+        Ownership and duplicate checks are one query each, all rows go in one transaction,
+        and stats are refreshed once per affected medication
+        """
+        medication_ids = {log_data.patient_medication_id for log_data in bulk_data.logs}
+        
+        # Verify ownership of every patient medication in one query
+        owned_ids = {
+            row.id for row in db.query(PatientMedication.id).filter(
+                PatientMedication.id.in_(medication_ids),
+                PatientMedication.patient_id == patient_id
+            ).all()
+        }
+        
+        # Find already-logged (patient_medication_id, scheduled_time) pairs in one query
+        scheduled_times = {AdherenceService._stored_time(log_data.scheduled_time) for log_data in bulk_data.logs}
+        existing_pairs = set()
+        if owned_ids:
+            existing_pairs = {
+                (row.patient_medication_id, row.scheduled_time)
+                for row in db.query(MedicationLog.patient_medication_id, MedicationLog.scheduled_time).filter(
+                    MedicationLog.patient_medication_id.in_(owned_ids),
+                    MedicationLog.scheduled_time.in_(scheduled_times)
+                ).all()
+            }
+        
+        results = []
+        new_entries = []
+        for index, log_data in enumerate(bulk_data.logs):
+            # Compared in stored form, so a replayed "Z" timestamp matches the naive value read back
+            pair = (log_data.patient_medication_id, AdherenceService._stored_time(log_data.scheduled_time))
+            
+            if log_data.patient_medication_id not in owned_ids:
+                results.append(BulkLogItemResult(index=index, status="error", detail="Patient medication not found"))
+            elif pair in existing_pairs:
+                results.append(BulkLogItemResult(
+                    index=index, status="duplicate", detail="Log already exists for this scheduled time"
+                ))
+            else:
+                existing_pairs.add(pair)  # Also catches repeats within the batch
+                log_entry = AdherenceService._build_log_entry(log_data, patient_id)
+                new_entries.append((index, log_entry))
+                results.append(None)
+        
+        if new_entries:
+            db.add_all([log_entry for _, log_entry in new_entries])
+            try:
+                db.flush()
+            except IntegrityError:
+                # Another request logged one of these slots after the duplicate check
+                db.rollback()
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Some logs were created concurrently for the same scheduled times. Retry the batch."
+                )
+            
+            AdherenceStatsEngine.refresh(
+                db, patient_id,
+                patient_medication_ids={log_entry.patient_medication_id for _, log_entry in new_entries},
+                changed_dates=[log_entry.scheduled_date for _, log_entry in new_entries]
+            )
+            DataVersions.bump(db, "medication_logs", patient_id)
+            db.commit()
+            
+            for index, log_entry in new_entries:
+                results[index] = BulkLogItemResult(index=index, status="created", log_id=log_entry.id)
+        
+        created_ids = [result.log_id for result in results if result.status == "created"]
+        errors = [f"Log {result.index}: {result.detail}" for result in results if result.status == "error"]
+        
+        return BulkLogResponse(
+            created_count=len(created_ids),
+            duplicate_count=sum(1 for result in results if result.status == "duplicate"),
+            failed_count=len(errors),
+            created_ids=created_ids,
+            errors=errors,
+            results=results
+        )
+    
+    @staticmethod
+    def _build_log_entry(log_data: MedicationLogCreate, patient_id: int) -> MedicationLog:
+        """Create a MedicationLog row with on-time tracking filled in"""
         # Calculate if taken on time
         on_time = True
         minutes_late = None
@@ -57,11 +206,10 @@ class AdherenceService:
             minutes_late = int(abs(time_diff))
             on_time = abs(time_diff) <= 30  # Within 30 minutes is considered on time
         
-        # Create log entry
-        log_entry = MedicationLog(
+        return MedicationLog(
             patient_medication_id=log_data.patient_medication_id,
             patient_id=patient_id,
-            scheduled_time=log_data.scheduled_time,
+            scheduled_time=AdherenceService._stored_time(log_data.scheduled_time),
             scheduled_date=log_data.scheduled_time.date(),
             status=log_data.status,
             actual_time=log_data.actual_time,
@@ -71,15 +219,11 @@ class AdherenceService:
             skipped_reason=log_data.skipped_reason,
             logged_via=log_data.logged_via
         )
-        
-        db.add(log_entry)
-        db.commit()
-        db.refresh(log_entry)
-        
-        # Trigger adherence stats recalculation (async in production)
-        AdherenceService._recalculate_stats(db, patient_id, log_data.patient_medication_id)
-        
-        return log_entry
+    
+    @staticmethod
+    def _stored_time(value: datetime) -> datetime:
+        """A datetime as the naive DateTime columns keep it: wall-clock time, offset dropped"""
+        return value.replace(tzinfo=None) if value.tzinfo is not None else value
     
     @staticmethod
     def update_medication_log(db: Session, log_id: int, log_data: MedicationLogUpdate, patient_id: int) -> MedicationLog:
@@ -95,6 +239,8 @@ class AdherenceService:
                 detail="Medication log not found"
             )
         
+        before = AdherenceStatsEngine.snapshot(log_entry)
+        
         # Update fields
         if log_data.status:
             log_entry.status = log_data.status
@@ -109,12 +255,18 @@ class AdherenceService:
         if log_data.skipped_reason is not None:
             log_entry.skipped_reason = log_data.skipped_reason
         
+        db.flush()
+        
+        # Apply the status/timing transition to the stored stats
+        AdherenceStatsEngine.apply_change(
+            db, patient_id, log_entry.patient_medication_id,
+            before=before, after=AdherenceStatsEngine.snapshot(log_entry), log_id=log_entry.id
+        )
+        
+        DataVersions.bump(db, "medication_logs", patient_id)
         db.commit()
         db.refresh(log_entry)
         
-        # Trigger stats recalculation
-        AdherenceService._recalculate_stats(db, patient_id, log_entry.patient_medication_id)
-        
         return log_entry
     
     @staticmethod
@@ -128,7 +280,59 @@ class AdherenceService:
         limit: int = 100,
         skip: int = 0
     ) -> List[MedicationLog]:
-        """Get medication logs with filters"""
+        """Get medication logs with filters (offset pagination)"""
+        query = AdherenceService._logs_query(db, patient_id, patient_medication_id, start_date, end_date, status_filter)
+        
+        return query.order_by(
+            MedicationLog.scheduled_time.desc(), MedicationLog.id.desc()
+        ).offset(skip).limit(limit).all()
+    
+    @staticmethod
+    def get_patient_logs_page(
+        db: Session,
+        patient_id: int,
+        patient_medication_id: Optional[int] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        status_filter: Optional[str] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> MedicationLogPage:
+        """
+        Get medication logs with filters (keyset pagination on scheduled_time, id)
+        Each page costs the same however deep it is, and new logs never shift later pages
+        """
+        query = AdherenceService._logs_query(db, patient_id, patient_medication_id, start_date, end_date, status_filter)
+        
+        if cursor:
+            after_time, after_id = AdherenceService._decode_cursor(cursor)
+            query = query.filter(or_(
+                MedicationLog.scheduled_time < after_time,
+                and_(MedicationLog.scheduled_time == after_time, MedicationLog.id < after_id)
+            ))
+        
+        # One extra row tells whether another page exists
+        logs = query.order_by(
+            MedicationLog.scheduled_time.desc(), MedicationLog.id.desc()
+        ).limit(limit + 1).all()
+        
+        next_cursor = None
+        if len(logs) > limit:
+            logs = logs[:limit]
+            next_cursor = AdherenceService._encode_cursor(logs[-1])
+        
+        return MedicationLogPage(items=logs, next_cursor=next_cursor)
+    
+    @staticmethod
+    def _logs_query(
+        db: Session,
+        patient_id: int,
+        patient_medication_id: Optional[int],
+        start_date: Optional[date],
+        end_date: Optional[date],
+        status_filter: Optional[str]
+    ):
+        """Base query for a patient's logs with the listing filters applied"""
         query = db.query(MedicationLog).filter(MedicationLog.patient_id == patient_id)
         
         if patient_medication_id:
@@ -143,31 +347,43 @@ class AdherenceService:
         if status_filter:
             query = query.filter(MedicationLog.status == status_filter)
         
-        return query.order_by(MedicationLog.scheduled_time.desc()).offset(skip).limit(limit).all()
+        return query
+    
+    @staticmethod
+    def _encode_cursor(log: MedicationLog) -> str:
+        """Opaque cursor pointing just after a log"""
+        payload = json.dumps([log.scheduled_time.isoformat(), log.id])
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+    
+    @staticmethod
+    def _decode_cursor(cursor: str) -> tuple:
+        """Turn a cursor back into (scheduled_time, id)"""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            scheduled_time, log_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return datetime.fromisoformat(scheduled_time), int(log_id)
+        except (ValueError, TypeError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid pagination cursor"
+            )
     
     @staticmethod
     def get_adherence_stats(
         db: Session,
         patient_id: int,
         period_type: str = "weekly",
-        patient_medication_id: Optional[int] = None
-    ) -> Optional[AdherenceStats]:
-        """Get adherence statistics for a period"""
+        patient_medication_id: Optional[int] = None,
+        background_tasks: Optional[BackgroundTasks] = None
+    ) -> AdherenceStats:
+        """
+        Get adherence statistics for a period without writing to the database
+        A fresh stored row is returned as is. Otherwise, with background_tasks the stored row
+        is served and a refresh is scheduled (stale-while-revalidate); without it, or when
+        nothing is stored yet, the stats are computed in memory and not persisted.
+        """
         # Calculate period dates
-        today = date.today()
-        
-        if period_type == "daily":
-            period_start = today
-            period_end = today
-        elif period_type == "weekly":
-            period_start = today - timedelta(days=7)
-            period_end = today
-        elif period_type == "monthly":
-            period_start = today - timedelta(days=30)
-            period_end = today
-        else:  # overall
-            period_start = date(2020, 1, 1)  # Far past
-            period_end = today
+        period_start, period_end = period_bounds(period_type)
         
         # Try to get existing stats
         stats = db.query(AdherenceStats).filter(
@@ -176,12 +392,96 @@ class AdherenceService:
             AdherenceStats.patient_medication_id == patient_medication_id
         ).first()
         
-        # If not exists or outdated, calculate fresh
-        if not stats or (stats.updated_at and (datetime.now() - stats.updated_at).total_seconds() > 3600):
-            stats = AdherenceService._calculate_stats(db, patient_id, period_type, period_start, period_end, patient_medication_id)
+        if stats is not None and AdherenceService._is_fresh(stats, period_start, period_end):
+            return stats
+        
+        if background_tasks is not None:
+            AdherenceService._schedule_stats_refresh(background_tasks, db, patient_id, patient_medication_id)
+            if stats is not None:
+                return stats
+        
+        return AdherenceService._compute_stats(db, patient_id, period_type, period_start, period_end, patient_medication_id)
+    
+    @staticmethod
+    def _is_fresh(stats: AdherenceStats, period_start: date, period_end: date) -> bool:
+        """A stored row is fresh if it covers today's window and is within the staleness window"""
+        if (stats.period_start, stats.period_end) != (period_start, period_end) or stats.calculated_at is None:
+            return False
+        
+        calculated_at = stats.calculated_at
+        if calculated_at.tzinfo is None:
+            # SQLite drops the offset; timestamps are written in UTC
+            calculated_at = calculated_at.replace(tzinfo=timezone.utc)
+        age = datetime.now(timezone.utc) - calculated_at
+        return age.total_seconds() <= settings.ADHERENCE_STATS_STALE_SECONDS
+    
+    @staticmethod
+    def _compute_stats(
+        db: Session,
+        patient_id: int,
+        period_type: str,
+        period_start: date,
+        period_end: date,
+        patient_medication_id: Optional[int] = None
+    ) -> AdherenceStats:
+        """Calculate adherence statistics into a transient row that is never added to the session"""
+        # Count logs for period in one aggregate query
+        counters = AdherenceStatsEngine.count_logs(db, patient_id, patient_medication_id, period_start, period_end)
+        
+        # Streaks come from the persisted streak state when there is one
+        state = db.query(AdherenceStreakState).filter(
+            AdherenceStreakState.patient_id == patient_id,
+            AdherenceStreakState.patient_medication_id == patient_medication_id
+        ).first()
+        if state is not None:
+            current_streak, longest_streak = AdherenceService._streak_tuple(state.run_start, state.run_end, state.longest_streak)
+        else:
+            current_streak, longest_streak = AdherenceService._calculate_streaks(db, patient_id, patient_medication_id)
         
+        stats = AdherenceStats(patient_id=patient_id, patient_medication_id=patient_medication_id, period_type=period_type)
+        AdherenceStatsEngine._write_row(stats, counters, period_start, period_end, current_streak, longest_streak)
         return stats
     
+    @staticmethod
+    def _schedule_stats_refresh(
+        background_tasks: BackgroundTasks,
+        db: Session,
+        patient_id: int,
+        patient_medication_id: Optional[int]
+    ) -> None:
+        """Queue one stored-stats refresh per patient/medication, however many reads ask for it"""
+        key = (patient_id, patient_medication_id)
+        with _refresh_lock:
+            queued_at = _refreshes_in_flight.get(key)
+            if queued_at is not None and time.monotonic() - queued_at < REFRESH_IN_FLIGHT_SECONDS:
+                return
+            _refreshes_in_flight[key] = time.monotonic()
+        
+        background_tasks.add_task(AdherenceService.refresh_stored_stats, db.get_bind(), patient_id, patient_medication_id)
+    
+    @staticmethod
+    def refresh_stored_stats(bind, patient_id: int, patient_medication_id: Optional[int] = None) -> None:
+        """
+        Recount and persist stats rows in a session of its own
+        Runs after the response has been sent, so request sessions stay read-only
+        """
+        db = Session(bind=bind)
+        try:
+            AdherenceStatsEngine.refresh(
+                db, patient_id, [patient_medication_id] if patient_medication_id else [], changed_dates=[]
+            )
+            db.commit()
+            # The stats changed but no data version did: drop the dashboard built from the stale rows
+            versions = DataVersions.current(db, dashboard_version_keys(patient_id))
+            dashboard_cache.delete(dashboard_cache_key(patient_id, versions))
+        except Exception:
+            db.rollback()
+            logger.exception("Background adherence stats refresh failed for patient %s", patient_id)
+        finally:
+            db.close()
+            with _refresh_lock:
+                _refreshes_in_flight.pop((patient_id, patient_medication_id), None)
+    
     @staticmethod
     def _calculate_stats(
         db: Session,
@@ -191,30 +491,8 @@ class AdherenceService:
         period_end: date,
         patient_medication_id: Optional[int] = None
     ) -> AdherenceStats:
-        """Calculate adherence statistics"""
-        # Query logs for period
-        query = db.query(MedicationLog).filter(
-            MedicationLog.patient_id == patient_id,
-            MedicationLog.scheduled_date >= period_start,
-            MedicationLog.scheduled_date <= period_end
-        )
-        
-        if patient_medication_id:
-            query = query.filter(MedicationLog.patient_medication_id == patient_medication_id)
-        
-        logs = query.all()
-        
-        # Calculate metrics
-        total_scheduled = len(logs)
-        total_taken = sum(1 for log in logs if log.status == MedicationLogStatusEnum.taken)
-        total_skipped = sum(1 for log in logs if log.status == MedicationLogStatusEnum.skipped)
-        total_missed = sum(1 for log in logs if log.status == MedicationLogStatusEnum.missed)
-        
-        adherence_score = (total_taken / total_scheduled * 100) if total_scheduled > 0 else 0.0
-        on_time_taken = sum(1 for log in logs if log.status == MedicationLogStatusEnum.taken and log.on_time)
-        on_time_score = (on_time_taken / total_taken * 100) if total_taken > 0 else 0.0
-        
-        # Calculate streaks
+        """Calculate adherence statistics and persist them"""
+        counters = AdherenceStatsEngine.count_logs(db, patient_id, patient_medication_id, period_start, period_end)
         current_streak, longest_streak = AdherenceService._calculate_streaks(db, patient_id, patient_medication_id)
         
         # Update or create stats record
@@ -224,171 +502,159 @@ class AdherenceService:
             AdherenceStats.patient_medication_id == patient_medication_id
         ).first()
         
-        if stats:
-            # Update existing
-            stats.period_start = period_start
-            stats.period_end = period_end
-            stats.total_scheduled = total_scheduled
-            stats.total_taken = total_taken
-            stats.total_skipped = total_skipped
-            stats.total_missed = total_missed
-            stats.adherence_score = adherence_score
-            stats.on_time_score = on_time_score
-            stats.current_streak = current_streak
-            stats.longest_streak = longest_streak
-            stats.calculated_at = datetime.now()
-        else:
-            # Create new
-            stats = AdherenceStats(
-                patient_id=patient_id,
-                patient_medication_id=patient_medication_id,
-                period_type=period_type,
-                period_start=period_start,
-                period_end=period_end,
-                total_scheduled=total_scheduled,
-                total_taken=total_taken,
-                total_skipped=total_skipped,
-                total_missed=total_missed,
-                adherence_score=adherence_score,
-                on_time_score=on_time_score,
-                current_streak=current_streak,
-                longest_streak=longest_streak
-            )
+        if stats is None:
+            stats = AdherenceStats(patient_id=patient_id, patient_medication_id=patient_medication_id, period_type=period_type)
             db.add(stats)
+        AdherenceStatsEngine._write_row(stats, counters, period_start, period_end, current_streak, longest_streak)
         
         db.commit()
         db.refresh(stats)
         return stats
     
     @staticmethod
-    def _calculate_streaks(db: Session, patient_id: int, patient_medication_id: Optional[int] = None) -> tuple:
-        """Calculate current and longest streak"""
-        # Get logs ordered by date
-        query = db.query(MedicationLog).filter(MedicationLog.patient_id == patient_id)
-        
+    def _calculate_streaks(
+        db: Session,
+        patient_id: int,
+        patient_medication_id: Optional[int] = None,
+        today: Optional[date] = None
+    ) -> tuple:
+        """Calculate current and longest streak with a single gaps-and-islands query"""
+        run_start, run_end, longest_streak = AdherenceService._scan_streaks(db, patient_id, patient_medication_id)
+        return AdherenceService._streak_tuple(run_start, run_end, longest_streak, today)
+    
+    @staticmethod
+    def _scan_streaks(db: Session, patient_id: int, patient_medication_id: Optional[int] = None) -> tuple:
+        """
+        Find the most recent run of perfect days and the longest run in the database
+        Returns (run_start, run_end, longest_streak)
+        """
+        filters = [MedicationLog.patient_id == patient_id]
         if patient_medication_id:
-            query = query.filter(MedicationLog.patient_medication_id == patient_medication_id)
-        
-        logs = query.order_by(MedicationLog.scheduled_date.desc()).all()
-        
-        if not logs:
-            return 0, 0
-        
-        # Group by date and check if all doses taken
-        from collections import defaultdict
-        daily_logs = defaultdict(list)
-        for log in logs:
-            daily_logs[log.scheduled_date].append(log)
+            filters.append(MedicationLog.patient_medication_id == patient_medication_id)
+        
+        # Perfect days: every dose scheduled that day was taken
+        day_num = day_number(MedicationLog.scheduled_date, db.get_bind().dialect.name)
+        perfect_days = select(
+            MedicationLog.scheduled_date.label('day'),
+            func.min(day_num).label('day_num')
+        ).where(*filters).group_by(
+            MedicationLog.scheduled_date
+        ).having(
+            func.sum(case((MedicationLog.status != MedicationLogStatusEnum.taken, 1), else_=0)) == 0
+        ).subquery()
+        
+        # Consecutive days share the same (day number - row number) island key
+        islands = select(
+            perfect_days.c.day,
+            (perfect_days.c.day_num - func.row_number().over(order_by=perfect_days.c.day)).label('island')
+        ).subquery()
+        
+        runs = select(
+            func.min(islands.c.day).label('run_start'),
+            func.max(islands.c.day).label('run_end'),
+            func.count().label('length')
+        ).group_by(islands.c.island).subquery()
+        
+        row = db.execute(
+            select(
+                runs.c.run_start,
+                runs.c.run_end,
+                func.max(runs.c.length).over().label('longest')
+            ).order_by(runs.c.run_end.desc()).limit(1)
+        ).first()
         
-        # Calculate current streak
-        current_streak = 0
-        current_date = date.today()
+        if not row:
+            return None, None, 0
+        return row.run_start, row.run_end, row.longest
+    
+    @staticmethod
+    def _advance_streaks(
+        db: Session,
+        patient_id: int,
+        patient_medication_id: Optional[int],
+        changed_dates: List[date],
+        today: Optional[date] = None
+    ) -> tuple:
+        """
+        Update the persisted streak state after logs on changed_dates were written
+        Appending at the head of the history is O(1); anything else falls back to a rescan
+        """
+        state = db.query(AdherenceStreakState).filter(
+            AdherenceStreakState.patient_id == patient_id,
+            AdherenceStreakState.patient_medication_id == patient_medication_id
+        ).first()
         
-        while current_date in daily_logs:
-            day_logs = daily_logs[current_date]
-            all_taken = all(log.status == MedicationLogStatusEnum.taken for log in day_logs)
-            if all_taken and len(day_logs) > 0:
-                current_streak += 1
-                current_date -= timedelta(days=1)
-            else:
-                break
+        rescan = state is None
+        if state is None:
+            state = AdherenceStreakState(patient_id=patient_id, patient_medication_id=patient_medication_id)
+            db.add(state)
         
-        # Calculate longest streak
-        longest_streak = 0
-        temp_streak = 0
-        sorted_dates = sorted(daily_logs.keys(), reverse=True)
+        if not rescan:
+            for changed_date in sorted(set(changed_dates)):
+                if not AdherenceService._extend_streak_state(db, state, changed_date):
+                    rescan = True
+                    break
         
-        for i, current_date in enumerate(sorted_dates):
-            day_logs = daily_logs[current_date]
-            all_taken = all(log.status == MedicationLogStatusEnum.taken for log in day_logs)
-            
-            if all_taken and len(day_logs) > 0:
-                temp_streak += 1
-                longest_streak = max(longest_streak, temp_streak)
-            else:
-                temp_streak = 0
+        if rescan:
+            state.run_start, state.run_end, state.longest_streak = AdherenceService._scan_streaks(
+                db, patient_id, patient_medication_id
+            )
         
-        return current_streak, longest_streak
+        return AdherenceService._streak_tuple(state.run_start, state.run_end, state.longest_streak, today)
     
     @staticmethod
-    def _recalculate_stats(db: Session, patient_id: int, patient_medication_id: Optional[int] = None):
-        """Trigger recalculation of all stat periods"""
-        for period_type in ["daily", "weekly", "monthly", "overall"]:
-            today = date.today()
-            
-            if period_type == "daily":
-                period_start, period_end = today, today
-            elif period_type == "weekly":
-                period_start = today - timedelta(days=7)
-                period_end = today
-            elif period_type == "monthly":
-                period_start = today - timedelta(days=30)
-                period_end = today
-            else:
-                period_start = date(2020, 1, 1)
-                period_end = today
-            
-            AdherenceService._calculate_stats(db, patient_id, period_type, period_start, period_end, patient_medication_id)
+    def _extend_streak_state(db: Session, state: AdherenceStreakState, changed_date: date) -> bool:
+        """Apply one changed day to the latest run; returns False if history needs a rescan"""
+        perfect = AdherenceService._is_perfect_day(db, state.patient_id, state.patient_medication_id, changed_date)
+        
+        if state.run_end is None or changed_date > state.run_end + timedelta(days=1):
+            # Days between the last run and this one are not perfect, so this starts a new run
+            if perfect:
+                state.run_start = state.run_end = changed_date
+        elif changed_date == state.run_end + timedelta(days=1):
+            if perfect:
+                state.run_end = changed_date
+        elif not (changed_date == state.run_end and perfect):
+            # Broke the latest run or edited older history
+            return False
+        
+        if state.run_end is not None:
+            state.longest_streak = max(state.longest_streak or 0, (state.run_end - state.run_start).days + 1)
+        return True
     
     @staticmethod
-    def get_chart_data(db: Session, patient_id: int, days: int = 7) -> List[AdherenceChartData]:
-        """Get adherence chart data for visualization"""
-        end_date = date.today()
-        start_date = end_date - timedelta(days=days)
-        
-        chart_data = []
+    def _is_perfect_day(db: Session, patient_id: int, patient_medication_id: Optional[int], day: date) -> bool:
+        """Whether a day has logs and every one of them was taken"""
+        query = db.query(
+            func.count(MedicationLog.id),
+            func.sum(case((MedicationLog.status != MedicationLogStatusEnum.taken, 1), else_=0))
+        ).filter(
+            MedicationLog.patient_id == patient_id,
+            MedicationLog.scheduled_date == day
+        )
         
-        for i in range(days + 1):
-            current_date = start_date + timedelta(days=i)
-            
-            # Get logs for this date
-            logs = db.query(MedicationLog).filter(
-                MedicationLog.patient_id == patient_id,
-                MedicationLog.scheduled_date == current_date
-            ).all()
-            
-            scheduled = len(logs)
-            taken = sum(1 for log in logs if log.status == MedicationLogStatusEnum.taken)
-            score = (taken / scheduled * 100) if scheduled > 0 else 0
-            
-            # Determine status
-            if score >= 90:
-                status_str = "excellent"
-            elif score >= 70:
-                status_str = "good"
-            elif score >= 50:
-                status_str = "fair"
-            else:
-                status_str = "poor"
-            
-            chart_data.append(AdherenceChartData(
-                date=current_date,
-                score=score,
-                taken=taken,
-                scheduled=scheduled,
-                status=status_str
-            ))
+        if patient_medication_id:
+            query = query.filter(MedicationLog.patient_medication_id == patient_medication_id)
         
-        return chart_data
+        total, not_taken = query.one()
+        return bool(total) and not not_taken
     
     @staticmethod
-    def get_dashboard(db: Session, patient_id: int) -> Dict:
-        """Get complete adherence dashboard data"""
-        overall_stats = AdherenceService.get_adherence_stats(db, patient_id, "overall")
-        weekly_stats = AdherenceService.get_adherence_stats(db, patient_id, "weekly")
-        daily_stats = AdherenceService.get_adherence_stats(db, patient_id, "daily")
-        chart_data = AdherenceService.get_chart_data(db, patient_id, 7)
-        
-        # Get recent logs
-        recent_logs = AdherenceService.get_patient_logs(db, patient_id, limit=10)
-        
-        return {
-            "overall_stats": overall_stats,
-            "weekly_stats": weekly_stats,
-            "daily_stats": daily_stats,
-            "chart_data": chart_data,
-            "recent_logs": recent_logs
-        }
+    def _streak_tuple(run_start: Optional[date], run_end: Optional[date], longest_streak: int, today: Optional[date] = None) -> tuple:
+        """Current streak only counts if the latest run reaches today"""
+        today = today or date.today()
+        current_streak = (run_end - run_start).days + 1 if run_end == today else 0
+        return current_streak, longest_streak or 0
+    
+    @staticmethod
+    def _recalculate_stats(db: Session, patient_id: int, patient_medication_id: Optional[int] = None):
+        """
+        Full recalculation of all stat periods
+        Log writes use AdherenceStatsEngine instead; this remains for rebuilding stats from scratch
+        """
+        for period_type in PERIOD_TYPES:
+            period_start, period_end = period_bounds(period_type)
+            AdherenceService._calculate_stats(db, patient_id, period_type, period_start, period_end, patient_medication_id)
     
     @staticmethod
     def delete_medication_log(db: Session, log_id: int, patient_id: int) -> None:
@@ -416,18 +682,43 @@ class AdherenceService:
                 detail="You can only delete your own medication logs"
             )
         
+        before = AdherenceStatsEngine.snapshot(log)
+        patient_medication_id = log.patient_medication_id
+        
         db.delete(log)
+        db.flush()
+        
+        # Remove the dose from the stored stats
+        AdherenceStatsEngine.apply_change(db, patient_id, patient_medication_id, before=before, after=None)
+        
+        DataVersions.bump(db, "medication_logs", patient_id)
         db.commit()
     
     @staticmethod
-    def get_dashboard(db: Session, patient_id: int) -> AdherenceDashboard:
+    def get_dashboard(
+        db: Session,
+        patient_id: int,
+        background_tasks: Optional[BackgroundTasks] = None,
+        versions: Optional[Dict[str, int]] = None
+    ) -> AdherenceDashboard:
         """
         Get complete adherence dashboard for a patient
+        Served from dashboard_cache, keyed by the data versions the dashboard depends on
+        (pass them if already read). Writes bump a version, so a dashboard computed before
+        a write can only be stored under the old key and is never served after it.
         """
+        if versions is None:
+            versions = DataVersions.current(db, dashboard_version_keys(patient_id))
+        cache_key = dashboard_cache_key(patient_id, versions)
+        
+        cached = dashboard_cache.get(cache_key)
+        if cached is not None:
+            return AdherenceDashboard.model_validate_json(cached)
+        
         # Get stats for different periods
-        overall_stats = AdherenceService.get_adherence_stats(db, patient_id, "overall")
-        weekly_stats = AdherenceService.get_adherence_stats(db, patient_id, "weekly")
-        daily_stats = AdherenceService.get_adherence_stats(db, patient_id, "daily")
+        overall_stats = AdherenceService.get_adherence_stats(db, patient_id, "overall", background_tasks=background_tasks)
+        weekly_stats = AdherenceService.get_adherence_stats(db, patient_id, "weekly", background_tasks=background_tasks)
+        daily_stats = AdherenceService.get_adherence_stats(db, patient_id, "daily", background_tasks=background_tasks)
         
         # Get chart data for last 7 days
         chart_data = AdherenceService.get_chart_data(db, patient_id, 7)
@@ -437,50 +728,68 @@ class AdherenceService:
             MedicationLog.patient_id == patient_id
         ).order_by(MedicationLog.created_at.desc()).limit(10).all()
         
-        return AdherenceDashboard(
+        dashboard = AdherenceDashboard(
             overall_stats=overall_stats,
             weekly_stats=weekly_stats,
             daily_stats=daily_stats,
             chart_data=chart_data,
             recent_logs=recent_logs
         )
+        dashboard_cache.set(cache_key, dashboard.model_dump_json())
+        return dashboard
     
     @staticmethod
-    def get_chart_data(db: Session, patient_id: int, days: int = 7) -> List[AdherenceChartData]:
+    def get_chart_data(
+        db: Session,
+        patient_id: int,
+        days: int = 7,
+        patient_medication_id: Optional[int] = None
+    ) -> List[AdherenceChartData]:
         """
-        Get adherence chart data for the last N days
+        Get adherence chart data for the last N days (plus today)
+        One grouped query over the daily rollup; days without logs are filled in here
         """
+        days = max(1, min(days, CHART_MAX_DAYS))
         end_date = date.today()
-        start_date = end_date - timedelta(days=days-1)
+        start_date = end_date - timedelta(days=days)
         
-        chart_data = []
-        current_date = start_date
+        query = db.query(DailyAdherenceRollup.date, *AdherenceRollup.totals()).filter(
+            DailyAdherenceRollup.patient_id == patient_id,
+            DailyAdherenceRollup.date >= start_date,
+            DailyAdherenceRollup.date <= end_date
+        )
         
-        while current_date <= end_date:
-            # Get logs for this date
-            logs = db.query(MedicationLog).filter(
-                MedicationLog.patient_id == patient_id,
-                MedicationLog.scheduled_date == current_date
-            ).all()
-            
-            taken = sum(1 for log in logs if log.status == MedicationLogStatusEnum.taken)
-            scheduled = len(logs)
-            
-            if scheduled > 0:
-                score = (taken / scheduled) * 100
-                status = "excellent" if score >= 90 else "good" if score >= 75 else "fair" if score >= 60 else "poor"
-            else:
-                score = 0
-                status = "no_data"
+        if patient_medication_id:
+            query = query.filter(DailyAdherenceRollup.patient_medication_id == patient_medication_id)
+        
+        daily_counts = {
+            row.date: (row.scheduled, row.taken)
+            for row in query.group_by(DailyAdherenceRollup.date).all()
+        }
+        
+        chart_data = []
+        for i in range(days + 1):
+            current_date = start_date + timedelta(days=i)
+            scheduled, taken = daily_counts.get(current_date, (0, 0))
+            score = (taken / scheduled * 100) if scheduled > 0 else 0
             
             chart_data.append(AdherenceChartData(
                 date=current_date,
                 score=round(score, 1),
                 taken=taken,
                 scheduled=scheduled,
-                status=status
+                status=AdherenceService._chart_status(score)
             ))
-            
-            current_date += timedelta(days=1)
         
         return chart_data
+    
+    @staticmethod
+    def _chart_status(score: float) -> str:
+        """Map a daily adherence score to a chart status"""
+        if score >= 90:
+            return "excellent"
+        elif score >= 70:
+            return "good"
+        elif score >= 50:
+            return "fair"
+        return "poor"
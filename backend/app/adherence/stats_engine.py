@@ -0,0 +1,348 @@
+"""
+Incremental adherence stats engine
+Applies the delta of a single MedicationLog write to the stored AdherenceStats rows
+and the daily rollup instead of recounting the patient's whole log history on every write
+"""
+import logging
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, case, func
+from sqlalchemy.orm import Session
+
+from app.adherence.models import MedicationLog, AdherenceStats, MedicationLogStatusEnum
+from app.adherence.rollup import AdherenceRollup
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+PERIOD_TYPES = ("daily", "weekly", "monthly", "overall")
+OVERALL_PERIOD_START = date(2020, 1, 1)  # Far past
+
+COUNTER_FIELDS = ("total_scheduled", "total_taken", "total_skipped", "total_missed", "on_time_taken")
+
+# The parts of a log that affect adherence counters
+LogSnapshot = namedtuple("LogSnapshot", ["scheduled_date", "status", "on_time"])
+
+
+def period_bounds(period_type: str, today: Optional[date] = None) -> Tuple[date, date]:
+    """Return the (start, end) dates of a stats period ending today"""
+    today = today or date.today()
+
+    if period_type == "daily":
+        return today, today
+    if period_type == "weekly":
+        return today - timedelta(days=7), today
+    if period_type == "monthly":
+        return today - timedelta(days=30), today
+    return OVERALL_PERIOD_START, today
+
+
+class AdherenceStatsEngine:
+    """Keeps AdherenceStats counters up to date one log write at a time"""
+
+    @staticmethod
+    def snapshot(log: Optional[MedicationLog]) -> Optional[LogSnapshot]:
+        """Capture the counter-relevant state of a log (None for a missing log)"""
+        if log is None:
+            return None
+        return LogSnapshot(
+            scheduled_date=log.scheduled_date,
+            status=MedicationLogStatusEnum(log.status),
+            on_time=bool(log.on_time)
+        )
+
+    @staticmethod
+    def count_logs(
+        db: Session,
+        patient_id: int,
+        patient_medication_id: Optional[int],
+        start_date: date,
+        end_date: date,
+        exclude_log_id: Optional[int] = None
+    ) -> Dict[str, int]:
+        """Count logs per status in a date range with a single aggregate query"""
+        counters = dict.fromkeys(COUNTER_FIELDS, 0)
+        if start_date > end_date:
+            return counters
+
+        taken = MedicationLog.status == MedicationLogStatusEnum.taken
+        query = db.query(
+            func.count(MedicationLog.id).label('total_scheduled'),
+            func.sum(case((taken, 1), else_=0)).label('total_taken'),
+            func.sum(case((MedicationLog.status == MedicationLogStatusEnum.skipped, 1), else_=0)).label('total_skipped'),
+            func.sum(case((MedicationLog.status == MedicationLogStatusEnum.missed, 1), else_=0)).label('total_missed'),
+            func.sum(case((and_(taken, MedicationLog.on_time == True), 1), else_=0)).label('on_time_taken')
+        ).filter(
+            MedicationLog.patient_id == patient_id,
+            MedicationLog.scheduled_date >= start_date,
+            MedicationLog.scheduled_date <= end_date
+        )
+
+        if patient_medication_id:
+            query = query.filter(MedicationLog.patient_medication_id == patient_medication_id)
+        if exclude_log_id:
+            query = query.filter(MedicationLog.id != exclude_log_id)
+
+        row = query.one()
+        for field in COUNTER_FIELDS:
+            counters[field] = getattr(row, field) or 0
+        return counters
+
+    @staticmethod
+    def apply_change(
+        db: Session,
+        patient_id: int,
+        patient_medication_id: int,
+        before: Optional[LogSnapshot],
+        after: Optional[LogSnapshot],
+        log_id: Optional[int] = None,
+        today: Optional[date] = None
+    ) -> None:
+        """
+        Apply one log insert (before=None), update, or delete (after=None)
+        to the daily rollup and the medication-level and patient-level stats rows.
+        The stats rows stay locked until the caller commits, so concurrent writes for
+        the same patient apply their deltas one after the other. The change must already be flushed.
+        """
+        from app.adherence.services import AdherenceService
+
+        today = today or date.today()
+        AdherenceRollup.apply_change(db, patient_id, patient_medication_id, before, after)
+        rows = AdherenceStatsEngine._load_rows(db, patient_id, patient_medication_id, lock=True)
+
+        changed_dates = [snap.scheduled_date for snap in (before, after) if snap is not None]
+
+        for scope in (patient_medication_id, None):
+            current_streak, longest_streak = AdherenceService._advance_streaks(
+                db, patient_id, scope, changed_dates, today=today
+            )
+
+            for period_type in PERIOD_TYPES:
+                period_start, period_end = period_bounds(period_type, today)
+                stats = rows.get((scope, period_type))
+
+                if stats is None or not AdherenceStatsEngine._can_roll(stats, period_start, period_end):
+                    # No usable baseline: count once, the result already includes this change
+                    counters = AdherenceStatsEngine.count_logs(db, patient_id, scope, period_start, period_end)
+                    if stats is None:
+                        stats = AdherenceStats(patient_id=patient_id, patient_medication_id=scope, period_type=period_type)
+                        db.add(stats)
+                else:
+                    counters = AdherenceStatsEngine._counters_from_row(stats)
+                    AdherenceStatsEngine._roll_window(
+                        db, counters, patient_id, scope, stats.period_start, stats.period_end,
+                        period_start, period_end, log_id
+                    )
+                    AdherenceStatsEngine._apply_snapshot(counters, before, -1, stats.period_start, stats.period_end)
+                    AdherenceStatsEngine._apply_snapshot(counters, after, 1, period_start, period_end)
+
+                AdherenceStatsEngine._write_row(stats, counters, period_start, period_end, current_streak, longest_streak)
+
+        if settings.ADHERENCE_STATS_VERIFY:
+            db.flush()
+            for mismatch in AdherenceStatsEngine.verify(db, patient_id, patient_medication_id, today=today, repair=True):
+                logger.warning("Incremental adherence stats drifted: %s", mismatch)
+
+    @staticmethod
+    def refresh(
+        db: Session,
+        patient_id: int,
+        patient_medication_ids: Iterable[int],
+        changed_dates: Iterable[date],
+        today: Optional[date] = None
+    ) -> None:
+        """
+        Recount the stats rows once per medication after a batch of writes,
+        plus once for the patient-level rows, and rebuild the touched rollup days.
+        The batch must already be flushed.
+        """
+        from app.adherence.services import AdherenceService
+
+        today = today or date.today()
+        changed_dates = list(changed_dates)
+        scopes = sorted(set(patient_medication_ids)) + [None]
+        if changed_dates:
+            AdherenceRollup.rebuild(db, patient_id, scopes[:-1], changed_dates)
+
+        for scope in scopes:
+            rows = {
+                period_type: row for (row_scope, period_type), row
+                in AdherenceStatsEngine._load_rows(db, patient_id, scope, lock=True).items() if row_scope == scope
+            }
+            current_streak, longest_streak = AdherenceService._advance_streaks(
+                db, patient_id, scope, changed_dates, today=today
+            )
+
+            for period_type in PERIOD_TYPES:
+                period_start, period_end = period_bounds(period_type, today)
+                counters = AdherenceStatsEngine.count_logs(db, patient_id, scope, period_start, period_end)
+                stats = rows.get(period_type)
+                if stats is None:
+                    stats = AdherenceStats(patient_id=patient_id, patient_medication_id=scope, period_type=period_type)
+                    db.add(stats)
+                AdherenceStatsEngine._write_row(stats, counters, period_start, period_end, current_streak, longest_streak)
+
+    @staticmethod
+    def verify(
+        db: Session,
+        patient_id: int,
+        patient_medication_id: Optional[int] = None,
+        today: Optional[date] = None,
+        repair: bool = False
+    ) -> List[str]:
+        """
+        Compare stored stats rows against a full recount.
+        Returns a description of every mismatch; with repair=True the row is corrected.
+        """
+        today = today or date.today()
+        rows = AdherenceStatsEngine._load_rows(db, patient_id, patient_medication_id)
+        mismatches = []
+
+        for (scope, period_type), stats in rows.items():
+            period_start, period_end = period_bounds(period_type, today)
+            expected = AdherenceStatsEngine.count_logs(db, patient_id, scope, period_start, period_end)
+            actual = AdherenceStatsEngine._counters_from_row(stats)
+            window_ok = (stats.period_start, stats.period_end) == (period_start, period_end)
+
+            diff = {field: (actual[field], expected[field]) for field in COUNTER_FIELDS if actual[field] != expected[field]}
+            if diff or not window_ok:
+                mismatches.append(
+                    f"patient={patient_id} medication={scope} period={period_type} "
+                    f"window_ok={window_ok} diff={diff}"
+                )
+                if repair:
+                    AdherenceStatsEngine._write_row(
+                        stats, expected, period_start, period_end, stats.current_streak or 0, stats.longest_streak or 0
+                    )
+
+        return mismatches
+
+    # ==================== INTERNAL HELPERS ====================
+
+    @staticmethod
+    def _load_rows(
+        db: Session,
+        patient_id: int,
+        patient_medication_id: Optional[int],
+        lock: bool = False
+    ) -> Dict[tuple, AdherenceStats]:
+        """
+        Load the stats rows for a medication and the patient-level rows in one query.
+        With lock=True they are read fresh and locked (SELECT ... FOR UPDATE) until commit.
+        """
+        scope_filter = AdherenceStats.patient_medication_id.is_(None)
+        if patient_medication_id:
+            scope_filter = scope_filter | (AdherenceStats.patient_medication_id == patient_medication_id)
+
+        query = db.query(AdherenceStats).filter(
+            AdherenceStats.patient_id == patient_id,
+            AdherenceStats.period_type.in_(PERIOD_TYPES),
+            scope_filter
+        )
+        if lock:
+            query = query.with_for_update().populate_existing()
+        rows = query.all()
+        return {(row.patient_medication_id, row.period_type): row for row in rows}
+
+    @staticmethod
+    def _can_roll(stats: AdherenceStats, period_start: date, period_end: date) -> bool:
+        """A stored window can be rolled forward if it overlaps the new one"""
+        if stats.period_start is None or stats.period_end is None:
+            return False
+        if stats.period_start > period_start or stats.period_end > period_end:
+            return False
+        window_days = (period_end - period_start).days + 1
+        return (period_start - stats.period_start).days < window_days
+
+    @staticmethod
+    def _roll_window(
+        db: Session,
+        counters: Dict[str, int],
+        patient_id: int,
+        scope: Optional[int],
+        old_start: date,
+        old_end: date,
+        new_start: date,
+        new_end: date,
+        log_id: Optional[int]
+    ) -> None:
+        """Drop the days that left the window and add the days that entered it"""
+        if new_start > old_start:
+            dropped = AdherenceStatsEngine.count_logs(
+                db, patient_id, scope, old_start, new_start - timedelta(days=1), exclude_log_id=log_id
+            )
+            for field in COUNTER_FIELDS:
+                counters[field] -= dropped[field]
+
+        if new_end > old_end:
+            added = AdherenceStatsEngine.count_logs(
+                db, patient_id, scope, old_end + timedelta(days=1), new_end, exclude_log_id=log_id
+            )
+            for field in COUNTER_FIELDS:
+                counters[field] += added[field]
+
+    @staticmethod
+    def _apply_snapshot(
+        counters: Dict[str, int],
+        snapshot: Optional[LogSnapshot],
+        sign: int,
+        period_start: date,
+        period_end: date
+    ) -> None:
+        """Add (sign=1) or remove (sign=-1) one log's contribution if it falls in the window"""
+        if snapshot is None or not (period_start <= snapshot.scheduled_date <= period_end):
+            return
+
+        counters["total_scheduled"] += sign
+        if snapshot.status == MedicationLogStatusEnum.taken:
+            counters["total_taken"] += sign
+            if snapshot.on_time:
+                counters["on_time_taken"] += sign
+        elif snapshot.status == MedicationLogStatusEnum.skipped:
+            counters["total_skipped"] += sign
+        elif snapshot.status == MedicationLogStatusEnum.missed:
+            counters["total_missed"] += sign
+
+    @staticmethod
+    def _counters_from_row(stats: AdherenceStats) -> Dict[str, int]:
+        """Read counters back from a stats row"""
+        total_taken = stats.total_taken or 0
+        on_time_taken = stats.on_time_taken
+        if on_time_taken is None:
+            # Row from before the on_time_taken column: derive it from the score once
+            on_time_taken = int(round((stats.on_time_score or 0.0) * total_taken / 100))
+        return {
+            "total_scheduled": stats.total_scheduled or 0,
+            "total_taken": total_taken,
+            "total_skipped": stats.total_skipped or 0,
+            "total_missed": stats.total_missed or 0,
+            "on_time_taken": on_time_taken
+        }
+
+    @staticmethod
+    def _write_row(
+        stats: AdherenceStats,
+        counters: Dict[str, int],
+        period_start: date,
+        period_end: date,
+        current_streak: int,
+        longest_streak: int
+    ) -> None:
+        """Store counters and derived scores on a stats row"""
+        total_scheduled = counters["total_scheduled"]
+        total_taken = counters["total_taken"]
+
+        stats.period_start = period_start
+        stats.period_end = period_end
+        stats.total_scheduled = total_scheduled
+        stats.total_taken = total_taken
+        stats.total_skipped = counters["total_skipped"]
+        stats.total_missed = counters["total_missed"]
+        stats.on_time_taken = counters["on_time_taken"]
+        stats.adherence_score = (total_taken / total_scheduled * 100) if total_scheduled > 0 else 0.0
+        stats.on_time_score = (counters["on_time_taken"] / total_taken * 100) if total_taken > 0 else 0.0
+        stats.current_streak = current_streak
+        stats.longest_streak = longest_streak
+        stats.calculated_at = datetime.now(timezone.utc)
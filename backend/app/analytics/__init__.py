@@ -3,15 +3,31 @@ Analytics module for healthcare management system
 Provides analytics and reporting functionality for patients, medications, and adherence
 """
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 
+from app.auth.services import require_admin
+from app.cache.versions import conditional_get
 from .routes import adherence, patients, medications, html_routes
 
 # Create main analytics router
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
 # Include sub-routers
-router.include_router(adherence.router, prefix="/adherence", tags=["adherence-analytics"])
-router.include_router(patients.router, prefix="/patients", tags=["patient-analytics"])
-router.include_router(medications.router, prefix="/medications", tags=["medication-analytics"])
+# JSON endpoints answer If-None-Match with 304 while the data they read is unchanged
+router.include_router(
+    adherence.router, prefix="/adherence", tags=["adherence-analytics"],
+    dependencies=[Depends(conditional_get(
+        require_admin, "medication_logs", "patient_medications", "medications", "analytics_snapshots"
+    ))]
+)
+router.include_router(
+    patients.router, prefix="/patients", tags=["patient-analytics"],
+    dependencies=[Depends(conditional_get(require_admin, "patients", "analytics_snapshots"))]
+)
+router.include_router(
+    medications.router, prefix="/medications", tags=["medication-analytics"],
+    dependencies=[Depends(conditional_get(
+        require_admin, "medications", "patient_medications", "analytics_snapshots"
+    ))]
+)
 router.include_router(html_routes.router, tags=["analytics-html"])
\ No newline at end of file
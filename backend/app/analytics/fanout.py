@@ -0,0 +1,96 @@
+"""
+Parallel analytics panels
+Runs the independent service calls behind one analytics page concurrently,
+each on its own pooled session, so the page costs about as much as its slowest query
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.analytics.memo import MEMO_KEY
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def run_panels(
+    db: Session,
+    panels: Dict[str, Callable[[Session], Any]],
+    fallbacks: Optional[Dict[str, Any]] = None,
+    timeout: Optional[float] = None
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Run each panel call with a session of its own and collect the results by name.
+    A panel that raises or exceeds the timeout is logged and replaced by its fallback
+    (None if not given) instead of failing the page. Returns (results, degraded panel names).
+    Panels share the request's memo: an aggregate two panels need is computed once, the
+    second panel waiting for the first one's result if it is still running.
+    """
+    fallbacks = fallbacks or {}
+    timeout = timeout if timeout is not None else settings.ANALYTICS_PANEL_TIMEOUT_SECONDS
+    bind = db.get_bind()
+    memo = db.info.setdefault(MEMO_KEY, {})
+
+    results: Dict[str, Any] = {}
+    degraded: List[str] = []
+
+    # A single shared connection (in-memory SQLite) cannot serve queries in parallel
+    if settings.ANALYTICS_FANOUT_WORKERS <= 1 or isinstance(bind.pool, StaticPool):
+        for name, call in panels.items():
+            try:
+                results[name] = call(db)
+            except Exception:
+                logger.exception("Analytics panel %s failed", name)
+                db.rollback()
+                results[name] = fallbacks.get(name)
+                degraded.append(name)
+        return results, degraded
+
+    executor = _get_executor()
+    deadline = monotonic() + timeout
+    futures = {name: executor.submit(_run_panel, bind, memo, call) for name, call in panels.items()}
+
+    for name, future in futures.items():
+        try:
+            results[name] = future.result(timeout=max(deadline - monotonic(), 0))
+        except FuturesTimeout:
+            # Queued panels are dropped; a running query finishes in the background and is discarded
+            future.cancel()
+            logger.warning("Analytics panel %s timed out after %.1fs", name, timeout)
+            results[name] = fallbacks.get(name)
+            degraded.append(name)
+        except Exception:
+            logger.exception("Analytics panel %s failed", name)
+            results[name] = fallbacks.get(name)
+            degraded.append(name)
+
+    return results, degraded
+
+
+# ==================== INTERNAL HELPERS ====================
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Process-wide pool, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ANALYTICS_FANOUT_WORKERS,
+                thread_name_prefix="analytics-panel"
+            )
+        return _executor
+
+
+def _run_panel(bind, memo: dict, call: Callable[[Session], Any]) -> Any:
+    """One panel on its own session; the memo dict is shared with the request"""
+    with Session(bind=bind, info={MEMO_KEY: memo}) as session:
+        return call(session)
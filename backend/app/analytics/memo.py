@@ -0,0 +1,61 @@
+"""
+Request-scoped memoization for analytics services
+Results are stored on the SQLAlchemy session, which get_db creates once per HTTP request,
+so a page that needs the same aggregate several times runs it once
+"""
+
+import functools
+import inspect
+import threading
+from concurrent.futures import Future
+
+from sqlalchemy.orm import Session
+
+MEMO_KEY = "analytics_memo"
+
+# Guards only the lookup-or-claim of a memo entry, never the computation
+_claim_lock = threading.Lock()
+
+
+def request_memoized(func):
+    """
+    Memoize a service function whose first argument is the request's db session.
+    Keyed by function and (normalised) arguments; the memo lives and dies with the session.
+    The memo holds a Future per call, so when parallel panels (see fanout.run_panels) ask
+    for the same aggregate, the first computes it and the others wait for its result.
+    A call that raises is not memoized. Place it under @staticmethod.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(db: Session, *args, **kwargs):
+        bound = signature.bind(db, *args, **kwargs)
+        bound.apply_defaults()
+        key = (func.__qualname__, tuple(bound.arguments.items())[1:])
+
+        memo = db.info.setdefault(MEMO_KEY, {})
+        with _claim_lock:
+            future = memo.get(key)
+            owner = future is None
+            if owner:
+                future = memo[key] = Future()
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = func(db, *args, **kwargs)
+        except BaseException as e:
+            with _claim_lock:
+                memo.pop(key, None)
+            future.set_exception(e)
+            raise
+        future.set_result(result)
+        return result
+
+    return wrapper
+
+
+def clear_request_memo(db: Session) -> None:
+    """Forget memoized results, e.g. after the session wrote data the aggregates read"""
+    db.info.pop(MEMO_KEY, None)
@@ -0,0 +1,29 @@
+"""
+Analytics models
+Precomputed analytics snapshots served instead of live clinic-wide aggregates
+"""
+from sqlalchemy import Column, Integer, String, DateTime, Date, Text, UniqueConstraint
+from sqlalchemy.sql import func
+
+from app.database.db import Base
+
+
+class AnalyticsSnapshot(Base):
+    """
+    One precomputed analytics result (an overview, a trend series, ...) as of a date
+    The payload is the response schema serialized as JSON
+    """
+    __tablename__ = "analytics_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)  # adherence_overview, adherence_trends, ...
+    as_of = Column(Date, nullable=False)
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint('kind', 'as_of', name='uq_analytics_snapshots_kind_as_of'),
+    )
+
+    def __repr__(self):
+        return f"<AnalyticsSnapshot(kind={self.kind}, as_of={self.as_of})>"
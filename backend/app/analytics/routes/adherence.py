@@ -3,7 +3,7 @@ Adherence analytics routes
 Provides analytics for medication adherence tracking
 """
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import date, timedelta
@@ -14,9 +14,11 @@ from app.analytics.schemas.adherence import (
     AdherenceTrend,
     PatientAdherenceSummary,
     MedicationAdherenceDetail,
-    AdherenceStats
+    AdherenceStats,
+    PatientAdherenceScore
 )
 from app.analytics.services.adherence import AdherenceAnalyticsService
+from app.analytics.services.snapshots import AnalyticsSnapshotService, SNAPSHOT_WINDOW_DAYS
 from app.auth.services import require_admin
 from app.auth.models import User
 
@@ -24,13 +26,24 @@ router = APIRouter()
 
 
 @router.get("/overview", response_model=AdherenceOverview)
-async def get_adherence_overview(
+def get_adherence_overview(
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin),
     start_date: Optional[date] = Query(None, description="Start date for analysis"),
-    end_date: Optional[date] = Query(None, description="End date for analysis")
+    end_date: Optional[date] = Query(None, description="End date for analysis"),
+    as_of: Optional[date] = Query(None, description="Serve the snapshot in effect on this date"),
+    fresh: bool = Query(False, description="Recompute live instead of serving the latest snapshot")
 ):
-    """Get overall adherence statistics"""
+    """Get overall adherence statistics (last 30 days from the latest snapshot unless dates are given)"""
+    if not start_date and not end_date:
+        today = date.today()
+        return AnalyticsSnapshotService.serve(
+            db, response, "adherence_overview",
+            lambda: AdherenceAnalyticsService.get_adherence_overview(db, today - timedelta(days=SNAPSHOT_WINDOW_DAYS), today),
+            as_of, fresh
+        )
+
     if not start_date:
         start_date = date.today() - timedelta(days=30)
     if not end_date:
@@ -40,32 +53,44 @@ async def get_adherence_overview(
 
 
 @router.get("/trends", response_model=List[AdherenceTrend])
-async def get_adherence_trends(
+def get_adherence_trends(
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin),
     days: int = Query(30, description="Number of days to analyze", ge=1, le=365),
-    patient_id: Optional[int] = Query(None, description="Filter by specific patient")
+    patient_id: Optional[int] = Query(None, description="Filter by specific patient"),
+    as_of: Optional[date] = Query(None, description="Serve the snapshot in effect on this date"),
+    fresh: bool = Query(False, description="Recompute live instead of serving the latest snapshot")
 ):
-    """Get adherence trends over time"""
+    """Get adherence trends over time (clinic-wide 30-day trends come from the latest snapshot)"""
     end_date = date.today()
     start_date = end_date - timedelta(days=days)
 
+    if days == SNAPSHOT_WINDOW_DAYS and patient_id is None:
+        return AnalyticsSnapshotService.serve(
+            db, response, "adherence_trends",
+            lambda: AdherenceAnalyticsService.get_adherence_trends(db, start_date, end_date, None),
+            as_of, fresh
+        )
+
     return AdherenceAnalyticsService.get_adherence_trends(db, start_date, end_date, patient_id)
 
 
 @router.get("/patients", response_model=List[PatientAdherenceSummary])
-async def get_patient_adherence_summary(
+def get_patient_adherence_summary(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin),
     limit: int = Query(50, description="Number of patients to return", ge=1, le=1000),
-    min_adherence: Optional[float] = Query(None, description="Minimum adherence threshold (0-100)", ge=0, le=100)
+    min_adherence: Optional[float] = Query(None, description="Minimum adherence threshold (0-100)", ge=0, le=100),
+    skip: int = Query(0, description="Number of patients to skip", ge=0),
+    order: str = Query("desc", description="Order by adherence rate: asc (least adherent first) or desc", pattern="^(asc|desc)$")
 ):
     """Get adherence summary for all patients"""
-    return AdherenceAnalyticsService.get_patient_adherence_summary(db, limit, min_adherence)
+    return AdherenceAnalyticsService.get_patient_adherence_summary(db, limit, min_adherence, skip, order)
 
 
 @router.get("/medications", response_model=List[MedicationAdherenceDetail])
-async def get_medication_adherence_details(
+def get_medication_adherence_details(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin),
     medication_id: Optional[int] = Query(None, description="Filter by specific medication"),
@@ -76,7 +101,7 @@ async def get_medication_adherence_details(
 
 
 @router.get("/stats", response_model=AdherenceStats)
-async def get_adherence_stats(
+def get_adherence_stats(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin),
     patient_id: Optional[int] = Query(None, description="Filter by specific patient"),
@@ -86,4 +111,19 @@ async def get_adherence_stats(
     end_date = date.today()
     start_date = end_date - timedelta(days=days)
 
-    return AdherenceAnalyticsService.get_adherence_stats(db, start_date, end_date, patient_id)
\ No newline at end of file
+    return AdherenceAnalyticsService.get_adherence_stats(db, start_date, end_date, patient_id)
+
+
+@router.get("/scores", response_model=List[PatientAdherenceScore])
+def get_patient_adherence_scores(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin),
+    days: int = Query(30, description="Number of days to analyze", ge=1, le=365),
+    limit: int = Query(1000, description="Number of patients to return", ge=1, le=10000),
+    skip: int = Query(0, description="Number of patients to skip", ge=0)
+):
+    """Get improvement trend and consistency scores for every patient"""
+    end_date = date.today()
+    start_date = end_date - timedelta(days=days)
+
+    return AdherenceAnalyticsService.get_patient_adherence_scores(db, start_date, end_date, limit, skip)
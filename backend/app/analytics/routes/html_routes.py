@@ -10,6 +10,7 @@ from typing import Optional
 from datetime import date, timedelta
 
 from app.database.db import get_db
+from app.analytics.fanout import run_panels
 from app.analytics.services.adherence import AdherenceAnalyticsService
 from app.analytics.services.patients import PatientAnalyticsService
 from app.analytics.services.medications import MedicationAnalyticsService
@@ -21,13 +22,13 @@ templates = Jinja2Templates(directory="templates")
 
 
 @router.get("/test")
-async def test_html():
+def test_html():
     """Simple test HTML route"""
     return {"message": "HTML routes are working", "test": True}
 
 
 @router.get("/dashboard")
-async def analytics_dashboard(
+def analytics_dashboard(
     request: Request,
     db: Session = Depends(get_db),
     # current_user: User = Depends(require_admin)  # Temporarily disabled for testing
@@ -37,42 +38,39 @@ async def analytics_dashboard(
     today = date.today()
     start_date = today - timedelta(days=30)
 
-    # Gather all analytics data
-    adherence_overview = AdherenceAnalyticsService.get_adherence_overview(db, start_date, today)
-    adherence_trends = AdherenceAnalyticsService.get_adherence_trends(db, start_date, today, None)[:14]  # Last 14 days
-    patient_status = PatientAnalyticsService.get_patient_status_distribution(db)
-    medication_status = MedicationAnalyticsService.get_medication_status_distribution(db)
-    top_patients = AdherenceAnalyticsService.get_patient_adherence_summary(db, 10, None)[:5]  # Top 5
+    # Gather all analytics data concurrently
+    panels, degraded = run_panels(db, {
+        "adherence_overview": lambda session: AdherenceAnalyticsService.get_adherence_overview(session, start_date, today),
+        "adherence_trends": lambda session: AdherenceAnalyticsService.get_adherence_trends(session, start_date, today, None),
+        "patient_status": lambda session: PatientAnalyticsService.get_patient_status_distribution(session),
+        "medication_status": lambda session: MedicationAnalyticsService.get_medication_status_distribution(session),
+        "top_patients": lambda session: AdherenceAnalyticsService.get_patient_adherence_summary(session, 5, None),  # Top 5 by adherence rate
+        "patient_summary": lambda session: PatientAnalyticsService.get_patient_analytics_summary(session),
+        "medication_summary": lambda session: MedicationAnalyticsService.get_medication_analytics_summary(session),
+    }, fallbacks={"adherence_trends": [], "top_patients": []})
+
+    adherence_overview = panels["adherence_overview"]
+    adherence_trends = panels["adherence_trends"][:14]  # Last 14 days
+    patient_summary = panels["patient_summary"]
+    medication_summary = panels["medication_summary"]
 
     # Calculate overview metrics
     overview = {
-        "total_patients": len(PatientAnalyticsService.get_patient_analytics_summary(db).get("active_patients", 0)) if hasattr(PatientAnalyticsService.get_patient_analytics_summary(db), "get") else 0,
-        "total_medications": len(MedicationAnalyticsService.get_medication_analytics_summary(db).get("total_unique_medications", 0)) if hasattr(MedicationAnalyticsService.get_medication_analytics_summary(db), "get") else 0,
-        "average_adherence": adherence_overview.average_adherence_rate if hasattr(adherence_overview, "average_adherence_rate") else 0,
+        "total_patients": patient_summary.demographics.total_patients if patient_summary else 0,
+        "total_medications": medication_summary.usage_stats.total_medications if medication_summary else 0,
+        "average_adherence": adherence_overview.average_adherence_rate if adherence_overview else 0,
         "total_doses_today": sum(trend.doses_scheduled for trend in adherence_trends[-1:]) if adherence_trends else 0
     }
 
-    # Get actual patient and medication counts
-    try:
-        patient_summary = PatientAnalyticsService.get_patient_analytics_summary(db)
-        overview["total_patients"] = patient_summary.active_patients if hasattr(patient_summary, "active_patients") else 0
-    except:
-        overview["total_patients"] = 0
-
-    try:
-        medication_summary = MedicationAnalyticsService.get_medication_analytics_summary(db)
-        overview["total_medications"] = medication_summary.total_unique_medications if hasattr(medication_summary, "total_unique_medications") else 0
-    except:
-        overview["total_medications"] = 0
-
     return templates.TemplateResponse("dashboard.html", {
         "request": request,
         "active_page": "dashboard",
         "overview": overview,
         "trends": adherence_trends,
-        "patient_status": patient_status,
-        "medication_status": medication_status,
-        "top_patients": top_patients,
+        "patient_status": panels["patient_status"],
+        "medication_status": panels["medication_status"],
+        "top_patients": panels["top_patients"],
+        "degraded_panels": degraded,
         "current_time": today,
         "start_date": start_date,
         "end_date": today
@@ -80,7 +78,7 @@ async def analytics_dashboard(
 
 
 @router.get("/adherence")
-async def adherence_analytics_html(
+def adherence_analytics_html(
     request: Request,
     db: Session = Depends(get_db),
     # current_user: User = Depends(require_admin),  # Temporarily disabled for testing
@@ -90,58 +88,49 @@ async def adherence_analytics_html(
     end_date = date.today()
     start_date = end_date - timedelta(days=days)
 
-    overview = AdherenceAnalyticsService.get_adherence_overview(db, start_date, end_date)
-    trends = AdherenceAnalyticsService.get_adherence_trends(db, start_date, end_date, None)
-    patients = AdherenceAnalyticsService.get_patient_adherence_summary(db, 50, None)
-    medications = AdherenceAnalyticsService.get_medication_adherence_details(db, None, 50)
-    stats = AdherenceAnalyticsService.get_adherence_stats(db, start_date, end_date, None)
+    panels, degraded = run_panels(db, {
+        "overview": lambda session: AdherenceAnalyticsService.get_adherence_overview(session, start_date, end_date),
+        "trends": lambda session: AdherenceAnalyticsService.get_adherence_trends(session, start_date, end_date, None),
+        "patients": lambda session: AdherenceAnalyticsService.get_patient_adherence_summary(session, 50, None),
+        "medications": lambda session: AdherenceAnalyticsService.get_medication_adherence_details(session, None, 50),
+        "stats": lambda session: AdherenceAnalyticsService.get_adherence_stats(session, start_date, end_date, None),
+    }, fallbacks={"trends": [], "patients": [], "medications": []})
 
     return templates.TemplateResponse("adherence.html", {
         "request": request,
         "active_page": "adherence",
-        "overview": overview,
-        "trends": trends,
-        "patients": patients,
-        "medications": medications,
-        "stats": stats
+        **panels,
+        "degraded_panels": degraded
     })
 
 
 @router.get("/patients")
-async def patients_analytics_html(
+def patients_analytics_html(
     request: Request,
     db: Session = Depends(get_db),
     # current_user: User = Depends(require_admin)  # Temporarily disabled for testing
 ):
     """Patient analytics HTML view"""
-    demographics = PatientAnalyticsService.get_patient_demographics(db)
-    status_distribution = PatientAnalyticsService.get_patient_status_distribution(db)
-    registration_trends = PatientAnalyticsService.get_patient_registration_trends(db, date.today() - timedelta(days=90), date.today())
-    health_metrics = PatientAnalyticsService.get_patient_health_metrics(db)
-    summary = PatientAnalyticsService.get_patient_analytics_summary(db)
-
-    # Mock age distribution for now (would need to implement in service)
-    age_distribution = [
-        {"age_group": "18-30", "count": 15, "percentage": 25.0, "average_bmi": 22.5},
-        {"age_group": "31-50", "count": 25, "percentage": 41.7, "average_bmi": 24.8},
-        {"age_group": "51-70", "count": 18, "percentage": 30.0, "average_bmi": 26.2},
-        {"age_group": "70+", "count": 2, "percentage": 3.3, "average_bmi": 25.1}
-    ]
+    today = date.today()
+    panels, degraded = run_panels(db, {
+        "demographics": lambda session: PatientAnalyticsService.get_patient_demographics(session),
+        "status_distribution": lambda session: PatientAnalyticsService.get_patient_status_distribution(session),
+        "registration_trends": lambda session: PatientAnalyticsService.get_patient_registration_trends(session, today - timedelta(days=90), today),
+        "health_metrics": lambda session: PatientAnalyticsService.get_patient_health_metrics(session),
+        "summary": lambda session: PatientAnalyticsService.get_patient_analytics_summary(session),
+        "age_distribution": lambda session: PatientAnalyticsService.get_age_distribution(session),
+    }, fallbacks={"registration_trends": [], "age_distribution": []})
 
     return templates.TemplateResponse("patients.html", {
         "request": request,
         "active_page": "patients",
-        "demographics": demographics,
-        "status_distribution": status_distribution,
-        "registration_trends": registration_trends,
-        "health_metrics": health_metrics,
-        "age_distribution": age_distribution,
-        "summary": summary
+        **panels,
+        "degraded_panels": degraded
     })
 
 
 @router.get("/medications")
-async def medications_analytics_html(
+def medications_analytics_html(
     request: Request,
     db: Session = Depends(get_db),
     # current_user: User = Depends(require_admin),  # Temporarily disabled for testing
@@ -151,18 +140,17 @@ async def medications_analytics_html(
     end_date = date.today()
     start_date = end_date - timedelta(days=days)
 
-    usage_stats = MedicationAnalyticsService.get_medication_usage_stats(db, start_date, end_date)
-    popularity = MedicationAnalyticsService.get_medication_popularity(db, 20, None)
-    status_distribution = MedicationAnalyticsService.get_medication_status_distribution(db)
-    top_prescribed = MedicationAnalyticsService.get_top_prescribed_medications(db, start_date, end_date, 10)
-    summary = MedicationAnalyticsService.get_medication_analytics_summary(db)
+    panels, degraded = run_panels(db, {
+        "usage_stats": lambda session: MedicationAnalyticsService.get_medication_usage_stats(session, start_date, end_date),
+        "popularity": lambda session: MedicationAnalyticsService.get_medication_popularity(session, 20, None),
+        "status_distribution": lambda session: MedicationAnalyticsService.get_medication_status_distribution(session),
+        "top_prescribed": lambda session: MedicationAnalyticsService.get_top_prescribed_medications(session, start_date, end_date, 10),
+        "summary": lambda session: MedicationAnalyticsService.get_medication_analytics_summary(session),
+    }, fallbacks={"popularity": [], "top_prescribed": []})
 
     return templates.TemplateResponse("medications.html", {
         "request": request,
         "active_page": "medications",
-        "usage_stats": usage_stats,
-        "popularity": popularity,
-        "status_distribution": status_distribution,
-        "top_prescribed": top_prescribed,
-        "summary": summary
+        **panels,
+        "degraded_panels": degraded
     })
\ No newline at end of file
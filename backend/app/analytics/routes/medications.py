@@ -3,7 +3,7 @@ Medication analytics routes
 Provides analytics for medication usage and management
 """
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import date, timedelta
@@ -17,6 +17,7 @@ from app.analytics.schemas.medications import (
     TopPrescribedMedications
 )
 from app.analytics.services.medications import MedicationAnalyticsService
+from app.analytics.services.snapshots import AnalyticsSnapshotService, SNAPSHOT_WINDOW_DAYS
 from app.auth.services import require_admin
 from app.auth.models import User
 
@@ -24,13 +25,24 @@ router = APIRouter()
 
 
 @router.get("/usage-stats", response_model=MedicationUsageStats)
-async def get_medication_usage_stats(
+def get_medication_usage_stats(
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin),
     start_date: Optional[date] = Query(None, description="Start date for analysis"),
-    end_date: Optional[date] = Query(None, description="End date for analysis")
+    end_date: Optional[date] = Query(None, description="End date for analysis"),
+    as_of: Optional[date] = Query(None, description="Serve the snapshot in effect on this date"),
+    fresh: bool = Query(False, description="Recompute live instead of serving the latest snapshot")
 ):
-    """Get overall medication usage statistics"""
+    """Get overall medication usage statistics (last 30 days from the latest snapshot unless dates are given)"""
+    if not start_date and not end_date:
+        today = date.today()
+        return AnalyticsSnapshotService.serve(
+            db, response, "medication_usage_stats",
+            lambda: MedicationAnalyticsService.get_medication_usage_stats(db, today - timedelta(days=SNAPSHOT_WINDOW_DAYS), today),
+            as_of, fresh
+        )
+
     if not start_date:
         start_date = date.today() - timedelta(days=30)
     if not end_date:
@@ -40,7 +52,7 @@ async def get_medication_usage_stats(
 
 
 @router.get("/popularity", response_model=List[MedicationPopularity])
-async def get_medication_popularity(
+def get_medication_popularity(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin),
     limit: int = Query(20, description="Number of medications to return", ge=1, le=100),
@@ -51,7 +63,7 @@ async def get_medication_popularity(
 
 
 @router.get("/status-distribution", response_model=MedicationStatusDistribution)
-async def get_medication_status_distribution(
+def get_medication_status_distribution(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
@@ -60,7 +72,7 @@ async def get_medication_status_distribution(
 
 
 @router.get("/top-prescribed", response_model=List[TopPrescribedMedications])
-async def get_top_prescribed_medications(
+def get_top_prescribed_medications(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin),
     days: int = Query(30, description="Number of days to analyze", ge=1, le=365),
@@ -74,7 +86,7 @@ async def get_top_prescribed_medications(
 
 
 @router.get("/summary", response_model=MedicationAnalyticsSummary)
-async def get_medication_analytics_summary(
+def get_medication_analytics_summary(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
@@ -3,7 +3,7 @@ Patient analytics routes
 Provides analytics for patient management and demographics
 """
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import date, timedelta
@@ -14,9 +14,11 @@ from app.analytics.schemas.patients import (
     PatientStatusDistribution,
     PatientRegistrationTrend,
     PatientHealthMetrics,
+    PatientAgeGroup,
     PatientAnalyticsSummary
 )
 from app.analytics.services.patients import PatientAnalyticsService
+from app.analytics.services.snapshots import AnalyticsSnapshotService
 from app.auth.services import require_admin
 from app.auth.models import User
 
@@ -24,25 +26,39 @@ router = APIRouter()
 
 
 @router.get("/demographics", response_model=PatientDemographics)
-async def get_patient_demographics(
+def get_patient_demographics(
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin)
+    current_user: User = Depends(require_admin),
+    as_of: Optional[date] = Query(None, description="Serve the snapshot in effect on this date"),
+    fresh: bool = Query(False, description="Recompute live instead of serving the latest snapshot")
 ):
     """Get patient demographic statistics"""
-    return PatientAnalyticsService.get_patient_demographics(db)
+    return AnalyticsSnapshotService.serve(
+        db, response, "patient_demographics",
+        lambda: PatientAnalyticsService.get_patient_demographics(db),
+        as_of, fresh
+    )
 
 
 @router.get("/status-distribution", response_model=PatientStatusDistribution)
-async def get_patient_status_distribution(
+def get_patient_status_distribution(
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin)
+    current_user: User = Depends(require_admin),
+    as_of: Optional[date] = Query(None, description="Serve the snapshot in effect on this date"),
+    fresh: bool = Query(False, description="Recompute live instead of serving the latest snapshot")
 ):
     """Get distribution of patients by health status"""
-    return PatientAnalyticsService.get_patient_status_distribution(db)
+    return AnalyticsSnapshotService.serve(
+        db, response, "patient_status_distribution",
+        lambda: PatientAnalyticsService.get_patient_status_distribution(db),
+        as_of, fresh
+    )
 
 
 @router.get("/registration-trends", response_model=List[PatientRegistrationTrend])
-async def get_patient_registration_trends(
+def get_patient_registration_trends(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin),
     days: int = Query(90, description="Number of days to analyze", ge=7, le=365)
@@ -55,7 +71,7 @@ async def get_patient_registration_trends(
 
 
 @router.get("/health-metrics", response_model=PatientHealthMetrics)
-async def get_patient_health_metrics(
+def get_patient_health_metrics(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
@@ -63,8 +79,17 @@ async def get_patient_health_metrics(
     return PatientAnalyticsService.get_patient_health_metrics(db)
 
 
+@router.get("/age-distribution", response_model=List[PatientAgeGroup])
+def get_patient_age_distribution(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """Get patient counts with average age and BMI per age group"""
+    return PatientAnalyticsService.get_age_distribution(db)
+
+
 @router.get("/summary", response_model=PatientAnalyticsSummary)
-async def get_patient_analytics_summary(
+def get_patient_analytics_summary(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
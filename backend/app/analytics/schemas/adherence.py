@@ -67,4 +67,14 @@ class AdherenceStats(BaseModel):
     adherence_by_hour: dict = Field(..., description="Adherence rate by hour of day")
     adherence_by_day: dict = Field(..., description="Adherence rate by day of week")
     improvement_trend: float = Field(..., description="Adherence improvement trend (percentage points per week)")
-    consistency_score: float = Field(..., description="Consistency score (0-100, higher = more consistent)")
\ No newline at end of file
+    consistency_score: float = Field(..., description="Consistency score (0-100, higher = more consistent)")
+
+
+class PatientAdherenceScore(BaseModel):
+    """Trend and consistency scores for one patient"""
+    patient_id: int
+    patient_name: str
+    adherence_rate: float = Field(..., description="Patient's adherence rate over the period (0-100)")
+    days_with_doses: int = Field(..., description="Days in the period with at least one scheduled dose")
+    improvement_trend: float = Field(..., description="Least-squares slope of the daily adherence rate (percentage points per week)")
+    consistency_score: float = Field(..., description="Consistency score (0-100, higher = less day-to-day variation)")
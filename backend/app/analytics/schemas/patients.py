@@ -4,7 +4,7 @@ Pydantic models for patient analytics responses
 """
 
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Union
 from datetime import date
 
 
@@ -39,12 +39,21 @@ class PatientHealthMetrics(BaseModel):
     average_bmi: Optional[float] = Field(None, description="Average BMI of patients")
     bmi_distribution: Dict[str, int] = Field(..., description="BMI distribution (underweight, normal, overweight, obese)")
     patients_with_allergies: int = Field(..., description="Number of patients with recorded allergies")
-    common_allergies: List[Dict[str, str]] = Field(..., description="Most common allergies")
+    common_allergies: List[Dict[str, Union[str, int]]] = Field(..., description="Most common allergies")
     average_height: Optional[float] = Field(None, description="Average height in cm")
     average_weight: Optional[float] = Field(None, description="Average weight in kg")
     patients_with_medical_history: int = Field(..., description="Number of patients with medical history")
 
 
+class PatientAgeGroup(BaseModel):
+    """Patient count and averages for one age group"""
+    age_group: str = Field(..., description="Age group (under_18, 18_29, 30_49, 50_69, 70_plus)")
+    count: int
+    percentage: float = Field(..., description="Share of patients with a known date of birth")
+    average_age: Optional[float] = Field(None, description="Average age in the group")
+    average_bmi: Optional[float] = Field(None, description="Average BMI in the group")
+
+
 class PatientAnalyticsSummary(BaseModel):
     """Comprehensive patient analytics summary"""
     demographics: PatientDemographics
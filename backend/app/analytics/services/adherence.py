@@ -9,23 +9,29 @@ from typing import List, Optional
 from datetime import date, datetime, timedelta
 from collections import defaultdict
 
+from app.analytics.memo import request_memoized
 from app.analytics.schemas.adherence import (
     AdherenceOverview,
     AdherenceTrend,
     PatientAdherenceSummary,
     MedicationAdherenceDetail,
-    AdherenceStats
+    AdherenceStats,
+    PatientAdherenceScore
 )
-from app.adherence.models import MedicationLog, MedicationLogStatusEnum
-from app.medications.models import PatientMedication, MedicationStatusEnum
+from app.adherence.models import MedicationLog, DailyAdherenceRollup, MedicationLogStatusEnum
+from app.adherence.rollup import AdherenceRollup
+from app.medications.models import Medication, PatientMedication, MedicationStatusEnum
 from app.patients.models import Patient
 from app.auth.models import User
+from app.analytics.services.scoring import AdherenceScoring
+from app.database.dialects import day_of_week, hour_of_day
 
 
 class AdherenceAnalyticsService:
     """Service for calculating adherence analytics"""
 
     @staticmethod
+    @request_memoized
     def get_adherence_overview(db: Session, start_date: date, end_date: date) -> AdherenceOverview:
         """Calculate overall adherence statistics for a date range"""
 
@@ -36,24 +42,18 @@ class AdherenceAnalyticsService:
         ).scalar() or 0
 
         # Get patients with logs in the period
-        patients_with_logs = db.query(func.count(func.distinct(MedicationLog.patient_id))).filter(
-            MedicationLog.scheduled_date.between(start_date, end_date)
+        in_period = DailyAdherenceRollup.date.between(start_date, end_date)
+        patients_with_logs = db.query(func.count(func.distinct(DailyAdherenceRollup.patient_id))).filter(
+            in_period
         ).scalar() or 0
 
         # Calculate total doses and adherence
-        dose_stats = db.query(
-            func.count(MedicationLog.id).label('total_doses'),
-            func.sum(case((MedicationLog.status == MedicationLogStatusEnum.taken, 1), else_=0)).label('taken'),
-            func.sum(case((MedicationLog.status == MedicationLogStatusEnum.missed, 1), else_=0)).label('missed'),
-            func.sum(case((MedicationLog.status == MedicationLogStatusEnum.skipped, 1), else_=0)).label('skipped')
-        ).filter(
-            MedicationLog.scheduled_date.between(start_date, end_date)
-        ).first()
+        dose_stats = db.query(*AdherenceRollup.totals()).filter(in_period).one()
 
-        total_doses = dose_stats.total_doses or 0
-        taken_doses = dose_stats.taken or 0
-        missed_doses = dose_stats.missed or 0
-        skipped_doses = dose_stats.skipped or 0
+        total_doses = dose_stats.scheduled
+        taken_doses = dose_stats.taken
+        missed_doses = dose_stats.missed
+        skipped_doses = dose_stats.skipped
 
         # Calculate adherence rate
         adherence_rate = (taken_doses / total_doses * 100) if total_doses > 0 else 0
@@ -61,14 +61,13 @@ class AdherenceAnalyticsService:
         # Calculate adherence distribution
         adherence_distribution = {"excellent": 0, "good": 0, "poor": 0}
 
-        # Get adherence rates per patient
-        patient_adherence = db.query(
-            MedicationLog.patient_id,
-            (func.sum(case((MedicationLog.status == MedicationLogStatusEnum.taken, 1), else_=0)) /
-             func.count(MedicationLog.id) * 100).label('adherence_rate')
-        ).filter(
-            MedicationLog.scheduled_date.between(start_date, end_date)
-        ).group_by(MedicationLog.patient_id).all()
+        # Get dose counts per patient
+        patient_counts = db.query(DailyAdherenceRollup.patient_id, *AdherenceRollup.totals()).filter(
+            in_period
+        ).group_by(DailyAdherenceRollup.patient_id).all()
+        patient_adherence = [
+            (row.patient_id, row.taken / row.scheduled * 100) for row in patient_counts if row.scheduled > 0
+        ]
 
         for _, rate in patient_adherence:
             if rate >= 90:
@@ -92,34 +91,29 @@ class AdherenceAnalyticsService:
         )
 
     @staticmethod
+    @request_memoized
     def get_adherence_trends(db: Session, start_date: date, end_date: date, patient_id: Optional[int] = None) -> List[AdherenceTrend]:
         """Get adherence trends over time"""
 
-        query = db.query(
-            MedicationLog.scheduled_date,
-            func.count(MedicationLog.id).label('total_doses'),
-            func.sum(case((MedicationLog.status == MedicationLogStatusEnum.taken, 1), else_=0)).label('taken'),
-            func.sum(case((MedicationLog.status == MedicationLogStatusEnum.missed, 1), else_=0)).label('missed'),
-            func.sum(case((MedicationLog.status == MedicationLogStatusEnum.skipped, 1), else_=0)).label('skipped')
-        ).filter(
-            MedicationLog.scheduled_date.between(start_date, end_date)
+        query = db.query(DailyAdherenceRollup.date, *AdherenceRollup.totals()).filter(
+            DailyAdherenceRollup.date.between(start_date, end_date)
         )
 
         if patient_id:
-            query = query.filter(MedicationLog.patient_id == patient_id)
+            query = query.filter(DailyAdherenceRollup.patient_id == patient_id)
 
-        query = query.group_by(MedicationLog.scheduled_date).order_by(MedicationLog.scheduled_date)
+        query = query.group_by(DailyAdherenceRollup.date).order_by(DailyAdherenceRollup.date)
 
         results = query.all()
         trends = []
 
         for row in results:
-            total_doses = row.total_doses or 0
-            taken_doses = row.taken or 0
+            total_doses = row.scheduled
+            taken_doses = row.taken
             adherence_rate = (taken_doses / total_doses * 100) if total_doses > 0 else 0
 
             trends.append(AdherenceTrend(
-                date=row.scheduled_date,
+                date=row.date,
                 adherence_rate=round(adherence_rate, 2),
                 doses_scheduled=total_doses,
                 doses_taken=taken_doses,
@@ -130,138 +124,166 @@ class AdherenceAnalyticsService:
         return trends
 
     @staticmethod
-    def get_patient_adherence_summary(db: Session, limit: int = 50, min_adherence: Optional[float] = None) -> List[PatientAdherenceSummary]:
-        """Get adherence summary for patients"""
-
-        # Get patients with medications
-        patients_query = db.query(
-            User.id.label('patient_id'),
-            User.full_name.label('patient_name'),
+    @request_memoized
+    def get_patient_adherence_summary(
+        db: Session,
+        limit: int = 50,
+        min_adherence: Optional[float] = None,
+        skip: int = 0,
+        order: str = "desc"
+    ) -> List[PatientAdherenceSummary]:
+        """
+        Get adherence summary for patients (last 30 days)
+        One grouped query: filtered by min_adherence, ordered by adherence rate and paginated in SQL
+        """
+        end_date = date.today()
+        start_date = end_date - timedelta(days=30)
+
+        # Patients with active/pending medications
+        medications = db.query(
+            PatientMedication.patient_id.label('patient_id'),
             func.count(PatientMedication.id).label('total_medications')
-        ).join(
-            PatientMedication, User.id == PatientMedication.patient_id
         ).filter(
             PatientMedication.status.in_([MedicationStatusEnum.active, MedicationStatusEnum.pending])
-        ).group_by(User.id, User.full_name)
+        ).group_by(PatientMedication.patient_id).subquery()
+
+        # Dose counts per patient from the daily rollup
+        totals = AdherenceRollup.totals()
+        doses = db.query(
+            DailyAdherenceRollup.patient_id.label('patient_id'),
+            *totals,
+            func.max(DailyAdherenceRollup.date).label('last_log_date')
+        ).filter(
+            DailyAdherenceRollup.date.between(start_date, end_date)
+        ).group_by(DailyAdherenceRollup.patient_id).subquery()
 
-        if min_adherence is not None:
-            # This would require a subquery for adherence calculation
-            # For now, return all patients
-            pass
-
-        patients = patients_query.limit(limit).all()
-
-        summaries = []
-        for patient in patients:
-            # Get adherence stats for this patient (last 30 days)
-            end_date = date.today()
-            start_date = end_date - timedelta(days=30)
-
-            dose_stats = db.query(
-                func.count(MedicationLog.id).label('total_doses'),
-                func.sum(case((MedicationLog.status == MedicationLogStatusEnum.taken, 1), else_=0)).label('taken'),
-                func.sum(case((MedicationLog.status == MedicationLogStatusEnum.missed, 1), else_=0)).label('missed'),
-                func.sum(case((MedicationLog.status == MedicationLogStatusEnum.skipped, 1), else_=0)).label('skipped'),
-                func.max(MedicationLog.scheduled_date).label('last_log_date')
-            ).filter(
-                MedicationLog.patient_id == patient.patient_id,
-                MedicationLog.scheduled_date.between(start_date, end_date)
-            ).first()
-
-            total_doses = dose_stats.total_doses or 0
-            taken_doses = dose_stats.taken or 0
-            adherence_rate = (taken_doses / total_doses * 100) if total_doses > 0 else 0
+        scheduled = func.coalesce(doses.c.scheduled, 0)
+        taken = func.coalesce(doses.c.taken, 0)
+        adherence_rate = case((scheduled > 0, taken * 100.0 / scheduled), else_=0.0).label('adherence_rate')
 
-            summaries.append(PatientAdherenceSummary(
-                patient_id=patient.patient_id,
-                patient_name=patient.patient_name,
-                adherence_rate=round(adherence_rate, 2),
-                total_medications=patient.total_medications,
-                doses_scheduled=total_doses,
-                doses_taken=taken_doses,
-                doses_missed=dose_stats.missed or 0,
-                doses_skipped=dose_stats.skipped or 0,
-                last_log_date=dose_stats.last_log_date
-            ))
+        query = db.query(
+            User.id.label('patient_id'),
+            User.full_name.label('patient_name'),
+            medications.c.total_medications,
+            scheduled.label('scheduled'),
+            taken.label('taken'),
+            func.coalesce(doses.c.missed, 0).label('missed'),
+            func.coalesce(doses.c.skipped, 0).label('skipped'),
+            doses.c.last_log_date,
+            adherence_rate
+        ).join(
+            medications, medications.c.patient_id == User.id
+        ).outerjoin(
+            doses, doses.c.patient_id == User.id
+        )
 
-        return summaries
+        if min_adherence is not None:
+            query = query.filter(adherence_rate >= min_adherence)
+
+        rate_order = adherence_rate.asc() if order == "asc" else adherence_rate.desc()
+        rows = query.order_by(rate_order, User.id).offset(skip).limit(limit).all()
+
+        return [
+            PatientAdherenceSummary(
+                patient_id=row.patient_id,
+                patient_name=row.patient_name,
+                adherence_rate=round(row.adherence_rate, 2),
+                total_medications=row.total_medications,
+                doses_scheduled=row.scheduled,
+                doses_taken=row.taken,
+                doses_missed=row.missed,
+                doses_skipped=row.skipped,
+                last_log_date=row.last_log_date
+            )
+            for row in rows
+        ]
 
     @staticmethod
+    @request_memoized
     def get_medication_adherence_details(db: Session, medication_id: Optional[int] = None, limit: int = 50) -> List[MedicationAdherenceDetail]:
-        """Get adherence details for medications"""
+        """
+        Get adherence details for medications
+        One query aggregated per medication (limit applies to medications), with the most
+        common skip reason taken from a ranked subquery
+        """
+
+        # Skip reasons ranked by frequency within each medication
+        reason_counts = db.query(
+            PatientMedication.medication_id.label('medication_id'),
+            MedicationLog.skipped_reason.label('skipped_reason'),
+            func.row_number().over(
+                partition_by=PatientMedication.medication_id,
+                order_by=(func.count(MedicationLog.id).desc(), MedicationLog.skipped_reason)
+            ).label('rank')
+        ).join(
+            MedicationLog, PatientMedication.id == MedicationLog.patient_medication_id
+        ).filter(
+            PatientMedication.status == MedicationStatusEnum.active,
+            MedicationLog.status == MedicationLogStatusEnum.skipped,
+            MedicationLog.skipped_reason.isnot(None)
+        ).group_by(PatientMedication.medication_id, MedicationLog.skipped_reason).subquery()
 
+        top_reasons = db.query(reason_counts).filter(reason_counts.c.rank == 1).subquery()
+
+        totals = AdherenceRollup.totals()
+        scheduled = totals[0]
         query = db.query(
-            PatientMedication.medication_id,
-            PatientMedication.id.label('patient_medication_id'),
-            func.count(MedicationLog.id).label('total_logs'),
-            func.sum(case((MedicationLog.status == MedicationLogStatusEnum.taken, 1), else_=0)).label('taken'),
-            func.sum(case((MedicationLog.status == MedicationLogStatusEnum.missed, 1), else_=0)).label('missed'),
-            func.sum(case((MedicationLog.status == MedicationLogStatusEnum.skipped, 1), else_=0)).label('skipped')
+            Medication.id.label('medication_id'),
+            Medication.name.label('medication_name'),
+            func.count(func.distinct(PatientMedication.patient_id)).label('total_patients'),
+            *totals,
+            top_reasons.c.skipped_reason
         ).join(
-            MedicationLog, PatientMedication.id == MedicationLog.patient_medication_id
+            PatientMedication, PatientMedication.medication_id == Medication.id
+        ).join(
+            DailyAdherenceRollup, DailyAdherenceRollup.patient_medication_id == PatientMedication.id
+        ).outerjoin(
+            top_reasons, top_reasons.c.medication_id == Medication.id
         ).filter(
             PatientMedication.status == MedicationStatusEnum.active
-        ).group_by(PatientMedication.medication_id, PatientMedication.id)
+        ).group_by(Medication.id, Medication.name, top_reasons.c.skipped_reason)
 
         if medication_id:
-            query = query.filter(PatientMedication.medication_id == medication_id)
-
-        results = query.limit(limit).all()
-
-        # Group by medication
-        med_stats = defaultdict(lambda: {
-            'total_patients': 0,
-            'total_logs': 0,
-            'taken': 0,
-            'missed': 0,
-            'skipped': 0
-        })
-
-        for row in results:
-            med_stats[row.medication_id]['total_patients'] += 1
-            med_stats[row.medication_id]['total_logs'] += row.total_logs or 0
-            med_stats[row.medication_id]['taken'] += row.taken or 0
-            med_stats[row.medication_id]['missed'] += row.missed or 0
-            med_stats[row.medication_id]['skipped'] += row.skipped or 0
-
-        details = []
-        for med_id, stats in med_stats.items():
-            medication = db.query(PatientMedication).join(PatientMedication.medication).filter(
-                PatientMedication.medication_id == med_id
-            ).first()
-
-            if medication:
-                total_logs = stats['total_logs']
-                adherence_rate = (stats['taken'] / total_logs * 100) if total_logs > 0 else 0
-
-                details.append(MedicationAdherenceDetail(
-                    medication_id=med_id,
-                    medication_name=medication.medication.name,
-                    total_patients=stats['total_patients'],
-                    average_adherence_rate=round(adherence_rate, 2),
-                    doses_scheduled=total_logs,
-                    doses_taken=stats['taken'],
-                    doses_missed=stats['missed'],
-                    doses_skipped=stats['skipped'],
-                    most_common_skip_reason=None  # Would need additional query
-                ))
-
-        return details[:limit]
+            query = query.filter(Medication.id == medication_id)
+
+        rows = query.order_by(scheduled.desc(), Medication.id).limit(limit).all()
+
+        return [
+            MedicationAdherenceDetail(
+                medication_id=row.medication_id,
+                medication_name=row.medication_name,
+                total_patients=row.total_patients,
+                average_adherence_rate=round(row.taken / row.scheduled * 100, 2) if row.scheduled else 0,
+                doses_scheduled=row.scheduled,
+                doses_taken=row.taken,
+                doses_missed=row.missed,
+                doses_skipped=row.skipped,
+                most_common_skip_reason=row.skipped_reason
+            )
+            for row in rows
+        ]
 
     @staticmethod
+    @request_memoized
     def get_adherence_stats(db: Session, start_date: date, end_date: date, patient_id: Optional[int] = None) -> AdherenceStats:
-        """Get detailed adherence statistics"""
-
-        query = db.query(MedicationLog).filter(
-            MedicationLog.scheduled_date.between(start_date, end_date)
+        """
+        Get detailed adherence statistics
+        Breakdowns are grouped in SQL (weekday from the daily rollup, hour from the logs),
+        so memory stays constant however many logs fall in the window
+        """
+        dialect_name = db.get_bind().dialect.name
+
+        # Dose counts per day of week (0 = Sunday); overall totals are their sum
+        weekday = day_of_week(DailyAdherenceRollup.date, dialect_name).label('weekday')
+        by_weekday_query = db.query(weekday, *AdherenceRollup.totals()).filter(
+            DailyAdherenceRollup.date.between(start_date, end_date)
         )
-
         if patient_id:
-            query = query.filter(MedicationLog.patient_id == patient_id)
-
-        logs = query.all()
+            by_weekday_query = by_weekday_query.filter(DailyAdherenceRollup.patient_id == patient_id)
+        by_weekday = by_weekday_query.group_by(weekday).all()
 
-        if not logs:
+        total_logs = sum(row.scheduled for row in by_weekday)
+        if not total_logs:
             return AdherenceStats(
                 overall_adherence=0,
                 on_time_adherence=0,
@@ -273,57 +295,61 @@ class AdherenceAnalyticsService:
                 consistency_score=0
             )
 
-        # Calculate overall adherence
-        total_logs = len(logs)
-        taken_logs = len([log for log in logs if log.status == MedicationLogStatusEnum.taken])
-        overall_adherence = (taken_logs / total_logs * 100) if total_logs > 0 else 0
-
-        # Calculate on-time adherence
-        on_time_taken = len([log for log in logs if log.status == MedicationLogStatusEnum.taken and log.on_time])
-        on_time_adherence = (on_time_taken / total_logs * 100) if total_logs > 0 else 0
+        # Calculate overall and on-time adherence
+        taken_logs = sum(row.taken for row in by_weekday)
+        on_time_taken = sum(row.on_time for row in by_weekday)
+        overall_adherence = taken_logs / total_logs * 100
+        on_time_adherence = on_time_taken / total_logs * 100
 
         # Calculate weekday vs weekend adherence
-        weekday_logs = [log for log in logs if log.scheduled_date.weekday() < 5]
-        weekend_logs = [log for log in logs if log.scheduled_date.weekday() >= 5]
-
-        weekday_taken = len([log for log in weekday_logs if log.status == MedicationLogStatusEnum.taken])
-        weekend_taken = len([log for log in weekend_logs if log.status == MedicationLogStatusEnum.taken])
-
-        weekday_adherence = (weekday_taken / len(weekday_logs) * 100) if weekday_logs else 0
-        weekend_adherence = (weekend_taken / len(weekend_logs) * 100) if weekend_logs else 0
-
-        # Calculate adherence by hour
-        adherence_by_hour = defaultdict(lambda: {'total': 0, 'taken': 0})
-        for log in logs:
-            hour = log.scheduled_time.hour
-            adherence_by_hour[hour]['total'] += 1
-            if log.status == MedicationLogStatusEnum.taken:
-                adherence_by_hour[hour]['taken'] += 1
-
-        hour_rates = {}
-        for hour, stats in adherence_by_hour.items():
-            rate = (stats['taken'] / stats['total'] * 100) if stats['total'] > 0 else 0
-            hour_rates[str(hour)] = round(rate, 2)
+        weekend_rows = [row for row in by_weekday if int(row.weekday) in (0, 6)]
+        weekday_rows = [row for row in by_weekday if int(row.weekday) not in (0, 6)]
+        weekday_total = sum(row.scheduled for row in weekday_rows)
+        weekend_total = sum(row.scheduled for row in weekend_rows)
+        weekday_adherence = (sum(row.taken for row in weekday_rows) / weekday_total * 100) if weekday_total else 0
+        weekend_adherence = (sum(row.taken for row in weekend_rows) / weekend_total * 100) if weekend_total else 0
 
         # Calculate adherence by day of week
-        day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        adherence_by_day = defaultdict(lambda: {'total': 0, 'taken': 0})
-        for log in logs:
-            day = day_names[log.scheduled_date.weekday()]
-            adherence_by_day[day]['total'] += 1
-            if log.status == MedicationLogStatusEnum.taken:
-                adherence_by_day[day]['taken'] += 1
+        day_names = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+        day_rates = {
+            day_names[int(row.weekday)]: round(row.taken / row.scheduled * 100, 2)
+            for row in by_weekday if row.scheduled
+        }
+
+        # Calculate adherence by hour of the scheduled time
+        hour = hour_of_day(MedicationLog.scheduled_time, dialect_name).label('hour')
+        by_hour_query = db.query(
+            hour,
+            func.count(MedicationLog.id).label('total'),
+            func.sum(case((MedicationLog.status == MedicationLogStatusEnum.taken, 1), else_=0)).label('taken')
+        ).filter(
+            MedicationLog.scheduled_date.between(start_date, end_date)
+        )
+        if patient_id:
+            by_hour_query = by_hour_query.filter(MedicationLog.patient_id == patient_id)
 
-        day_rates = {}
-        for day, stats in adherence_by_day.items():
-            rate = (stats['taken'] / stats['total'] * 100) if stats['total'] > 0 else 0
-            day_rates[day] = round(rate, 2)
+        hour_rates = {
+            str(int(row.hour)): round(row.taken / row.total * 100, 2)
+            for row in by_hour_query.group_by(hour).order_by(hour).all()
+        }
 
-        # Calculate improvement trend (simplified - would need more complex analysis)
-        improvement_trend = 0  # Placeholder
+        # Improvement trend and consistency over the daily series
+        daily_query = db.query(
+            DailyAdherenceRollup.date,
+            *AdherenceRollup.totals()
+        ).filter(
+            DailyAdherenceRollup.date.between(start_date, end_date)
+        )
+        if patient_id:
+            daily_query = daily_query.filter(DailyAdherenceRollup.patient_id == patient_id)
+        daily = daily_query.group_by(DailyAdherenceRollup.date).all()
 
-        # Calculate consistency score (simplified)
-        consistency_score = overall_adherence * 0.8  # Placeholder
+        scores = AdherenceScoring.score_series(
+            ((None, row.date, row.taken, row.scheduled) for row in daily),
+            start_date,
+            (end_date - start_date).days + 1
+        )
+        improvement_trend, consistency_score, _ = scores.get(None, (0, 0, 0))
 
         return AdherenceStats(
             overall_adherence=round(overall_adherence, 2),
@@ -334,4 +360,68 @@ class AdherenceAnalyticsService:
             adherence_by_day=day_rates,
             improvement_trend=round(improvement_trend, 2),
             consistency_score=round(consistency_score, 2)
-        )
\ No newline at end of file
+        )
+
+    @staticmethod
+    @request_memoized
+    def get_patient_adherence_scores(
+        db: Session,
+        start_date: date,
+        end_date: date,
+        limit: int = 1000,
+        skip: int = 0
+    ) -> List[PatientAdherenceScore]:
+        """
+        Get improvement trend and consistency scores for every patient with doses in the period
+        Daily series for all patients come from one grouped query and are scored together
+        """
+        patients = db.query(
+            DailyAdherenceRollup.patient_id.label('patient_id')
+        ).filter(
+            DailyAdherenceRollup.date.between(start_date, end_date)
+        ).group_by(DailyAdherenceRollup.patient_id).order_by(
+            DailyAdherenceRollup.patient_id
+        ).offset(skip).limit(limit).subquery()
+
+        rows = db.query(
+            DailyAdherenceRollup.patient_id,
+            User.full_name,
+            DailyAdherenceRollup.date,
+            *AdherenceRollup.totals()
+        ).join(
+            patients, patients.c.patient_id == DailyAdherenceRollup.patient_id
+        ).join(
+            User, User.id == DailyAdherenceRollup.patient_id
+        ).filter(
+            DailyAdherenceRollup.date.between(start_date, end_date)
+        ).group_by(
+            DailyAdherenceRollup.patient_id, User.full_name, DailyAdherenceRollup.date
+        ).order_by(DailyAdherenceRollup.patient_id).all()
+
+        names = {}
+        totals = defaultdict(lambda: [0, 0])
+        for row in rows:
+            names[row.patient_id] = row.full_name
+            totals[row.patient_id][0] += row.taken
+            totals[row.patient_id][1] += row.scheduled
+
+        scores = AdherenceScoring.score_series(
+            ((row.patient_id, row.date, row.taken, row.scheduled) for row in rows),
+            start_date,
+            (end_date - start_date).days + 1
+        )
+
+        results = []
+        for patient_id, name in names.items():
+            taken, scheduled = totals[patient_id]
+            improvement_trend, consistency_score, days_with_doses = scores.get(patient_id, (0, 0, 0))
+            results.append(PatientAdherenceScore(
+                patient_id=patient_id,
+                patient_name=name,
+                adherence_rate=round(taken / scheduled * 100, 2) if scheduled else 0,
+                days_with_doses=days_with_doses,
+                improvement_trend=round(improvement_trend, 2),
+                consistency_score=round(consistency_score, 2)
+            ))
+
+        return results
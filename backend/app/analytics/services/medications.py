@@ -9,6 +9,7 @@ from typing import List, Optional
 from datetime import date, timedelta
 
 
+from app.analytics.memo import request_memoized
 from app.analytics.schemas.medications import (
     MedicationUsageStats,
     MedicationPopularity,
@@ -24,6 +25,7 @@ class MedicationAnalyticsService:
     """Service for calculating medication analytics"""
 
     @staticmethod
+    @request_memoized
     def get_medication_usage_stats(db: Session, start_date: date, end_date: date) -> MedicationUsageStats:
         """Calculate overall medication usage statistics"""
 
@@ -78,9 +80,21 @@ class MedicationAnalyticsService:
         )
 
     @staticmethod
+    @request_memoized
     def get_medication_popularity(db: Session, limit: int = 20, min_prescriptions: Optional[int] = None) -> List[MedicationPopularity]:
         """Get most popular medications by prescription count"""
 
+        # Most common dosage per medication (portable stand-in for an ordered-set MODE())
+        dosage_counts = db.query(
+            PatientMedication.medication_id.label('medication_id'),
+            PatientMedication.dosage.label('dosage'),
+            func.row_number().over(
+                partition_by=PatientMedication.medication_id,
+                order_by=(func.count(PatientMedication.id).desc(), PatientMedication.dosage)
+            ).label('rank')
+        ).group_by(PatientMedication.medication_id, PatientMedication.dosage).subquery()
+        top_dosages = db.query(dosage_counts).filter(dosage_counts.c.rank == 1).subquery()
+
         query = db.query(
             Medication.id.label('medication_id'),
             Medication.name.label('medication_name'),
@@ -88,13 +102,15 @@ class MedicationAnalyticsService:
             func.count(PatientMedication.id).label('total_prescriptions'),
             func.sum(case((PatientMedication.status == MedicationStatusEnum.active, 1), else_=0)).label('active_prescriptions'),
             func.count(func.distinct(PatientMedication.patient_id)).label('unique_patients'),
-            func.mode(PatientMedication.dosage).label('average_dosage'),
+            top_dosages.c.dosage.label('average_dosage'),
             User.full_name.label('created_by')
         ).join(
             PatientMedication, Medication.id == PatientMedication.medication_id
         ).join(
             User, Medication.created_by == User.id
-        ).group_by(Medication.id, Medication.name, Medication.form, User.full_name)
+        ).outerjoin(
+            top_dosages, top_dosages.c.medication_id == Medication.id
+        ).group_by(Medication.id, Medication.name, Medication.form, User.full_name, top_dosages.c.dosage)
 
         if min_prescriptions:
             query = query.having(func.count(PatientMedication.id) >= min_prescriptions)
@@ -119,6 +135,7 @@ class MedicationAnalyticsService:
         return popularity_list
 
     @staticmethod
+    @request_memoized
     def get_medication_status_distribution(db: Session) -> MedicationStatusDistribution:
         """Get distribution of medications by status"""
 
@@ -148,6 +165,7 @@ class MedicationAnalyticsService:
         )
 
     @staticmethod
+    @request_memoized
     def get_top_prescribed_medications(db: Session, start_date: date, end_date: date, limit: int = 10) -> List[TopPrescribedMedications]:
         """Get top prescribed medications in the specified period"""
 
@@ -185,6 +203,7 @@ class MedicationAnalyticsService:
         return result
 
     @staticmethod
+    @request_memoized
     def get_medication_analytics_summary(db: Session) -> MedicationAnalyticsSummary:
         """Get comprehensive medication analytics summary"""
 
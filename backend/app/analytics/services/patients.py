@@ -5,24 +5,39 @@ Provides analytics calculations for patient management and demographics
 
 from sqlalchemy.orm import Session
 from sqlalchemy import func, extract, and_, case
-from typing import List
+from typing import List, NamedTuple, Optional
 from datetime import date, timedelta
 
+from app.analytics.memo import request_memoized
 from app.analytics.schemas.patients import (
     PatientDemographics,
     PatientStatusDistribution,
     PatientRegistrationTrend,
     PatientHealthMetrics,
+    PatientAgeGroup,
     PatientAnalyticsSummary
 )
+from app.database.dialects import date_value, day_number, year_month
 from app.patients.models import Patient, GenderEnum, StatusEnum
 from app.auth.models import User
 
+# Age groups as (upper age bound, label), youngest first; older patients fall in OLDEST_AGE_GROUP
+AGE_GROUPS = [(18, 'under_18'), (30, '18_29'), (50, '30_49'), (70, '50_69')]
+OLDEST_AGE_GROUP = '70_plus'
+
+
+class _AgeGroupRow(NamedTuple):
+    age_group: str
+    count: int
+    age_days: Optional[float]
+    average_bmi: Optional[float]
+
 
 class PatientAnalyticsService:
     """Service for calculating patient analytics"""
 
     @staticmethod
+    @request_memoized
     def get_patient_demographics(db: Session) -> PatientDemographics:
         """Calculate patient demographic statistics"""
 
@@ -42,29 +57,15 @@ class PatientAnalyticsService:
             else:
                 gender_distribution['unknown'] = count
 
-        # Age distribution (SQLite compatible)
-        today = date.today()
-        age_stats = db.query(
-            case(
-                ((func.julianday(today) - func.julianday(Patient.date_of_birth)) / 365.25 < 18, 'under_18'),
-                ((func.julianday(today) - func.julianday(Patient.date_of_birth)) / 365.25 < 30, '18_29'),
-                ((func.julianday(today) - func.julianday(Patient.date_of_birth)) / 365.25 < 50, '30_49'),
-                ((func.julianday(today) - func.julianday(Patient.date_of_birth)) / 365.25 < 70, '50_69'),
-                else_='70_plus'
-            ).label('age_group'),
-            func.count(Patient.id).label('count')
-        ).filter(Patient.date_of_birth.isnot(None)).group_by('age_group').all()
+        # Age distribution and average age, from the same grouped query as the age panel
+        age_groups = [row for row in PatientAnalyticsService._age_group_rows(db) if row.count]
+        age_distribution = {row.age_group: row.count for row in age_groups}
 
-        age_distribution = {}
-        for age_group, count in age_stats:
-            age_distribution[age_group or 'unknown'] = count
-
-        # Average age (SQLite compatible)
-        today = date.today()
-        avg_age_result = db.query(func.avg((func.julianday(today) - func.julianday(Patient.date_of_birth)) / 365.25)).filter(
-            Patient.date_of_birth.isnot(None)
-        ).scalar()
-        average_age = float(avg_age_result) if avg_age_result else None
+        known_ages = sum(row.count for row in age_groups)
+        average_age = (
+            sum(row.age_days * row.count for row in age_groups) / known_ages / 365.25
+            if known_ages else None
+        )
 
         # Blood type distribution
         blood_stats = db.query(
@@ -76,18 +77,18 @@ class PatientAnalyticsService:
         for blood_type, count in blood_stats:
             blood_type_distribution[blood_type] = count
 
-        # Registration trend (simplified - last 12 months)
-        end_date = date.today()
-        start_date = end_date - timedelta(days=365)
+        # Registration trend (simplified - last 12 months, through today)
+        start_date = date.today() - timedelta(days=365)
 
+        month = year_month(User.date_created, db.get_bind().dialect.name)
         registration_stats = db.query(
-            func.strftime('%Y-%m', User.date_created).label('month'),
+            month.label('month'),
             func.count(User.id).label('count')
         ).join(
             Patient, User.id == Patient.user_id
         ).filter(
-            User.date_created.between(start_date, end_date)
-        ).group_by(func.strftime('%Y-%m', User.date_created)).order_by('month').all()
+            User.date_created >= start_date
+        ).group_by(month).order_by('month').all()
 
         registration_trend = {}
         for month, count in registration_stats:
@@ -104,6 +105,7 @@ class PatientAnalyticsService:
         )
 
     @staticmethod
+    @request_memoized
     def get_patient_status_distribution(db: Session) -> PatientStatusDistribution:
         """Get distribution of patients by health status"""
 
@@ -133,6 +135,7 @@ class PatientAnalyticsService:
         )
 
     @staticmethod
+    @request_memoized
     def get_patient_registration_trends(db: Session, start_date: date, end_date: date) -> List[PatientRegistrationTrend]:
         """Get patient registration trends over time"""
 
@@ -161,32 +164,29 @@ class PatientAnalyticsService:
         return trends
 
     @staticmethod
+    @request_memoized
     def get_patient_health_metrics(db: Session) -> PatientHealthMetrics:
         """Get patient health metrics and statistics"""
 
-        # BMI calculations (BMI = weight_kg / (height_m)^2)
+        # BMI buckets, counted and summed in the database
+        bmi = _bmi_expression()
         bmi_stats = db.query(
-            (Patient.weight / ((Patient.height / 100) * (Patient.height / 100))).label('bmi')
-        ).filter(
-            Patient.weight.isnot(None),
-            Patient.height.isnot(None),
-            Patient.height > 0
-        ).all()
-
-        bmis = [bmi[0] for bmi in bmi_stats if bmi[0]]
-        average_bmi = sum(bmis) / len(bmis) if bmis else None
+            case(
+                (bmi < 18.5, 'underweight'),
+                (bmi < 25, 'normal'),
+                (bmi < 30, 'overweight'),
+                else_='obese'
+            ).label('bmi_group'),
+            func.count(Patient.id).label('count'),
+            func.sum(bmi).label('bmi_total')
+        ).filter(bmi.isnot(None)).group_by('bmi_group').all()
 
-        # BMI distribution
         bmi_distribution = {'underweight': 0, 'normal': 0, 'overweight': 0, 'obese': 0}
-        for bmi in bmis:
-            if bmi < 18.5:
-                bmi_distribution['underweight'] += 1
-            elif bmi < 25:
-                bmi_distribution['normal'] += 1
-            elif bmi < 30:
-                bmi_distribution['overweight'] += 1
-            else:
-                bmi_distribution['obese'] += 1
+        for bmi_group, count, _ in bmi_stats:
+            bmi_distribution[bmi_group] = count
+
+        bmi_count = sum(count for _, count, _ in bmi_stats)
+        average_bmi = sum(float(total) for _, _, total in bmi_stats) / bmi_count if bmi_count else None
 
         # Allergies
         patients_with_allergies = db.query(func.count(Patient.id)).filter(
@@ -225,6 +225,25 @@ class PatientAnalyticsService:
         )
 
     @staticmethod
+    @request_memoized
+    def get_age_distribution(db: Session) -> List[PatientAgeGroup]:
+        """Patients per age group with the group's average age and BMI"""
+        rows = PatientAnalyticsService._age_group_rows(db)
+        total = sum(row.count for row in rows)
+
+        return [
+            PatientAgeGroup(
+                age_group=row.age_group,
+                count=row.count,
+                percentage=round(row.count / total * 100, 1) if total > 0 else 0,
+                average_age=round(row.age_days / 365.25, 1) if row.age_days is not None else None,
+                average_bmi=round(row.average_bmi, 1) if row.average_bmi is not None else None
+            )
+            for row in rows
+        ]
+
+    @staticmethod
+    @request_memoized
     def get_patient_analytics_summary(db: Session) -> PatientAnalyticsSummary:
         """Get comprehensive patient analytics summary"""
 
@@ -251,4 +270,60 @@ class PatientAnalyticsService:
             health_metrics=health_metrics,
             recent_activity=recent_activity,
             admin_workload=admin_workload
-        )
\ No newline at end of file
+        )
+
+    # ==================== INTERNAL HELPERS ====================
+
+    @staticmethod
+    @request_memoized
+    def _age_group_rows(db: Session) -> List[_AgeGroupRow]:
+        """
+        One grouped query over patients with a known date of birth: count, mean age
+        in days and mean BMI per age group, for every group in order (empty ones zeroed)
+        """
+        today = date.today()
+        dialect = db.get_bind().dialect.name
+
+        # Each group is a date-of-birth range, so the CASE compares the raw indexed column
+        age_group = case(
+            *[(Patient.date_of_birth > _years_before(today, years), label) for years, label in AGE_GROUPS],
+            else_=OLDEST_AGE_GROUP
+        ).label('age_group')
+
+        stats = db.query(
+            age_group,
+            func.count(Patient.id).label('count'),
+            func.avg(day_number(date_value(today, dialect), dialect) - day_number(Patient.date_of_birth, dialect)).label('age_days'),
+            func.avg(_bmi_expression()).label('average_bmi')
+        ).filter(Patient.date_of_birth.isnot(None)).group_by('age_group').all()
+
+        by_group = {row.age_group: row for row in stats}
+        rows = []
+        for label in [label for _, label in AGE_GROUPS] + [OLDEST_AGE_GROUP]:
+            row = by_group.get(label)
+            rows.append(_AgeGroupRow(
+                age_group=label,
+                count=row.count if row else 0,
+                age_days=float(row.age_days) if row and row.age_days is not None else None,
+                average_bmi=float(row.average_bmi) if row and row.average_bmi is not None else None
+            ))
+        return rows
+
+
+def _years_before(day: date, years: int) -> date:
+    """Same calendar day the given number of years earlier (Feb 29 falls back to Feb 28)"""
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+
+def _bmi_expression():
+    """BMI (kg / m^2) of a patient, NULL when height or weight is missing or zero"""
+    return case(
+        (
+            and_(Patient.height > 0, Patient.weight > 0),
+            Patient.weight / ((Patient.height / 100) * (Patient.height / 100))
+        ),
+        else_=None
+    )
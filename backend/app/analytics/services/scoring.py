@@ -0,0 +1,93 @@
+"""
+Adherence scoring
+Improvement trend and consistency score over daily adherence series,
+vectorized across many series at once when NumPy is available
+"""
+
+import statistics
+from datetime import date
+from typing import Dict, Hashable, Iterable, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Installed from requirements.txt; the pure-Python fallback gives the same scores
+    np = None
+
+# Standard deviation of a 0-100 series is at most 50 (half the days at 0, half at 100)
+MAX_RATE_STD = 50.0
+
+
+class AdherenceScoring:
+    """Scores per-day adherence series: least-squares trend and day-to-day consistency"""
+
+    @staticmethod
+    def score_series(rows: Iterable, start_date: date, days: int) -> Dict[Hashable, Tuple[float, float, int]]:
+        """
+        Score every series in rows of (key, date, taken, scheduled), one row per key and day.
+        Returns {key: (improvement_trend, consistency_score, days_with_doses)}:
+        - improvement_trend: least-squares slope of the daily rate, in percentage points per week
+        - consistency_score: 100 - 100 * std(daily rate) / 50, so 100 means the same rate every day
+        Days without scheduled doses are left out of both scores.
+        """
+        points = [
+            (row[0], (row[1] - start_date).days, row[2] * 100.0 / row[3])
+            for row in rows
+            if row[3] and 0 <= (row[1] - start_date).days < days
+        ]
+        if np is not None:
+            return AdherenceScoring._score_numpy(points, days)
+        return AdherenceScoring._score_python(points)
+
+    # ==================== INTERNAL HELPERS ====================
+
+    @staticmethod
+    def _score_numpy(points: list, days: int) -> Dict[Hashable, Tuple[float, float, int]]:
+        """All series as one (series x days) matrix; empty days are NaN"""
+        keys = list(dict.fromkeys(point[0] for point in points))
+        if not keys:
+            return {}
+        key_index = {key: index for index, key in enumerate(keys)}
+
+        rates = np.full((len(keys), days), np.nan)
+        rows = np.fromiter((key_index[point[0]] for point in points), dtype=np.int64, count=len(points))
+        columns = np.fromiter((point[1] for point in points), dtype=np.int64, count=len(points))
+        rates[rows, columns] = np.fromiter((point[2] for point in points), dtype=np.float64, count=len(points))
+
+        observed = ~np.isnan(rates)
+        counts = observed.sum(axis=1)
+        safe_counts = np.maximum(counts, 1)
+        day_index = np.broadcast_to(np.arange(days, dtype=np.float64), rates.shape)
+
+        mean_day = np.where(observed, day_index, 0).sum(axis=1) / safe_counts
+        mean_rate = np.where(observed, rates, 0).sum(axis=1) / safe_counts
+        day_dev = np.where(observed, day_index - mean_day[:, None], 0)
+        rate_dev = np.where(observed, rates - mean_rate[:, None], 0)
+
+        day_var = (day_dev * day_dev).sum(axis=1)
+        slope = np.where(day_var > 0, (day_dev * rate_dev).sum(axis=1) / np.where(day_var > 0, day_var, 1), 0)
+        std = np.sqrt((rate_dev * rate_dev).sum(axis=1) / safe_counts)
+        consistency = np.clip(100 * (1 - std / MAX_RATE_STD), 0, 100)
+
+        return {
+            key: (float(slope[index] * 7), float(consistency[index]), int(counts[index]))
+            for key, index in key_index.items()
+        }
+
+    @staticmethod
+    def _score_python(points: list) -> Dict[Hashable, Tuple[float, float, int]]:
+        """Same scores one series at a time"""
+        series: Dict[Hashable, Tuple[list, list]] = {}
+        for key, day, rate in points:
+            day_values, rate_values = series.setdefault(key, ([], []))
+            day_values.append(day)
+            rate_values.append(rate)
+
+        scores = {}
+        for key, (day_values, rate_values) in series.items():
+            slope = 0.0
+            if len(day_values) > 1:
+                slope = statistics.linear_regression(day_values, rate_values).slope
+            std = statistics.pstdev(rate_values)
+            consistency = min(max(100 * (1 - std / MAX_RATE_STD), 0), 100)
+            scores[key] = (slope * 7, consistency, len(day_values))
+        return scores
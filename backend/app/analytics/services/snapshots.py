@@ -0,0 +1,153 @@
+"""
+Analytics snapshot service
+Precomputes clinic-wide analytics on a schedule and serves them as O(1) reads,
+with historical lookups (as_of) and a live recompute on request (fresh)
+"""
+
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Response, status
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+
+from app.analytics.models import AnalyticsSnapshot
+from app.analytics.schemas.adherence import AdherenceOverview, AdherenceTrend
+from app.analytics.schemas.medications import MedicationUsageStats
+from app.analytics.schemas.patients import PatientDemographics, PatientStatusDistribution
+from app.analytics.services.adherence import AdherenceAnalyticsService
+from app.analytics.services.medications import MedicationAnalyticsService
+from app.analytics.services.patients import PatientAnalyticsService
+from app.cache.versions import DataVersions
+from app.database.dialects import conflict_insert
+
+# Period covered by windowed snapshots, matching the endpoints' defaults
+SNAPSHOT_WINDOW_DAYS = 30
+
+# kind -> (response type, compute(db, as_of))
+SNAPSHOT_KINDS: Dict[str, Tuple[Any, Callable[[Session, date], Any]]] = {
+    "adherence_overview": (
+        AdherenceOverview,
+        lambda db, as_of: AdherenceAnalyticsService.get_adherence_overview(
+            db, as_of - timedelta(days=SNAPSHOT_WINDOW_DAYS), as_of
+        ),
+    ),
+    "adherence_trends": (
+        List[AdherenceTrend],
+        lambda db, as_of: AdherenceAnalyticsService.get_adherence_trends(
+            db, as_of - timedelta(days=SNAPSHOT_WINDOW_DAYS), as_of, None
+        ),
+    ),
+    "patient_status_distribution": (
+        PatientStatusDistribution,
+        lambda db, as_of: PatientAnalyticsService.get_patient_status_distribution(db),
+    ),
+    "patient_demographics": (
+        PatientDemographics,
+        lambda db, as_of: PatientAnalyticsService.get_patient_demographics(db),
+    ),
+    "medication_usage_stats": (
+        MedicationUsageStats,
+        lambda db, as_of: MedicationAnalyticsService.get_medication_usage_stats(
+            db, as_of - timedelta(days=SNAPSHOT_WINDOW_DAYS), as_of
+        ),
+    ),
+}
+
+# Kinds computed from current rows only (no history to rebuild them from): today's snapshot only
+CURRENT_ONLY_KINDS = {"patient_status_distribution", "patient_demographics"}
+
+SNAPSHOT_HEADER = "X-Analytics-Snapshot"
+
+
+class AnalyticsSnapshotService:
+    """Service for taking and serving analytics snapshots"""
+
+    @staticmethod
+    def take_snapshots(db: Session, as_of: Optional[date] = None, kinds: Optional[List[str]] = None) -> List[str]:
+        """
+        Compute every snapshot kind (or the given ones) as of a date, replacing any
+        snapshot already taken for that date. Returns the kinds written.
+        For a past date the current-only kinds are left out; asking for one raises ValueError.
+        """
+        as_of = as_of or date.today()
+        backdated = as_of < date.today()
+        if kinds is None:
+            kinds = [kind for kind in SNAPSHOT_KINDS if not (backdated and kind in CURRENT_ONLY_KINDS)]
+        elif backdated and CURRENT_ONLY_KINDS.intersection(kinds):
+            raise ValueError(
+                f"{', '.join(sorted(CURRENT_ONLY_KINDS.intersection(kinds)))} can only be snapshotted "
+                f"as of today, not {as_of}"
+            )
+
+        for kind in kinds:
+            schema, compute = SNAPSHOT_KINDS[kind]
+            payload = TypeAdapter(schema).dump_json(compute(db, as_of)).decode()
+            AnalyticsSnapshotService._upsert(db, kind, as_of, payload)
+
+        DataVersions.bump(db, "analytics_snapshots")
+        db.commit()
+        return kinds
+
+    @staticmethod
+    def get_snapshot(db: Session, kind: str, as_of: Optional[date] = None) -> Optional[Tuple[date, Any]]:
+        """Latest snapshot of a kind taken on or before as_of (latest overall if None), as (date, value)"""
+        query = db.query(AnalyticsSnapshot).filter(AnalyticsSnapshot.kind == kind)
+        if as_of is not None:
+            query = query.filter(AnalyticsSnapshot.as_of <= as_of)
+        snapshot = query.order_by(AnalyticsSnapshot.as_of.desc()).first()
+        if snapshot is None:
+            return None
+
+        schema, _ = SNAPSHOT_KINDS[kind]
+        return snapshot.as_of, TypeAdapter(schema).validate_json(snapshot.payload)
+
+    @staticmethod
+    def serve(
+        db: Session,
+        response: Response,
+        kind: str,
+        live: Callable[[], Any],
+        as_of: Optional[date] = None,
+        fresh: bool = False
+    ) -> Any:
+        """
+        Answer an endpoint from its snapshot: the latest one by default, the one in effect
+        on as_of when given, or a live recompute when fresh is set or no snapshot exists yet.
+        Sets X-Analytics-Snapshot to the snapshot date served, or "live".
+        """
+        if not fresh:
+            snapshot = AnalyticsSnapshotService.get_snapshot(db, kind, as_of)
+            if snapshot is not None:
+                response.headers[SNAPSHOT_HEADER] = snapshot[0].isoformat()
+                return snapshot[1]
+            if as_of is not None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"No {kind} snapshot on or before {as_of}"
+                )
+
+        response.headers[SNAPSHOT_HEADER] = "live"
+        return live()
+
+    # ==================== INTERNAL HELPERS ====================
+
+    @staticmethod
+    def _upsert(db: Session, kind: str, as_of: date, payload: str) -> None:
+        """Write one snapshot row, replacing the one for the same kind and date"""
+        table = AnalyticsSnapshot.__table__
+        stmt = conflict_insert(table, db.get_bind().dialect.name)
+        if stmt is not None:
+            db.execute(
+                stmt.values(kind=kind, as_of=as_of, payload=payload)
+                .on_conflict_do_update(index_elements=["kind", "as_of"], set_={"payload": payload})
+            )
+            return
+
+        updated = db.query(AnalyticsSnapshot).filter(
+            AnalyticsSnapshot.kind == kind,
+            AnalyticsSnapshot.as_of == as_of
+        ).update({"payload": payload}, synchronize_session=False)
+        if not updated:
+            db.add(AnalyticsSnapshot(kind=kind, as_of=as_of, payload=payload))
+            db.flush()
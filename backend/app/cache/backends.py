@@ -0,0 +1,219 @@
+"""
+Pluggable cache backends
+Store serialized (string) values under a namespace with a TTL and count hits and misses.
+The in-process backend suits a single worker; the SQLite-file and Redis backends are
+shared between worker processes.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from app.config.settings import settings
+
+try:
+    import redis
+except ImportError:  # Optional dependency, only needed for CACHE_BACKEND=redis
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    """
+    Base cache: subclasses implement _get/_set/_delete/_clear.
+    Backend errors are logged and treated as misses so a cache outage never fails a request.
+    """
+    name = "base"
+
+    def __init__(self, namespace: str, ttl_seconds: int):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self._counter_lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "sets": 0, "invalidations": 0, "errors": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            value = self._get(key)
+        except Exception:
+            logger.warning("Cache %s get failed", self.name, exc_info=True)
+            self._count("errors")
+            value = None
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        try:
+            self._set(key, value)
+            self._count("sets")
+        except Exception:
+            logger.warning("Cache %s set failed", self.name, exc_info=True)
+            self._count("errors")
+
+    def delete(self, key: str) -> None:
+        try:
+            self._delete(key)
+            self._count("invalidations")
+        except Exception:
+            logger.warning("Cache %s delete failed", self.name, exc_info=True)
+            self._count("errors")
+
+    def clear(self) -> None:
+        """Drop every entry in this namespace"""
+        self._clear()
+
+    def stats(self) -> Dict:
+        """Counters for this process (hit rate in percent)"""
+        with self._counter_lock:
+            counters = dict(self._counters)
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = round(counters["hits"] / lookups * 100, 2) if lookups else 0.0
+        counters["backend"] = self.name
+        counters["namespace"] = self.namespace
+        return counters
+
+    def _count(self, counter: str) -> None:
+        with self._counter_lock:
+            self._counters[counter] += 1
+
+    def _get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def _set(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+    def _delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def _clear(self) -> None:
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU cache with per-entry expiry"""
+    name = "memory"
+
+    def __init__(self, namespace: str, ttl_seconds: int, max_entries: int = 1024):
+        super().__init__(namespace, ttl_seconds)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache(CacheBackend):
+    """Cache in a local SQLite file, shared by every worker process on the host"""
+    name = "sqlite"
+
+    def __init__(self, namespace: str, ttl_seconds: int, path: str):
+        super().__init__(namespace, ttl_seconds)
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers run alongside the writer"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, key: str) -> Optional[str]:
+        row = self._connection().execute(
+            "SELECT value FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (self.namespace, key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, value: str) -> None:
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (self.namespace, key, value, now + self.ttl_seconds)
+        )
+        conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+
+    def _delete(self, key: str) -> None:
+        self._connection().execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.namespace, key)
+        )
+
+    def _clear(self) -> None:
+        self._connection().execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+
+
+class RedisCache(CacheBackend):
+    """Cache on any Redis-protocol server (Redis, Valkey, KeyDB, ...)"""
+    name = "redis"
+
+    def __init__(self, namespace: str, ttl_seconds: int, url: str):
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package")
+        super().__init__(namespace, ttl_seconds)
+        self._client = redis.Redis.from_url(url, decode_responses=True, socket_timeout=1)
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _get(self, key: str) -> Optional[str]:
+        return self._client.get(self._key(key))
+
+    def _set(self, key: str, value: str) -> None:
+        self._client.set(self._key(key), value, ex=self.ttl_seconds)
+
+    def _delete(self, key: str) -> None:
+        self._client.delete(self._key(key))
+
+    def _clear(self) -> None:
+        for key in self._client.scan_iter(match=self._key("*")):
+            self._client.delete(key)
+
+
+def create_cache(namespace: str, ttl_seconds: Optional[int] = None) -> CacheBackend:
+    """Build the cache backend selected by CACHE_BACKEND (memory, sqlite or redis)"""
+    ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.CACHE_TTL_SECONDS
+    backend = settings.CACHE_BACKEND.lower()
+
+    if backend == "sqlite":
+        return SQLiteCache(namespace, ttl_seconds, settings.CACHE_URL or "cache.db")
+    if backend == "redis":
+        return RedisCache(namespace, ttl_seconds, settings.CACHE_URL or "redis://localhost:6379/0")
+    if backend != "memory":
+        raise ValueError(f"Unknown CACHE_BACKEND: {settings.CACHE_BACKEND}")
+    return MemoryCache(namespace, ttl_seconds, settings.CACHE_MAX_ENTRIES)
@@ -0,0 +1,23 @@
+"""
+Cache models
+Data-version counters that HTTP ETags are derived from
+"""
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+
+from app.database.db import Base
+
+
+class DataVersion(Base):
+    """
+    Change counter for a table ("medication_logs") or one patient's rows in it
+    ("medication_logs:42"). Write paths bump it in the same transaction as the change.
+    """
+    __tablename__ = "data_versions"
+
+    key = Column(String(100), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<DataVersion(key={self.key}, version={self.version})>"
@@ -0,0 +1,94 @@
+"""
+Data versions and conditional responses
+Write paths bump per-table and per-patient counters; read endpoints hash the counters
+they depend on into a strong ETag and answer a matching If-None-Match with 304
+before running any aggregate
+"""
+import hashlib
+import json
+from datetime import date
+from typing import Dict, Iterable, Optional
+
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app.cache.models import DataVersion
+from app.database.db import get_db
+from app.database.dialects import conflict_insert
+
+
+def version_key(table: str, patient_id: Optional[int] = None) -> str:
+    """Counter key for a table, or for one patient's rows in it"""
+    return table if patient_id is None else f"{table}:{patient_id}"
+
+
+class DataVersions:
+    """Reads and bumps the data_versions counters"""
+
+    @staticmethod
+    def bump(db: Session, table: str, patient_id: Optional[int] = None) -> None:
+        """Increment the table's counter (and the patient's, if given); the caller commits"""
+        keys = [version_key(table)]
+        if patient_id is not None:
+            keys.append(version_key(table, patient_id))
+
+        counters = DataVersion.__table__
+        for key in keys:
+            stmt = conflict_insert(counters, db.get_bind().dialect.name)
+            if stmt is not None:
+                db.execute(
+                    stmt.values(key=key, version=1)
+                    .on_conflict_do_update(index_elements=["key"], set_={"version": counters.c.version + 1})
+                )
+                continue
+
+            result = db.execute(
+                update(counters).where(counters.c.key == key).values(version=counters.c.version + 1)
+            )
+            if result.rowcount == 0:
+                db.execute(insert(counters).values(key=key, version=1))
+
+    @staticmethod
+    def current(db: Session, keys: Iterable[str]) -> Dict[str, int]:
+        """Current counter of each key (0 if never bumped), in one query"""
+        keys = sorted(set(keys))
+        versions = dict.fromkeys(keys, 0)
+        versions.update(
+            db.query(DataVersion.key, DataVersion.version).filter(DataVersion.key.in_(keys)).all()
+        )
+        return versions
+
+
+def check_not_modified(request: Request, response: Response, db: Session, keys: Iterable[str]) -> Dict[str, int]:
+    """
+    Set a strong ETag over the request URL, today's date (for date-relative windows)
+    and the given data versions. Raises a 304 when If-None-Match already has it;
+    otherwise returns the versions, for caches keyed by them.
+    """
+    versions = DataVersions.current(db, keys)
+    digest = hashlib.sha256(json.dumps(
+        [request.url.path, sorted(request.query_params.multi_items()), date.today().isoformat(), versions]
+    ).encode()).hexdigest()
+    etag = f'"{digest[:32]}"'
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in candidates or "*" in candidates:
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+    return versions
+
+
+def conditional_get(auth, *tables: str):
+    """
+    Dependency factory for endpoints whose responses depend on whole tables.
+    Takes the endpoint's auth dependency, so a 304 is only given once it has passed.
+    """
+    def dependency(request: Request, response: Response, db: Session = Depends(get_db), _=Depends(auth)):
+        if request.method == "GET":
+            check_not_modified(request, response, db, [version_key(table) for table in tables])
+
+    return dependency
@@ -14,6 +14,54 @@ class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite:///./meditrack.db"
     CORS_ORIGINS_LIST: list = ["*"]
+
+    # Adherence
+    ADHERENCE_STATS_VERIFY: bool = False  # Cross-check incremental stats against a full recount on every write
+    ADHERENCE_STATS_STALE_SECONDS: int = 3600  # Stored stats older than this are refreshed in the background
+    MISSED_DOSE_GRACE_MINUTES: int = 120  # A dose slot with no log this long after its time is recorded as missed
+    MISSED_DOSE_LOOKBACK_DAYS: int = 7  # How far back the first materializer run looks
+    MISSED_DOSE_CHUNK_SIZE: int = 1000  # Patient medications per materializer transaction
+
+    # Reminders
+    REMINDER_HORIZON_DAYS: int = 14  # Days ahead the sweeper keeps reminders generated for
+    REMINDER_SWEEP_CHUNK_SIZE: int = 1000  # Reminder schedules per sweeper transaction
+    REMINDER_DISPATCH_BATCH_SIZE: int = 500  # Reminders claimed per dispatcher query
+    REMINDER_DISPATCH_LOOKAHEAD_SECONDS: int = 60  # Dispatchers claim reminders due this far ahead
+    REMINDER_DISPATCH_POLL_SECONDS: float = 1.0  # Interval between claim queries
+    REMINDER_LEASE_SECONDS: int = 120  # A claim outlives its reminder's time by this long before another worker may take it
+    REMINDER_RETRY_BASE_SECONDS: float = 30.0  # First retry delay; doubles per attempt, jittered
+    REMINDER_RETRY_MAX_SECONDS: float = 1800.0  # Longest delay between attempts
+    REMINDER_OUTAGE_THRESHOLD: int = 20  # Transient failures in a row from one provider that count as an outage
+
+    # Notification providers (point the URLs at fake_provider.py to load-test offline)
+    NOTIFY_MAX_CONNECTIONS: int = 100  # Keep-alive HTTP connections shared by every provider
+    NOTIFY_MAX_IN_FLIGHT: int = 200  # Sends awaiting a provider response at once
+    NOTIFY_TIMEOUT_SECONDS: float = 10.0
+    TWILIO_API_URL: str = "https://api.twilio.com"
+    TWILIO_ACCOUNT_SID: str = ""
+    TWILIO_AUTH_TOKEN: str = ""  # Also verifies status callbacks, which are refused while it is unset
+    TWILIO_SMS_FROM: str = ""
+    TWILIO_WHATSAPP_FROM: str = ""
+    TWILIO_STATUS_CALLBACK_URL: str = ""  # Public URL of POST /reminders/webhooks/twilio/status; callbacks are signed against it
+    TWILIO_RATE_PER_SECOND: float = 100.0
+    EMAIL_API_URL: str = "https://api.sendgrid.com"
+    EMAIL_API_KEY: str = ""
+    EMAIL_FROM: str = "reminders@meditrack.local"
+    EMAIL_RATE_PER_SECOND: float = 100.0
+    PUSH_API_URL: str = "https://fcm.googleapis.com"
+    PUSH_SERVER_KEY: str = ""
+    PUSH_RATE_PER_SECOND: float = 500.0
+
+    # Cache
+    CACHE_BACKEND: str = "memory"  # memory (per process), sqlite (shared file) or redis
+    CACHE_URL: str = ""  # File path for sqlite, redis:// URL for redis
+    CACHE_TTL_SECONDS: int = 60
+    CACHE_MAX_ENTRIES: int = 10000  # Per namespace, memory backend only
+
+    # Analytics
+    ANALYTICS_FANOUT_WORKERS: int = 8  # Threads running dashboard panels concurrently (1 = run in turn)
+    ANALYTICS_PANEL_TIMEOUT_SECONDS: float = 15.0  # A panel slower than this is rendered empty
+
     class Config:
         env_file = ".env"
         case_sensitive = True
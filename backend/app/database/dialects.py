@@ -0,0 +1,61 @@
+"""
+Dialect-portable SQL expressions
+Small helpers so aggregate queries run unchanged on SQLite and PostgreSQL
+"""
+from sqlalchemy import Date, Integer, cast, extract, func, literal, literal_column
+
+
+def day_number(column, dialect_name: str):
+    """Whole-day number of a DATE column; consecutive days differ by exactly 1"""
+    if dialect_name == "sqlite":
+        return func.julianday(column)
+    if dialect_name in ("mysql", "mariadb"):
+        return func.to_days(column)
+    return extract("epoch", column) / 86400
+
+
+def date_value(value, dialect_name: str):
+    """A Python date as a bound DATE parameter, cast where the server cannot infer its type"""
+    if dialect_name == "sqlite":
+        return literal(value, Date)
+    return cast(literal(value, Date), Date)
+
+
+def hour_of_day(column, dialect_name: str):
+    """Hour (0-23) of a DATETIME column as an integer"""
+    if dialect_name == "sqlite":
+        return cast(func.strftime("%H", column), Integer)
+    return extract("hour", column)
+
+
+def day_of_week(column, dialect_name: str):
+    """Day of week of a DATE/DATETIME column as an integer, 0 = Sunday ... 6 = Saturday"""
+    if dialect_name == "sqlite":
+        return cast(func.strftime("%w", column), Integer)
+    if dialect_name in ("mysql", "mariadb"):
+        return func.dayofweek(column) - 1
+    return extract("dow", column)
+
+
+def year_month(column, dialect_name: str):
+    """Month of a DATE/DATETIME column as a "YYYY-MM" string"""
+    if dialect_name == "sqlite":
+        return func.strftime("%Y-%m", column)
+    if dialect_name in ("mysql", "mariadb"):
+        return func.date_format(column, "%Y-%m")
+    # Inlined, not bound: with a parameter PostgreSQL would not match the SELECT and GROUP BY expressions
+    return func.to_char(column, literal_column("'YYYY-MM'"))
+
+
+def conflict_insert(table, dialect_name: str):
+    """
+    INSERT construct supporting ON CONFLICT clauses (SQLite and PostgreSQL),
+    or None when the dialect has no such syntax and the caller must fall back
+    """
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert(table)
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(table)
+    return None
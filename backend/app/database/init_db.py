@@ -1,11 +1,14 @@
 # app/database/init_db.py
 
 from app.database.db import Base, engine
+from app.database.migrations import create_missing_columns, create_missing_indexes
 from app.auth.models import User  # import all models so Base.metadata can see them
 from app.patients.models import Patient  # import patient model
 from app.medications.models import Medication, PatientMedication, InactiveMedication  # import medication models
-from app.adherence.models import MedicationLog, AdherenceStats, AdherenceGoal  # import adherence models
+from app.adherence.models import MedicationLog, AdherenceStats, AdherenceStreakState, DailyAdherenceRollup, MaterializerCheckpoint, AdherenceGoal  # import adherence models
 from app.reminders.models import Reminder, ReminderSchedule  # import reminder models
+from app.analytics.models import AnalyticsSnapshot  # import analytics snapshot model
+from app.cache.models import DataVersion  # import data version counters
 from sqlalchemy.orm import Session
 from app.database.db import get_db
 from app.auth.utils import hash_password
@@ -16,6 +19,8 @@ def init_db():
     """Initialize the database by creating all tables."""
     print("📦 Initializing database...")
     Base.metadata.create_all(bind=engine)
+    create_missing_columns(engine)
+    create_missing_indexes(engine)
     print("✅ Database initialized successfully.")
     
     # Create default admin user
@@ -0,0 +1,85 @@
+"""
+Schema migrations for existing databases
+create_all only creates missing tables, so columns and indexes added to tables that
+already exist are created here. Every step is idempotent and runs at startup.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+
+from app.database.db import Base
+
+# Unique indexes this process could not build; code relying on them checks by query instead
+_skipped_unique_indexes = set()
+
+
+def create_missing_columns(engine) -> list:
+    """
+    Add every nullable model column that is missing from an existing table
+    Columns that need a value for existing rows must be migrated by hand; they are
+    reported with a warning and skipped. Returns the "table.column" names added.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    preparer = engine.dialect.identifier_preparer
+    added = []
+
+    for table in Base.metadata.tables.values():
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            if not column.nullable or column.primary_key:
+                print(f"⚠️  Column {table.name}.{column.name} is missing and cannot be added automatically")
+                continue
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f"ALTER TABLE {preparer.format_table(table)} "
+                    f"ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=engine.dialect)}"
+                ))
+            added.append(f"{table.name}.{column.name}")
+            print(f"✅ Added column {column.name} to {table.name}")
+
+    return added
+
+
+def create_missing_indexes(engine) -> list:
+    """
+    Create every model index that is missing from an existing table
+    A unique index that cannot be built because of duplicate rows is skipped with a
+    warning (deduplicate the table, then restart) and reported by unique_index_missing
+    until then. Returns the names created.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+
+    for table in Base.metadata.tables.values():
+        if table.name not in existing_tables:
+            continue
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            try:
+                index.create(bind=engine)
+                _skipped_unique_indexes.discard(index.name)
+                created.append(index.name)
+                print(f"✅ Created index {index.name} on {table.name}")
+            except (IntegrityError, OperationalError, ProgrammingError) as e:
+                if not index.unique:
+                    raise
+                _skipped_unique_indexes.add(index.name)
+                print(f"⚠️  Could not create unique index {index.name} on {table.name}: "
+                      f"existing rows contain duplicates ({e.orig}). Duplicate checks fall back "
+                      f"to a query until the table is deduplicated and the app restarted.")
+
+    return created
+
+
+def unique_index_missing(name: str) -> bool:
+    """Whether create_missing_indexes had to skip this unique index because of duplicates"""
+    return name in _skipped_unique_indexes
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Enum as SQLEnum, Boolean, Date
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Enum as SQLEnum, Boolean, Date, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database.db import Base
@@ -57,6 +57,10 @@ class PatientMedication(Base):
     Links patients to medications with specific instructions and schedule
     """
     __tablename__ = "patient_medications"
+    __table_args__ = (
+        # A patient's active/pending assignments
+        Index("ix_patient_medications_patient_status", "patient_id", "status"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -10,6 +10,7 @@ from app.medications.schemas import (
     PatientMedicationStop
 )
 from app.auth.models import User, RoleEnum
+from app.cache.versions import DataVersions
 
 
 class MedicationService:
@@ -40,6 +41,7 @@ class MedicationService:
         )
         
         db.add(new_medication)
+        DataVersions.bump(db, "medications")
         db.commit()
         db.refresh(new_medication)
         
@@ -87,6 +89,7 @@ class MedicationService:
         for field, value in update_data.items():
             setattr(medication, field, value)
         
+        DataVersions.bump(db, "medications")
         db.commit()
         db.refresh(medication)
         
@@ -109,6 +112,7 @@ class MedicationService:
             )
         
         db.delete(medication)
+        DataVersions.bump(db, "medications")
         db.commit()
 
 
@@ -177,6 +181,7 @@ class PatientMedicationService:
             stopped_assignment.start_date = medication_data.start_date
             stopped_assignment.end_date = medication_data.end_date
             
+            DataVersions.bump(db, "patient_medications", patient_id)
             db.commit()
             db.refresh(stopped_assignment)
             return stopped_assignment
@@ -188,6 +193,7 @@ class PatientMedicationService:
                 active_assignments.sort(key=lambda x: x.updated_at, reverse=True)
                 for old_assignment in active_assignments[1:]:
                     db.delete(old_assignment)
+                DataVersions.bump(db, "patient_medications", patient_id)
                 db.commit()
                 # Refresh the kept assignment
                 db.refresh(active_assignments[0])
@@ -219,6 +225,7 @@ class PatientMedicationService:
         )
         
         db.add(patient_medication)
+        DataVersions.bump(db, "patient_medications", patient_id)
         db.commit()
         db.refresh(patient_medication)
         
@@ -291,6 +298,7 @@ class PatientMedicationService:
         patient_medication.status = MedicationStatusEnum.active
         patient_medication.confirmed_by_patient = True
         
+        DataVersions.bump(db, "patient_medications", patient_medication.patient_id)
         db.commit()
         db.refresh(patient_medication)
         
@@ -320,6 +328,7 @@ class PatientMedicationService:
         for field, value in update_data.items():
             setattr(patient_medication, field, value)
         
+        DataVersions.bump(db, "patient_medications", patient_medication.patient_id)
         db.commit()
         db.refresh(patient_medication)
         
@@ -355,6 +364,7 @@ class PatientMedicationService:
         )
         
         db.add(inactive_medication)
+        DataVersions.bump(db, "patient_medications", patient_medication.patient_id)
         db.commit()
         db.refresh(inactive_medication)
         
@@ -23,7 +23,7 @@ class Patient(Base):
     user_id = Column(Integer, ForeignKey("users.id"), unique=True, nullable=False)
     
     # Personal Information
-    date_of_birth = Column(Date, nullable=True)
+    date_of_birth = Column(Date, nullable=True, index=True)
     gender = Column(SQLEnum(GenderEnum), nullable=True)
     
     # Medical Information
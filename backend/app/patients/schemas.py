@@ -96,3 +96,6 @@ class UserBasicInfo(BaseModel):
     
     class Config:
         from_attributes = True
+
+
+PatientResponse.model_rebuild()
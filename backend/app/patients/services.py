@@ -3,6 +3,7 @@ from fastapi import HTTPException, status
 from app.patients.models import Patient
 from app.patients.schemas import PatientCreate, PatientUpdate, PatientAdminUpdate
 from app.auth.models import User, RoleEnum
+from app.cache.versions import DataVersions
 
 
 class PatientService:
@@ -28,6 +29,7 @@ class PatientService:
         )
         
         db.add(patient)
+        DataVersions.bump(db, "patients", user_id)
         db.commit()
         db.refresh(patient)
         
@@ -84,6 +86,7 @@ class PatientService:
             for field, value in user_updates.items():
                 setattr(patient.user, field, value)
         
+        DataVersions.bump(db, "patients", patient.user_id)
         db.commit()
         db.refresh(patient)
         
@@ -110,6 +113,7 @@ class PatientService:
             for field, value in user_updates.items():
                 setattr(patient.user, field, value)
         
+        DataVersions.bump(db, "patients", patient.user_id)
         db.commit()
         db.refresh(patient)
         
@@ -120,4 +124,5 @@ class PatientService:
         """Delete patient profile"""
         patient = PatientService.get_patient_by_id(db, patient_id)
         db.delete(patient)
+        DataVersions.bump(db, "patients", patient.user_id)
         db.commit()
@@ -0,0 +1,171 @@
+"""
+Notification channel adapters
+Each adapter turns a due reminder into one provider HTTP request and the provider's
+response into a SendResult. Providers: Twilio (WhatsApp, SMS), an email API with a
+SendGrid-style interface, and a push API addressed by patient topic.
+"""
+import base64
+import hashlib
+import hmac
+from typing import Dict, Mapping, NamedTuple, Optional
+
+import httpx
+
+from app.config.settings import settings
+from app.reminders.transport import SendResult
+
+
+# Provider (rate-limit bucket) behind each reminder channel; "all" reminders go out as push
+CHANNEL_PROVIDERS = {"whatsapp": "twilio", "sms": "twilio", "email": "email", "push": "push", "all": "push"}
+
+
+class Contact(NamedTuple):
+    """Where a patient's reminders go, per channel"""
+    whatsapp_number: Optional[str]
+    sms_number: Optional[str]
+    email_address: Optional[str]
+
+
+class ProviderRequest(NamedTuple):
+    """One HTTP request to a provider"""
+    method: str
+    url: str
+    data: Optional[Dict[str, str]] = None
+    json: Optional[dict] = None
+    headers: Optional[Dict[str, str]] = None
+    auth: Optional[tuple] = None
+
+
+class ChannelAdapter:
+    """Base adapter; `provider` names the rate-limit bucket the channel draws from"""
+    channel = "base"
+    provider = "base"
+
+    def build_request(self, reminder, contact: Optional[Contact]) -> Optional[ProviderRequest]:
+        """The provider request for a reminder, or None when the patient has no address for the channel"""
+        raise NotImplementedError
+
+    def parse_response(self, reminder, response: httpx.Response) -> SendResult:
+        raise NotImplementedError
+
+    @staticmethod
+    def error_result(reminder, response: httpx.Response) -> SendResult:
+        """Failure result carrying the provider's error code when it sent one"""
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        code = body.get("code") if isinstance(body, dict) else None
+        message = body.get("message") if isinstance(body, dict) else None
+        return SendResult(
+            reminder.id, False,
+            error_code=str(code) if code else f"http_{response.status_code}",
+            error_message=message or response.text[:500] or response.reason_phrase
+        )
+
+
+class TwilioMessageAdapter(ChannelAdapter):
+    """Twilio Messages API (SMS and, with whatsapp: addresses, WhatsApp)"""
+    provider = "twilio"
+
+    def __init__(self, whatsapp: bool = False):
+        self.whatsapp = whatsapp
+        self.channel = "whatsapp" if whatsapp else "sms"
+
+    def build_request(self, reminder, contact: Optional[Contact]) -> Optional[ProviderRequest]:
+        number = contact and (contact.whatsapp_number if self.whatsapp else contact.sms_number)
+        if not number:
+            return None
+
+        sender = settings.TWILIO_WHATSAPP_FROM if self.whatsapp else settings.TWILIO_SMS_FROM
+        data = {
+            "To": f"whatsapp:{number}" if self.whatsapp else number,
+            "From": f"whatsapp:{sender}" if self.whatsapp else sender,
+            "Body": reminder.message_text,
+        }
+        if settings.TWILIO_STATUS_CALLBACK_URL:
+            data["StatusCallback"] = settings.TWILIO_STATUS_CALLBACK_URL
+
+        return ProviderRequest(
+            "POST",
+            f"{settings.TWILIO_API_URL}/2010-04-01/Accounts/{settings.TWILIO_ACCOUNT_SID}/Messages.json",
+            data=data,
+            auth=(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN),
+        )
+
+    def parse_response(self, reminder, response: httpx.Response) -> SendResult:
+        if response.status_code not in (200, 201):
+            return self.error_result(reminder, response)
+        body = response.json()
+        return SendResult(reminder.id, True, message_sid=body.get("sid"), status=body.get("status", "queued"))
+
+
+class EmailAdapter(ChannelAdapter):
+    """Email API with a SendGrid-style v3 mail/send interface"""
+    channel = "email"
+    provider = "email"
+
+    def build_request(self, reminder, contact: Optional[Contact]) -> Optional[ProviderRequest]:
+        if not contact or not contact.email_address:
+            return None
+        return ProviderRequest(
+            "POST",
+            f"{settings.EMAIL_API_URL}/v3/mail/send",
+            json={
+                "personalizations": [{"to": [{"email": contact.email_address}]}],
+                "from": {"email": settings.EMAIL_FROM},
+                "subject": "Medication reminder",
+                "content": [{"type": "text/plain", "value": reminder.message_text}],
+                "custom_args": {"reminder_id": str(reminder.id)},
+            },
+            headers={"Authorization": f"Bearer {settings.EMAIL_API_KEY}"},
+        )
+
+    def parse_response(self, reminder, response: httpx.Response) -> SendResult:
+        if response.status_code not in (200, 202):
+            return self.error_result(reminder, response)
+        return SendResult(reminder.id, True, message_sid=response.headers.get("X-Message-Id"), status="accepted")
+
+
+class PushAdapter(ChannelAdapter):
+    """Push API; each patient's devices subscribe to the patient's topic"""
+    channel = "push"
+    provider = "push"
+
+    def build_request(self, reminder, contact: Optional[Contact]) -> Optional[ProviderRequest]:
+        return ProviderRequest(
+            "POST",
+            f"{settings.PUSH_API_URL}/v1/messages:send",
+            json={
+                "message": {
+                    "topic": f"patient-{reminder.patient_id}",
+                    "notification": {"title": "Medication reminder", "body": reminder.message_text},
+                    "data": {"reminder_id": str(reminder.id)},
+                }
+            },
+            headers={"Authorization": f"Bearer {settings.PUSH_SERVER_KEY}"},
+        )
+
+    def parse_response(self, reminder, response: httpx.Response) -> SendResult:
+        if response.status_code != 200:
+            return self.error_result(reminder, response)
+        return SendResult(reminder.id, True, message_sid=response.json().get("name"), status="sent")
+
+
+def default_adapters() -> Dict[str, ChannelAdapter]:
+    """Adapter per reminder channel; "all" reminders go out as push"""
+    push = PushAdapter()
+    return {
+        "whatsapp": TwilioMessageAdapter(whatsapp=True),
+        "sms": TwilioMessageAdapter(),
+        "email": EmailAdapter(),
+        "push": push,
+        "all": push,
+    }
+
+
+def twilio_signature(url: str, params: Mapping[str, str], auth_token: str) -> str:
+    """X-Twilio-Signature of a form POST: HMAC-SHA1 of the URL followed by the sorted parameters"""
+    payload = url + "".join(f"{key}{params[key]}" for key in sorted(params))
+    digest = hmac.new(auth_token.encode(), payload.encode(), hashlib.sha1).digest()
+    return base64.b64encode(digest).decode()
@@ -0,0 +1,298 @@
+"""
+Reminder dispatcher
+Claims pending reminders shortly before they are due, holds them in an in-memory heap
+ordered by time, and hands each one to a transport at its scheduled time.
+Claims are leases written atomically, so any number of dispatcher processes can run
+against the same database; a crashed worker's leases expire and are claimed again.
+"""
+import heapq
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import and_, bindparam, exists, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+from app.medications.models import PatientMedication, MedicationStatusEnum
+from app.reminders.models import Reminder, ReminderSchedule, ReminderStatusEnum
+from app.reminders.retry import RetryScheduler
+from app.reminders.transport import SendResult
+
+
+class ClaimedReminder(NamedTuple):
+    """What a dispatcher keeps in memory for a reminder it holds"""
+    id: int
+    patient_id: int
+    patient_medication_id: int
+    channel: str
+    scheduled_time: datetime
+    message_text: str
+    retry_count: Optional[int] = 0
+    max_retries: Optional[int] = 3
+    next_attempt_at: Optional[datetime] = None
+
+    @property
+    def due_at(self) -> datetime:
+        """When to send: the scheduled time, or the retry time of a reminder that failed before"""
+        return self.next_attempt_at or self.scheduled_time
+
+
+def default_worker_id() -> str:
+    """host:pid, unique among running dispatchers"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_due_reminders(
+    db: Session,
+    worker_id: str,
+    due_before: datetime,
+    lease_until: datetime,
+    limit: int,
+    now: Optional[datetime] = None
+) -> List[ClaimedReminder]:
+    """
+    Lease up to `limit` pending reminders due by due_before to worker_id, in one UPDATE.
+    Reminders with an unexpired lease are left alone; expired leases (crashed workers)
+    are taken over, and retries wait for their next attempt time. Reminders of a paused
+    or deleted schedule or a no longer active medication are not claimed. The caller commits.
+    Returns the claimed reminders in the order they are due.
+    """
+    now = now or datetime.now()
+    table = Reminder.__table__
+    candidate = table.alias("candidate")
+    dialect = db.get_bind().dialect
+
+    def claimable(reminders):
+        return and_(
+            reminders.c.status == ReminderStatusEnum.pending,
+            reminders.c.scheduled_time <= due_before,
+            or_(reminders.c.next_attempt_at.is_(None), reminders.c.next_attempt_at <= due_before),
+            or_(reminders.c.lease_expires_at.is_(None), reminders.c.lease_expires_at < now),
+            exists().where(
+                ReminderSchedule.patient_medication_id == reminders.c.patient_medication_id,
+                ReminderSchedule.is_active == True,
+                PatientMedication.id == ReminderSchedule.patient_medication_id,
+                PatientMedication.status == MedicationStatusEnum.active
+            )
+        )
+
+    # SKIP LOCKED lets concurrent PostgreSQL claimers take disjoint batches instead of queueing
+    candidates = select(candidate.c.id).where(claimable(candidate)).order_by(
+        candidate.c.scheduled_time
+    ).limit(limit).with_for_update(skip_locked=True)
+
+    # The outer condition is re-checked on the locked row, so a row claimed meanwhile is skipped
+    stmt = update(table).where(
+        table.c.id.in_(candidates.scalar_subquery()),
+        claimable(table)
+    ).values(claimed_by=worker_id, lease_expires_at=lease_until)
+
+    columns = [getattr(table.c, field) for field in ClaimedReminder._fields]
+    if dialect.update_returning:
+        rows = db.execute(stmt.returning(*columns)).all()
+    else:
+        db.execute(stmt)
+        rows = db.execute(select(*columns).where(
+            table.c.claimed_by == worker_id,
+            table.c.lease_expires_at == lease_until,
+            table.c.status == ReminderStatusEnum.pending
+        )).all()
+
+    return sorted((ClaimedReminder(*row) for row in rows), key=lambda reminder: reminder.due_at)
+
+
+def record_results(
+    db: Session,
+    worker_id: str,
+    results: List[SendResult],
+    now: Optional[datetime] = None,
+    retry_at: Optional[Dict[int, datetime]] = None
+) -> None:
+    """
+    Write send results back in two statements (sent, failed) and release the leases.
+    Failures with a time in retry_at go back to pending until then; the rest stay failed.
+    Only rows this worker still holds are updated. The caller commits.
+    """
+    retry_at = retry_at or {}
+    now = now or datetime.now()
+    table = Reminder.__table__
+    held = and_(table.c.id == bindparam("b_id"), table.c.claimed_by == worker_id)
+
+    sent = [
+        {"b_id": result.reminder_id, "b_sid": result.message_sid, "b_status": result.status}
+        for result in results if result.ok
+    ]
+    if sent:
+        db.execute(update(table).where(held).values(
+            status=ReminderStatusEnum.sent,
+            sent_at=now,
+            twilio_message_sid=bindparam("b_sid"),
+            twilio_status=bindparam("b_status"),
+            next_attempt_at=None,
+            claimed_by=None,
+            lease_expires_at=None
+        ), sent)
+
+    failed = [
+        {
+            "b_id": result.reminder_id,
+            "b_code": result.error_code,
+            "b_message": result.error_message,
+            "b_next": retry_at.get(result.reminder_id),
+            "b_state": ReminderStatusEnum.pending if result.reminder_id in retry_at else ReminderStatusEnum.failed,
+        }
+        for result in results if not result.ok
+    ]
+    if failed:
+        db.execute(update(table).where(held).values(
+            status=bindparam("b_state"),
+            next_attempt_at=bindparam("b_next"),
+            twilio_error_code=bindparam("b_code"),
+            twilio_error_message=bindparam("b_message"),
+            retry_count=table.c.retry_count + 1,
+            last_retry_at=now,
+            claimed_by=None,
+            lease_expires_at=None
+        ), failed)
+
+
+def release_leases(db: Session, worker_id: str, reminder_ids: List[int]) -> int:
+    """Give back still-pending reminders this worker holds; the caller commits"""
+    if not reminder_ids:
+        return 0
+    table = Reminder.__table__
+    return db.execute(update(table).where(
+        table.c.id.in_(reminder_ids),
+        table.c.claimed_by == worker_id,
+        table.c.status == ReminderStatusEnum.pending
+    ).values(claimed_by=None, lease_expires_at=None)).rowcount
+
+
+class ReminderDispatcher:
+    """
+    One dispatcher worker
+    Poll claims reminders due within the lookahead window onto the heap; fire_due sends
+    the ones whose time has come, a batch per transport call and per result write.
+    Failed sends are handed to the retry scheduler, which picks their next attempt time.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        transport,
+        worker_id: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        lookahead_seconds: Optional[int] = None,
+        lease_seconds: Optional[int] = None,
+        poll_seconds: Optional[float] = None,
+        clock: Callable[[], datetime] = datetime.now,
+        retries: Optional[RetryScheduler] = None
+    ):
+        self.session_factory = session_factory
+        self.transport = transport
+        self.worker_id = worker_id or default_worker_id()
+        self.batch_size = batch_size or settings.REMINDER_DISPATCH_BATCH_SIZE
+        self.lookahead = timedelta(seconds=lookahead_seconds if lookahead_seconds is not None
+                                   else settings.REMINDER_DISPATCH_LOOKAHEAD_SECONDS)
+        self.lease = timedelta(seconds=lease_seconds or settings.REMINDER_LEASE_SECONDS)
+        self.poll_seconds = poll_seconds if poll_seconds is not None else settings.REMINDER_DISPATCH_POLL_SECONDS
+        self.clock = clock
+        self.retries = retries or RetryScheduler()
+
+        # (due_at, id, reminder); the id breaks ties so reminders are never compared
+        self._heap: list = []
+        self.stats: Dict[str, int] = {"claimed": 0, "sent": 0, "failed": 0, "retried": 0, "batches": 0}
+
+    @property
+    def held(self) -> int:
+        """Reminders claimed and not yet sent"""
+        return len(self._heap)
+
+    def poll(self) -> int:
+        """Claim the next batch due within the lookahead window. Returns the number claimed."""
+        # Bounded memory: stop claiming while a few batches are already waiting
+        if len(self._heap) >= 4 * self.batch_size:
+            return 0
+
+        now = self.clock()
+        with self.session_factory() as db:
+            claimed = claim_due_reminders(
+                db, self.worker_id, now + self.lookahead, now + self.lookahead + self.lease, self.batch_size, now
+            )
+            db.commit()
+
+        for reminder in claimed:
+            heapq.heappush(self._heap, (reminder.due_at, reminder.id, reminder))
+        self.stats["claimed"] += len(claimed)
+        return len(claimed)
+
+    def fire_due(self) -> int:
+        """Send up to one batch of held reminders whose time has come. Returns the number sent."""
+        now = self.clock()
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            due.append(heapq.heappop(self._heap)[2])
+        if not due:
+            return 0
+
+        results = self.transport.send_batch(due)
+        now = self.clock()
+        retry_at = self.retries.schedule(due, results, now)
+        with self.session_factory() as db:
+            record_results(db, self.worker_id, results, now, retry_at)
+            db.commit()
+
+        sent = sum(1 for result in results if result.ok)
+        self.stats["sent"] += sent
+        self.stats["failed"] += len(results) - sent
+        self.stats["retried"] += len(retry_at)
+        self.stats["batches"] += 1
+        return len(due)
+
+    def run(self, stop: Optional[threading.Event] = None, until_idle: bool = False) -> Dict[str, int]:
+        """
+        Dispatch until stop is set (or, with until_idle, until nothing is due or held).
+        Leases on reminders still held at the end are released for other workers.
+        """
+        stop = stop or threading.Event()
+        next_poll = 0.0
+
+        try:
+            while not stop.is_set():
+                claimed = 0
+                if time.monotonic() >= next_poll:
+                    claimed = self.poll()
+                    # A full batch means more may be waiting; poll again right away
+                    next_poll = 0.0 if claimed == self.batch_size else time.monotonic() + self.poll_seconds
+
+                fired = self.fire_due()
+
+                if until_idle and not claimed and not fired and not self._heap:
+                    break
+                if claimed or fired:
+                    continue
+
+                # Sleep until the next reminder is due or the next poll, whichever is first
+                wait = max(next_poll - time.monotonic(), 0)
+                if self._heap:
+                    wait = min(wait, max((self._heap[0][0] - self.clock()).total_seconds(), 0))
+                stop.wait(wait)
+        finally:
+            self.release()
+
+        return dict(self.stats)
+
+    def release(self) -> int:
+        """Release the leases of every reminder still held"""
+        held_ids = [entry[1] for entry in self._heap]
+        self._heap = []
+        if not held_ids:
+            return 0
+        with self.session_factory() as db:
+            released = release_leases(db, self.worker_id, held_ids)
+            db.commit()
+        return released
@@ -0,0 +1,122 @@
+"""
+Fake notification provider
+A local stand-in for the Twilio Messages API, the email API and the push API with
+configurable latency, failures and throttling. Twilio messages get signed status
+callbacks (sent, then delivered or undelivered), so the whole send path, webhooks
+included, can be exercised and load-tested offline.
+"""
+import asyncio
+import random
+import uuid
+from collections import Counter
+from typing import Optional, Tuple
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from app.reminders.adapters import twilio_signature
+
+
+def create_fake_provider(
+    latency: Tuple[float, float] = (0.02, 0.08),
+    failure_rate: float = 0.0,
+    throttle_rate: float = 0.0,
+    undelivered_rate: float = 0.0,
+    callback_delay: float = 0.1,
+    auth_token: str = "",
+    callback_transport: Optional[httpx.AsyncBaseTransport] = None,
+    seed: Optional[int] = None
+) -> FastAPI:
+    """
+    Build the fake provider app
+    latency is a (min, max) response delay in seconds. failure_rate and throttle_rate are the
+    shares of requests answered 500 and 429; undelivered_rate is the share of accepted Twilio
+    messages whose final callback is "undelivered". Callbacks are signed with auth_token.
+    """
+    rng = random.Random(seed)
+    app = FastAPI(title="Fake notification provider")
+    app.state.stats = Counter()
+    app.state.callback_tasks = set()
+    app.state.callback_client = None
+
+    async def simulate(provider: str) -> Optional[JSONResponse]:
+        """Wait the simulated latency; returns the error response when this request should fail"""
+        app.state.stats[f"{provider}_requests"] += 1
+        await asyncio.sleep(rng.uniform(*latency))
+        roll = rng.random()
+        if roll < throttle_rate:
+            app.state.stats[f"{provider}_throttled"] += 1
+            return JSONResponse({"code": 20429, "message": "Too Many Requests", "status": 429}, status_code=429)
+        if roll < throttle_rate + failure_rate:
+            app.state.stats[f"{provider}_failed"] += 1
+            return JSONResponse({"code": 20500, "message": "Internal Server Error", "status": 500}, status_code=500)
+        app.state.stats[f"{provider}_accepted"] += 1
+        return None
+
+    async def send_callbacks(url: str, sid: str, to: str) -> None:
+        """Post the message's status changes to its StatusCallback URL"""
+        if app.state.callback_client is None:
+            app.state.callback_client = httpx.AsyncClient(transport=callback_transport)
+        undelivered = rng.random() < undelivered_rate
+        final = {"MessageStatus": "undelivered", "ErrorCode": "30003"} if undelivered else {"MessageStatus": "delivered"}
+
+        for update in ({"MessageStatus": "sent"}, final):
+            await asyncio.sleep(callback_delay)
+            params = {"MessageSid": sid, "To": to, **update}
+            headers = {"X-Twilio-Signature": twilio_signature(url, params, auth_token)} if auth_token else {}
+            try:
+                await app.state.callback_client.post(url, data=params, headers=headers)
+                app.state.stats["callbacks_sent"] += 1
+            except httpx.HTTPError:
+                app.state.stats["callbacks_failed"] += 1
+
+    @app.post("/2010-04-01/Accounts/{account_sid}/Messages.json")
+    async def create_message(account_sid: str, request: Request):
+        """Twilio: create a message (SMS or whatsapp:)"""
+        form = await request.form()
+        error = await simulate("twilio")
+        if error is not None:
+            return error
+        if not form.get("To") or not form.get("Body"):
+            return JSONResponse(
+                {"code": 21604, "message": "A 'To' phone number and a 'Body' are required.", "status": 400},
+                status_code=400
+            )
+
+        sid = f"SM{uuid.uuid4().hex}"
+        if form.get("StatusCallback"):
+            task = asyncio.create_task(send_callbacks(form["StatusCallback"], sid, form["To"]))
+            app.state.callback_tasks.add(task)
+            task.add_done_callback(app.state.callback_tasks.discard)
+
+        return JSONResponse(
+            {"sid": sid, "account_sid": account_sid, "status": "queued",
+             "to": form["To"], "from": form.get("From"), "body": form["Body"]},
+            status_code=201
+        )
+
+    @app.post("/v3/mail/send")
+    async def send_mail(request: Request):
+        """Email: accept a message"""
+        await request.body()
+        error = await simulate("email")
+        if error is not None:
+            return error
+        return Response(status_code=202, headers={"X-Message-Id": uuid.uuid4().hex})
+
+    @app.post("/v1/messages:send")
+    async def send_push(request: Request):
+        """Push: send to a topic"""
+        await request.body()
+        error = await simulate("push")
+        if error is not None:
+            return error
+        return JSONResponse({"name": f"projects/fake/messages/{uuid.uuid4().hex}"})
+
+    @app.get("/stats")
+    def stats():
+        """Request, outcome and callback counters"""
+        return dict(app.state.stats, callbacks_pending=len(app.state.callback_tasks))
+
+    return app
@@ -0,0 +1,207 @@
+"""
+HTTP notification transport
+Sends reminders through the channel adapters on one asyncio event loop with a shared
+keep-alive connection pool, a cap on requests in flight and a token bucket per provider.
+All of a batch's sends are issued together and complete in any order, so one slow
+provider response holds a single slot instead of the whole batch.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+import httpx
+from sqlalchemy.orm import Session
+
+from app.auth.models import User
+from app.config.settings import settings
+from app.reminders.adapters import ChannelAdapter, Contact, default_adapters
+from app.reminders.models import NotificationPreference
+from app.reminders.transport import SendResult
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Asyncio token bucket: `rate` sends per second on average, bursts of up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self) -> None:
+        """Wait for a token; waiters are served in arrival order"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def default_rate_limits() -> Dict[str, float]:
+    """Sends per second allowed per provider"""
+    return {
+        "twilio": settings.TWILIO_RATE_PER_SECOND,
+        "email": settings.EMAIL_RATE_PER_SECOND,
+        "push": settings.PUSH_RATE_PER_SECOND,
+    }
+
+
+def load_contacts(db: Session, patient_ids: Iterable[int]) -> Dict[int, Contact]:
+    """Addresses of the given patients in one query; notification preferences override the account's"""
+    rows = db.query(
+        User.id,
+        User.phone,
+        User.email,
+        NotificationPreference.whatsapp_number,
+        NotificationPreference.sms_number,
+        NotificationPreference.email_address
+    ).outerjoin(
+        NotificationPreference, NotificationPreference.patient_id == User.id
+    ).filter(User.id.in_(set(patient_ids))).all()
+
+    return {
+        row.id: Contact(
+            whatsapp_number=row.whatsapp_number or row.phone,
+            sms_number=row.sms_number or row.phone,
+            email_address=row.email_address or row.email
+        )
+        for row in rows
+    }
+
+
+class AsyncNotificationTransport:
+    """
+    Transport for the reminder dispatcher that delivers through the provider APIs
+    send_batch is the blocking entry point; it runs the sends on the transport's own
+    event loop thread so the connection pool stays warm between batches.
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        adapters: Optional[Dict[str, ChannelAdapter]] = None,
+        rate_limits: Optional[Dict[str, float]] = None,
+        max_connections: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        timeout: Optional[float] = None,
+        http_transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.session_factory = session_factory
+        self.adapters = adapters or default_adapters()
+        limits = rate_limits if rate_limits is not None else default_rate_limits()
+        self.buckets = {provider: TokenBucket(rate) for provider, rate in limits.items() if rate}
+        self.max_connections = max_connections or settings.NOTIFY_MAX_CONNECTIONS
+        self.max_in_flight = max_in_flight or settings.NOTIFY_MAX_IN_FLIGHT
+        self.timeout = timeout or settings.NOTIFY_TIMEOUT_SECONDS
+        self.http_transport = http_transport
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    # ==================== ASYNC API ====================
+
+    async def send_many(self, reminders: list, contacts: Dict[int, Contact]) -> List[SendResult]:
+        """Send every reminder concurrently; results come back in the reminders' order"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                timeout=self.timeout,
+                transport=self.http_transport
+            )
+            self._in_flight = asyncio.Semaphore(self.max_in_flight)
+
+        return list(await asyncio.gather(*(
+            self._send_one(reminder, contacts.get(reminder.patient_id)) for reminder in reminders
+        )))
+
+    async def aclose(self) -> None:
+        """Close the connection pool"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _send_one(self, reminder, contact: Optional[Contact]) -> SendResult:
+        channel = getattr(reminder.channel, "value", reminder.channel)
+        adapter = self.adapters.get(channel)
+        if adapter is None:
+            return SendResult(reminder.id, False, error_code="unsupported_channel",
+                              error_message=f"No adapter for channel {channel}")
+
+        request = adapter.build_request(reminder, contact)
+        if request is None:
+            return SendResult(reminder.id, False, error_code="no_recipient",
+                              error_message=f"No {adapter.channel} address for patient {reminder.patient_id}")
+
+        # Wait for the provider's rate limit before taking an in-flight slot,
+        # so a throttled provider cannot starve the others
+        bucket = self.buckets.get(adapter.provider)
+        if bucket is not None:
+            await bucket.acquire()
+
+        async with self._in_flight:
+            try:
+                response = await self._client.request(
+                    request.method, request.url,
+                    data=request.data, json=request.json, headers=request.headers, auth=request.auth
+                )
+            except httpx.TimeoutException:
+                return SendResult(reminder.id, False, error_code="timeout",
+                                  error_message=f"{adapter.provider} did not answer in {self.timeout}s")
+            except httpx.HTTPError as e:
+                return SendResult(reminder.id, False, error_code="connection_error",
+                                  error_message=f"{adapter.provider}: {e}")
+
+        try:
+            return adapter.parse_response(reminder, response)
+        except ValueError:
+            logger.warning("Unreadable %s response for reminder %s", adapter.provider, reminder.id)
+            return SendResult(reminder.id, False, error_code="bad_response",
+                              error_message=response.text[:500])
+
+    # ==================== BLOCKING API (dispatcher) ====================
+
+    def send_batch(self, reminders: list) -> List[SendResult]:
+        """Look up the batch's addresses in one query, then send them all and wait"""
+        contacts: Dict[int, Contact] = {}
+        if self.session_factory is not None:
+            with self.session_factory() as db:
+                contacts = load_contacts(db, {reminder.patient_id for reminder in reminders})
+
+        future = asyncio.run_coroutine_threadsafe(self.send_many(reminders, contacts), self._get_loop())
+        return future.result()
+
+    def close(self) -> None:
+        """Close the pool and stop the loop thread"""
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """Event loop thread, started on first use"""
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(
+                target=self._loop.run_forever, name="notification-transport", daemon=True
+            )
+            self._thread.start()
+        return self._loop
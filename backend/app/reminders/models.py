@@ -2,7 +2,7 @@
 Reminder and notification models
 Support for scheduled reminders and WhatsApp/SMS integration
 """
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Enum as SQLEnum, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Enum as SQLEnum, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -46,6 +46,14 @@ class Reminder(Base):
     Each scheduled dose gets a reminder record
     """
     __tablename__ = "reminders"
+    __table_args__ = (
+        # A patient's upcoming/recent reminders
+        Index("ix_reminders_patient_time", "patient_id", "scheduled_time"),
+        # One reminder per medication slot; generation inserts with ON CONFLICT DO NOTHING
+        Index("uq_reminders_medication_time", "patient_medication_id", "scheduled_time", unique=True),
+        # Due pending reminders, in time order (dispatcher claims)
+        Index("ix_reminders_status_time", "status", "scheduled_time"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     patient_medication_id = Column(Integer, ForeignKey("patient_medications.id"), nullable=False)
@@ -80,6 +88,11 @@ class Reminder(Base):
     retry_count = Column(Integer, default=0)
     max_retries = Column(Integer, default=3)
     last_retry_at = Column(DateTime, nullable=True)
+    next_attempt_at = Column(DateTime, nullable=True)  # A failed reminder back in pending is not sent before this
+    
+    # Dispatcher lease: the worker holding a pending reminder until it is sent or the lease expires
+    claimed_by = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
     
     # Relationships to adherence
     medication_log_id = Column(Integer, ForeignKey("medication_logs.id"), nullable=True)  # Created log entry
@@ -135,6 +148,7 @@ class ReminderSchedule(Base):
     # Date range
     start_date = Column(DateTime, nullable=False)
     end_date = Column(DateTime, nullable=True)  # Null = indefinite
+    generated_until = Column(DateTime, nullable=True)  # Reminders exist for every slot before this (horizon sweeper)
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
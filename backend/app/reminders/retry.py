@@ -0,0 +1,157 @@
+"""
+Reminder retry scheduling
+Failed sends go back to pending with a next attempt time, backed off exponentially with
+jitter, until the reminder's max_retries is used up; after that the reminder stays failed
+(the dead letters). When one provider fails many sends in a row, it is treated as an
+outage: its retries wait for one shared resume time and are then released at the
+provider's rate instead of all at once.
+"""
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from app.config.settings import settings
+from app.reminders.adapters import CHANNEL_PROVIDERS
+from app.reminders.transport import SendResult
+
+# Failures a resend cannot fix (no address, invalid, unreachable or unsubscribed number,
+# rejected request); Twilio 3000x codes arrive in undelivered status callbacks
+PERMANENT_ERROR_CODES = {
+    "no_recipient", "unsupported_channel", "bad_response",
+    "21211", "21408", "21604", "21610", "21614", "63016",
+    "30004", "30005", "30006",
+    "http_400", "http_401", "http_403", "http_404",
+}
+
+# Failures that say the provider, not the message, is in trouble
+TRANSIENT_ERROR_CODES = {"timeout", "connection_error", "20429", "20500", "20503", "http_429"}
+
+
+def is_retryable(error_code: Optional[str]) -> bool:
+    """Whether a send that failed with error_code is worth another attempt"""
+    return error_code not in PERMANENT_ERROR_CODES
+
+
+def is_transient(error_code: Optional[str]) -> bool:
+    """Whether error_code points at a provider outage (throttling, timeouts, 5xx)"""
+    return error_code in TRANSIENT_ERROR_CODES or (error_code or "").startswith("http_5")
+
+
+def backoff_seconds(
+    attempt: int,
+    base_seconds: Optional[float] = None,
+    max_seconds: Optional[float] = None,
+    rng: Optional[random.Random] = None
+) -> float:
+    """
+    Delay before retry number `attempt` (1 for the first retry): base * 2^(attempt - 1),
+    capped at max_seconds, then jittered down by up to half so retries do not line up
+    """
+    base = base_seconds if base_seconds is not None else settings.REMINDER_RETRY_BASE_SECONDS
+    cap = max_seconds if max_seconds is not None else settings.REMINDER_RETRY_MAX_SECONDS
+    delay = min(cap, base * 2 ** max(attempt - 1, 0))
+    return delay * (rng or random).uniform(0.5, 1.0)
+
+
+def next_attempt_time(
+    retry_count: int,
+    max_retries: Optional[int],
+    error_code: Optional[str],
+    now: datetime,
+    rng: Optional[random.Random] = None
+) -> Optional[datetime]:
+    """
+    When a reminder that has now failed retry_count times should be tried again,
+    or None when it should be dead-lettered instead
+    """
+    if not is_retryable(error_code) or retry_count > (max_retries if max_retries is not None else 3):
+        return None
+    return now + timedelta(seconds=backoff_seconds(retry_count, rng=rng))
+
+
+class _Outage:
+    """A provider failing consistently: one resume time and a release cursor for its retries"""
+
+    def __init__(self, level: int, resume_at: datetime):
+        self.level = level
+        self.resume_at = resume_at
+        self.next_slot = resume_at
+
+
+class RetryScheduler:
+    """
+    Retry times for one dispatcher's failed sends
+    A provider is considered down after outage_threshold transient failures in a row and
+    up again once a send to it succeeds after the resume time. Outage state is per process;
+    each worker spaces its own retries at the provider's rate.
+    """
+
+    def __init__(
+        self,
+        outage_threshold: Optional[int] = None,
+        rates: Optional[Dict[str, float]] = None,
+        rng: Optional[random.Random] = None
+    ):
+        self.outage_threshold = outage_threshold or settings.REMINDER_OUTAGE_THRESHOLD
+        self.rates = rates if rates is not None else {
+            "twilio": settings.TWILIO_RATE_PER_SECOND,
+            "email": settings.EMAIL_RATE_PER_SECOND,
+            "push": settings.PUSH_RATE_PER_SECOND,
+        }
+        self.rng = rng or random.Random()
+        self._streaks: Dict[str, int] = {}
+        self._outages: Dict[str, _Outage] = {}
+
+    def in_outage(self, provider: str) -> bool:
+        """Whether retries to the provider are currently held for an outage"""
+        return provider in self._outages
+
+    def schedule(self, reminders: Iterable, results: List[SendResult], now: datetime) -> Dict[int, datetime]:
+        """
+        Next attempt time per failed reminder that should be retried; failed reminders
+        missing from the result are out of retries (or failed permanently)
+        """
+        by_id = {reminder.id: reminder for reminder in reminders}
+        retry_at: Dict[int, datetime] = {}
+
+        for result in results:
+            reminder = by_id[result.reminder_id]
+            channel = getattr(reminder.channel, "value", reminder.channel)
+            provider = CHANNEL_PROVIDERS.get(channel, channel)
+
+            if result.ok:
+                self._streaks[provider] = 0
+                outage = self._outages.get(provider)
+                if outage is not None and now >= outage.resume_at:
+                    del self._outages[provider]
+                continue
+
+            retry_count = (reminder.retry_count or 0) + 1
+            if is_transient(result.error_code):
+                self._streaks[provider] = self._streaks.get(provider, 0) + 1
+
+            next_attempt = next_attempt_time(retry_count, reminder.max_retries, result.error_code, now, self.rng)
+            if next_attempt is None:
+                continue
+
+            if provider in self._outages or self._streaks.get(provider, 0) >= self.outage_threshold:
+                next_attempt = self._outage_slot(provider, now)
+            retry_at[reminder.id] = next_attempt
+
+        return retry_at
+
+    def _outage_slot(self, provider: str, now: datetime) -> datetime:
+        """The next free retry slot of the provider's outage, opening or extending it as needed"""
+        outage = self._outages.get(provider)
+        if outage is None:
+            outage = self._outages[provider] = _Outage(1, now + timedelta(seconds=backoff_seconds(1, rng=self.rng)))
+        elif now >= outage.resume_at:
+            # Still failing after the pause: pause longer
+            outage.level += 1
+            outage.resume_at = now + timedelta(seconds=backoff_seconds(outage.level, rng=self.rng))
+            outage.next_slot = outage.resume_at
+
+        slot = outage.next_slot
+        rate = self.rates.get(provider) or 1.0
+        outage.next_slot = slot + timedelta(seconds=1 / rate)
+        return slot
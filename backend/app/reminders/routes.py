@@ -2,13 +2,17 @@
 Reminder API routes
 Endpoints for managing medication reminders
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+import hmac
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
 
+from app.config.settings import settings
 from app.database.db import get_db
-from app.auth.services import get_current_user
+from app.auth.services import get_current_user, require_admin
 from app.auth.models import User
 from app.reminders.services import ReminderService
 from app.reminders.schemas import (
@@ -16,9 +20,15 @@ from app.reminders.schemas import (
     ReminderScheduleUpdate,
     ReminderScheduleResponse,
     ReminderResponse,
-    ReminderCancel
+    ReminderCancel,
+    BulkReminderGenerate,
+    BulkReminderResponse,
+    ReminderSweepResponse,
+    DeadLetterSummary
 )
 from app.reminders.models import ReminderSchedule, Reminder
+from app.reminders.adapters import twilio_signature
+from app.reminders.sweeper import ReminderHorizonSweeper
 
 
 router = APIRouter(prefix="/reminders", tags=["reminders"])
@@ -367,18 +377,110 @@ def generate_reminders(
     if not schedule or schedule.id != schedule_id:
         raise HTTPException(status_code=404, detail="Schedule not found")
     
-    reminders = service.generate_reminders_for_schedule(
+    reminder_ids = service.generate_reminders_for_schedule(
         schedule_id=schedule_id,
         days_ahead=days_ahead
     )
+    reminders = db.query(Reminder).filter(
+        Reminder.id.in_(reminder_ids)
+    ).order_by(Reminder.scheduled_time).all() if reminder_ids else []
     
     return {
-        "message": f"Generated {len(reminders)} reminders",
-        "count": len(reminders),
+        "message": f"Generated {len(reminder_ids)} reminders",
+        "count": len(reminder_ids),
+        "reminder_ids": reminder_ids,
         "reminders": reminders
     }
 
 
+@router.post("/admin/generate", response_model=BulkReminderResponse)
+def generate_reminders_for_range(
+    bulk_data: BulkReminderGenerate,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Generate reminders for one patient medication over a date range (admin only)"""
+    service = ReminderService(db)
+    try:
+        return service.generate_reminders_for_range(bulk_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/admin/sweep", response_model=ReminderSweepResponse)
+def sweep_reminder_horizon(
+    days_ahead: Optional[int] = Query(None, ge=1, le=90, description="Horizon in days (default from settings)"),
+    chunk_size: Optional[int] = Query(None, ge=1, le=10000, description="Schedules per transaction"),
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    Generate reminders up to the horizon for every active schedule (admin only)
+    Normally run from cron with sweep_reminders.py
+    """
+    return ReminderHorizonSweeper.run(db, days_ahead=days_ahead, chunk_size=chunk_size)
+
+
+@router.get("/admin/dead-letters", response_model=DeadLetterSummary)
+def get_dead_letters(
+    patient_id: Optional[int] = None,
+    channel: Optional[str] = None,
+    error_code: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    Reminders that will not be retried, grouped by channel and error code (admin only)
+    
+    Query params:
+    - patient_id, channel, error_code: Narrow the view
+    - limit: Most recent dead letters to list (default 100)
+    """
+    service = ReminderService(db)
+    return service.get_dead_letter_summary(
+        patient_id=patient_id,
+        channel=channel,
+        error_code=error_code,
+        limit=limit
+    )
+
+
+@router.post("/webhooks/twilio/status", status_code=status.HTTP_204_NO_CONTENT)
+async def twilio_status_callback(
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    Twilio message status callback (delivered, read, undelivered, ...)
+    Every callback must carry a valid X-Twilio-Signature, so the route is closed until
+    TWILIO_AUTH_TOKEN is set. Twilio signs the URL it posted to: the configured
+    TWILIO_STATUS_CALLBACK_URL, which behind a proxy differs from the URL seen here.
+    """
+    if not settings.TWILIO_AUTH_TOKEN:
+        raise HTTPException(status_code=403, detail="Twilio callbacks are disabled: no auth token configured")
+    
+    params = {key: value for key, value in (await request.form()).items()}
+    
+    signed_url = settings.TWILIO_STATUS_CALLBACK_URL or str(request.url)
+    expected = twilio_signature(signed_url, params, settings.TWILIO_AUTH_TOKEN)
+    if not hmac.compare_digest(expected, request.headers.get("X-Twilio-Signature", "")):
+        raise HTTPException(status_code=403, detail="Invalid Twilio signature")
+    
+    if not params.get("MessageSid") or not params.get("MessageStatus"):
+        raise HTTPException(status_code=400, detail="MessageSid and MessageStatus are required")
+    
+    service = ReminderService(db)
+    await run_in_threadpool(
+        service.apply_status_callback,
+        params["MessageSid"],
+        params["MessageStatus"],
+        params.get("ErrorCode"),
+        params.get("ErrorMessage")
+    )
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
 @router.get("/stats/summary")
 def get_reminder_stats(
     days: int = 30,
@@ -57,7 +57,10 @@ class ReminderResponse(BaseModel):
     sent_at: Optional[datetime]
     delivered_at: Optional[datetime]
     read_at: Optional[datetime]
+    twilio_error_code: Optional[str] = None
+    twilio_error_message: Optional[str] = None
     retry_count: int
+    next_attempt_at: Optional[datetime] = None
     created_at: datetime
     
     class Config:
@@ -315,6 +318,34 @@ class BulkReminderResponse(BaseModel):
     errors: List[str]
 
 
+class ReminderSweepResponse(BaseModel):
+    """Horizon sweep summary with throughput"""
+    schedules_scanned: int = Field(..., description="Schedules whose horizon was extended")
+    schedules_up_to_date: int = Field(..., description="Schedules skipped, already generated to the horizon")
+    chunks: int
+    generated_count: int
+    failed_schedules: int
+    errors: List[str] = Field(..., description="First errors of the run (schedules with bad reminder times)")
+    elapsed_seconds: float
+    schedules_per_second: float
+    reminders_per_second: float
+
+
+class DeadLetterErrorCode(BaseModel):
+    """Dead-lettered reminders sharing a channel and error code"""
+    channel: str
+    error_code: Optional[str]
+    count: int
+    last_failed_at: Optional[datetime]
+
+
+class DeadLetterSummary(BaseModel):
+    """Reminders that failed for good: error code breakdown and the most recent ones"""
+    total: int
+    error_codes: List[DeadLetterErrorCode]
+    reminders: List[ReminderResponse]
+
+
 # ==================== DASHBOARD & REPORTS ====================
 
 class ReminderDashboard(BaseModel):
@@ -3,8 +3,8 @@ Reminder service layer
 Business logic for managing medication reminders (Twilio integration skipped)
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from datetime import datetime, timedelta, time as dt_time
+from sqlalchemy import and_, or_, insert, func
+from datetime import date, datetime, timedelta, time as dt_time
 from typing import List, Optional, Dict
 import json
 
@@ -17,10 +17,14 @@ from app.reminders.models import (
 )
 from app.reminders.schemas import (
     ReminderScheduleCreate,
-    ReminderScheduleUpdate
+    ReminderScheduleUpdate,
+    BulkReminderGenerate,
+    BulkReminderResponse
 )
 from app.medications.models import PatientMedication
 from app.adherence.models import MedicationLog
+from app.database.dialects import conflict_insert
+from app.reminders.retry import next_attempt_time
 
 
 class ReminderService:
@@ -140,6 +144,10 @@ class ReminderService:
         for key, value in update_dict.items():
             setattr(schedule, key, value)
         
+        # Let the horizon sweeper fill the horizon again with the new settings
+        self._drop_upcoming_reminders(schedule)
+        schedule.generated_until = None
+        
         self.db.commit()
         self.db.refresh(schedule)
         
@@ -161,6 +169,7 @@ class ReminderService:
         if not schedule:
             raise ValueError("Reminder schedule not found or access denied")
         
+        self._drop_upcoming_reminders(schedule)
         self.db.delete(schedule)
         self.db.commit()
         
@@ -184,11 +193,27 @@ class ReminderService:
             raise ValueError("Reminder schedule not found or access denied")
         
         schedule.is_active = is_active
+        self._drop_upcoming_reminders(schedule)
+        schedule.generated_until = None
         self.db.commit()
         self.db.refresh(schedule)
         
         return schedule
     
+    def _drop_upcoming_reminders(self, schedule: ReminderSchedule) -> int:
+        """
+        Delete the schedule's pending reminders that are not due or claimed yet, so the
+        sweeper regenerates them from the current settings (or not at all when paused).
+        Deleted rather than cancelled: a cancelled row would hold its slot in the unique index.
+        """
+        now = datetime.now()
+        return self.db.query(Reminder).filter(
+            Reminder.patient_medication_id == schedule.patient_medication_id,
+            Reminder.status == ReminderStatusEnum.pending,
+            Reminder.scheduled_time >= now,
+            or_(Reminder.lease_expires_at.is_(None), Reminder.lease_expires_at < now)
+        ).delete(synchronize_session=False)
+    
     # ==================== REMINDER INSTANCE MANAGEMENT ====================
     
     def get_pending_reminders(
@@ -197,9 +222,14 @@ class ReminderService:
         limit: int = 100
     ) -> List[Reminder]:
         """Get pending reminders (for background job processing)"""
+        now = datetime.now()
         query = self.db.query(Reminder).filter(
             Reminder.status == ReminderStatusEnum.pending,
-            Reminder.scheduled_time <= datetime.now()
+            Reminder.scheduled_time <= now,
+            # Failed reminders waiting for their retry are not due yet
+            or_(Reminder.next_attempt_at.is_(None), Reminder.next_attempt_at <= now),
+            # Reminders claimed by a running dispatcher are not up for grabs
+            or_(Reminder.lease_expires_at.is_(None), Reminder.lease_expires_at < now)
         )
         
         if patient_id:
@@ -313,24 +343,67 @@ class ReminderService:
     def mark_reminder_failed(
         self,
         reminder_id: int,
-        error_message: str
+        error_message: str,
+        error_code: Optional[str] = None
     ) -> Reminder:
-        """Mark reminder as failed"""
+        """
+        Record a failed send
+        The reminder goes back to pending with a backed-off next attempt time while it has
+        retries left; otherwise (or for an error a resend cannot fix) it stays failed.
+        """
         reminder = self.db.query(Reminder).get(reminder_id)
         
         if not reminder:
             raise ValueError("Reminder not found")
         
-        reminder.status = ReminderStatusEnum.failed
+        now = datetime.now()
+        reminder.retry_count = (reminder.retry_count or 0) + 1
+        reminder.last_retry_at = now
+        reminder.twilio_error_code = error_code
         reminder.twilio_error_message = error_message
-        reminder.retry_count += 1
-        reminder.last_retry_at = datetime.now()
+        reminder.next_attempt_at = next_attempt_time(reminder.retry_count, reminder.max_retries, error_code, now)
+        reminder.status = ReminderStatusEnum.pending if reminder.next_attempt_at else ReminderStatusEnum.failed
         
         self.db.commit()
         self.db.refresh(reminder)
         
         return reminder
     
+    def apply_status_callback(
+        self,
+        message_sid: str,
+        message_status: str,
+        error_code: Optional[str] = None,
+        error_message: Optional[str] = None
+    ) -> Optional[Reminder]:
+        """Apply a provider delivery status (Twilio status callback) to its reminder"""
+        reminder = self.db.query(Reminder).filter(
+            Reminder.twilio_message_sid == message_sid
+        ).first()
+        
+        if not reminder:
+            return None
+        
+        reminder.twilio_status = message_status
+        
+        # Callbacks can arrive late or out of order; never move a reminder back from a reply
+        if reminder.status != ReminderStatusEnum.responded:
+            if message_status == "delivered" and reminder.status != ReminderStatusEnum.read:
+                reminder.status = ReminderStatusEnum.delivered
+                reminder.delivered_at = datetime.now()
+            elif message_status == "read":
+                reminder.status = ReminderStatusEnum.read
+                reminder.read_at = datetime.now()
+            elif message_status in ("failed", "undelivered"):
+                # Carrier failures are retried like failed sends; only permanent or exhausted ones are dead-lettered
+                return self.mark_reminder_failed(
+                    reminder.id, error_message or f"Message {message_status}", error_code
+                )
+        
+        self.db.commit()
+        
+        return reminder
+    
     def record_reminder_response(
         self,
         message_sid: str,
@@ -356,10 +429,11 @@ class ReminderService:
         self,
         schedule_id: int,
         days_ahead: int = 7
-    ) -> List[Reminder]:
+    ) -> List[int]:
         """
         Generate reminder instances for a schedule
-        Called by background job to create upcoming reminders
+        Called by background job to create upcoming reminders.
+        Returns the ids of the reminders created.
         """
         schedule = self.db.query(ReminderSchedule).get(schedule_id)
         
@@ -374,98 +448,135 @@ class ReminderService:
         if not patient_med:
             return []
         
-        # Parse reminder times
-        reminder_times = json.loads(schedule.reminder_times)
-        
-        # Generate reminders for the next N days
-        reminders_created = []
-        today = datetime.now().date()
-        
-        for day_offset in range(days_ahead):
-            target_date = today + timedelta(days=day_offset)
-            
-            # Check if within date range
-            if schedule.end_date and target_date > schedule.end_date.date():
-                continue
-            
-            for time_str in reminder_times:
-                # Parse time
-                hour, minute = map(int, time_str.split(':'))
-                dose_time = datetime.combine(
-                    target_date, 
-                    dt_time(hour, minute)
-                )
-                
-                # Calculate reminder time (advance_minutes before dose)
-                reminder_time = dose_time - timedelta(
-                    minutes=schedule.advance_minutes
-                )
-                
-                # Skip if in the past
-                if reminder_time < datetime.now():
-                    continue
-                
-                # Check if reminder already exists
-                existing = self.db.query(Reminder).filter(
-                    and_(
-                        Reminder.patient_medication_id == schedule.patient_medication_id,
-                        Reminder.scheduled_time == reminder_time
-                    )
-                ).first()
-                
-                if existing:
-                    continue
-                
-                # Determine primary channel
-                channel = ReminderChannelEnum.push
-                if schedule.channel_whatsapp:
-                    channel = ReminderChannelEnum.whatsapp
-                elif schedule.channel_sms:
-                    channel = ReminderChannelEnum.sms
-                elif schedule.channel_email:
-                    channel = ReminderChannelEnum.email
-                
-                # Create message text
-                message_text = self._generate_reminder_message(patient_med, dose_time)
-                
-                # Create reminder
-                reminder = Reminder(
-                    patient_medication_id=schedule.patient_medication_id,
-                    patient_id=schedule.patient_id,
-                    scheduled_time=reminder_time,
-                    actual_dose_time=dose_time,
-                    reminder_advance_minutes=schedule.advance_minutes,
-                    channel=channel,
-                    status=ReminderStatusEnum.pending,
-                    message_text=message_text
-                )
-                
-                self.db.add(reminder)
-                reminders_created.append(reminder)
+        # Slots for the next N days, within the schedule's date range
+        now = datetime.now()
+        last_day = now.date() + timedelta(days=days_ahead - 1)
+        if schedule.end_date:
+            last_day = min(last_day, schedule.end_date.date())
         
-        if reminders_created:
+        slots = reminder_slots(
+            schedule.reminder_times, schedule.advance_minutes, now.date(), last_day, now
+        )
+        
+        reminder_ids = self._create_missing_reminders(schedule, patient_med, slots)
+        if reminder_ids:
             self.db.commit()
-            for reminder in reminders_created:
-                self.db.refresh(reminder)
         
-        return reminders_created
+        return reminder_ids
+    
+    def generate_reminders_for_range(
+        self,
+        bulk_data: BulkReminderGenerate
+    ) -> BulkReminderResponse:
+        """
+        Generate reminders for one patient medication between two dates (admin backfill)
+        Uses the medication's reminder schedule; reminders already due are skipped
+        """
+        schedule = self.db.query(ReminderSchedule).filter(
+            ReminderSchedule.patient_medication_id == bulk_data.patient_medication_id
+        ).first()
+        
+        if not schedule:
+            raise ValueError("Reminder schedule not found for this medication")
+        
+        start, end = _local_naive(bulk_data.start_date), _local_naive(bulk_data.end_date)
+        if end < start:
+            raise ValueError("end_date must not be before start_date")
+        
+        if not schedule.is_active:
+            return BulkReminderResponse(generated_count=0, reminder_ids=[], errors=["Reminder schedule is inactive"])
+        
+        if schedule.end_date:
+            end = min(end, schedule.end_date)
+        
+        try:
+            slots = reminder_slots(
+                schedule.reminder_times, schedule.advance_minutes, start.date(), end.date(), max(start, datetime.now())
+            )
+        except ValueError as e:
+            return BulkReminderResponse(generated_count=0, reminder_ids=[], errors=[str(e)])
+        
+        slots = {reminder_time: dose_time for reminder_time, dose_time in slots.items() if reminder_time <= end}
+        reminder_ids = self._create_missing_reminders(schedule, schedule.patient_medication, slots)
+        self.db.commit()
+        
+        return BulkReminderResponse(generated_count=len(reminder_ids), reminder_ids=reminder_ids, errors=[])
     
-    def _generate_reminder_message(
+    def _create_missing_reminders(
         self,
+        schedule: ReminderSchedule,
         patient_med: PatientMedication,
-        dose_time: datetime
-    ) -> str:
-        """Generate reminder message text"""
-        medication = patient_med.medication
-        time_str = dose_time.strftime("%I:%M %p")
+        slots: Dict[datetime, datetime]
+    ) -> List[int]:
+        """Insert reminders for the slots that have none yet; the caller commits"""
+        if not slots:
+            return []
         
-        message = f"⏰ Medication Reminder\n\n"
-        message += f"💊 {medication.name}\n"
-        message += f"📋 Dosage: {patient_med.dosage}\n"
-        message += f"🕐 Time: {time_str}\n\n"
-        message += f"Reply TAKEN when you take it, or SKIP to skip this dose."
+        # Slots that already have a reminder, in one range query
+        existing = {
+            scheduled_time
+            for (scheduled_time,) in self.db.query(Reminder.scheduled_time).filter(
+                Reminder.patient_medication_id == schedule.patient_medication_id,
+                Reminder.scheduled_time.between(min(slots), max(slots))
+            ).all()
+        }
         
-        return message
+        rows = reminder_rows(
+            schedule,
+            patient_med.medication.name,
+            patient_med.dosage,
+            {reminder_time: dose_time for reminder_time, dose_time in slots.items() if reminder_time not in existing}
+        )
+        
+        return insert_reminders(self.db, rows)
+    
+    # ==================== DEAD LETTERS ====================
+    
+    def get_dead_letter_summary(
+        self,
+        patient_id: Optional[int] = None,
+        channel: Optional[str] = None,
+        error_code: Optional[str] = None,
+        limit: int = 100
+    ) -> Dict:
+        """
+        Reminders that failed for good (out of retries or a permanent error):
+        counts per channel and error code, plus the most recent ones
+        """
+        filters = [Reminder.status == ReminderStatusEnum.failed]
+        if patient_id:
+            filters.append(Reminder.patient_id == patient_id)
+        if channel:
+            filters.append(Reminder.channel == channel)
+        if error_code:
+            filters.append(Reminder.twilio_error_code == error_code)
+        
+        groups = self.db.query(
+            Reminder.channel,
+            Reminder.twilio_error_code,
+            func.count(Reminder.id).label("count"),
+            func.max(Reminder.last_retry_at).label("last_failed_at")
+        ).filter(*filters).group_by(
+            Reminder.channel, Reminder.twilio_error_code
+        ).order_by(func.count(Reminder.id).desc()).all()
+        
+        reminders = self.db.query(Reminder).filter(*filters).order_by(
+            Reminder.last_retry_at.desc(), Reminder.id.desc()
+        ).limit(limit).all()
+        
+        return {
+            "total": sum(group.count for group in groups),
+            "error_codes": [
+                {
+                    "channel": getattr(group.channel, "value", group.channel),
+                    "error_code": group.twilio_error_code,
+                    "count": group.count,
+                    "last_failed_at": group.last_failed_at
+                }
+                for group in groups
+            ],
+            "reminders": reminders
+        }
     
     # ==================== STATISTICS ====================
     
@@ -506,3 +617,122 @@ class ReminderService:
             "delivery_rate": (delivered / total * 100) if total > 0 else 0,
             "response_rate": (responded / delivered * 100) if delivered > 0 else 0
         }
+
+
+def reminder_slots(
+    reminder_times,
+    advance_minutes: Optional[int],
+    first_day: date,
+    last_day: date,
+    not_before: datetime
+) -> Dict[datetime, datetime]:
+    """
+    Reminder time -> dose time for each of a schedule's times of day from first_day
+    through last_day, leaving out reminders due before not_before.
+    Raises ValueError on a malformed "HH:MM" time.
+    """
+    if isinstance(reminder_times, str):
+        reminder_times = json.loads(reminder_times)
+    
+    times = []
+    for time_str in reminder_times:
+        try:
+            hour, minute = map(int, time_str.split(':'))
+            times.append(dt_time(hour, minute))
+        except (AttributeError, ValueError):
+            raise ValueError(f"Invalid reminder time {time_str!r}")
+    
+    advance = timedelta(minutes=advance_minutes or 0)
+    slots = {}
+    day = first_day
+    while day <= last_day:
+        for time_of_day in times:
+            dose_time = datetime.combine(day, time_of_day)
+            if dose_time - advance >= not_before:
+                slots[dose_time - advance] = dose_time
+        day += timedelta(days=1)
+    
+    return slots
+
+
+def reminder_rows(schedule, medication_name: str, dosage: str, slots: Dict[datetime, datetime]) -> List[Dict]:
+    """Reminder insert rows for a schedule's slots, in time order"""
+    # Determine primary channel
+    channel = ReminderChannelEnum.push
+    if schedule.channel_whatsapp:
+        channel = ReminderChannelEnum.whatsapp
+    elif schedule.channel_sms:
+        channel = ReminderChannelEnum.sms
+    elif schedule.channel_email:
+        channel = ReminderChannelEnum.email
+    
+    return [
+        {
+            "patient_medication_id": schedule.patient_medication_id,
+            "patient_id": schedule.patient_id,
+            "scheduled_time": reminder_time,
+            "actual_dose_time": dose_time,
+            "reminder_advance_minutes": schedule.advance_minutes,
+            "channel": channel,
+            "status": ReminderStatusEnum.pending,
+            "message_text": reminder_message(medication_name, dosage, dose_time),
+        }
+        for reminder_time, dose_time in sorted(slots.items())
+    ]
+
+
+def reminder_message(medication_name: str, dosage: str, dose_time: datetime) -> str:
+    """Generate reminder message text"""
+    time_str = dose_time.strftime("%I:%M %p")
+    
+    message = f"⏰ Medication Reminder\n\n"
+    message += f"💊 {medication_name}\n"
+    message += f"📋 Dosage: {dosage}\n"
+    message += f"🕐 Time: {time_str}\n\n"
+    message += f"Reply TAKEN when you take it, or SKIP to skip this dose."
+    
+    return message
+
+
+def insert_reminders(db: Session, rows: List[Dict]) -> List[int]:
+    """
+    Insert reminder rows in one statement and return the ids created
+    A slot taken concurrently is left alone by the unique (medication, time) index
+    """
+    if not rows:
+        return []
+    
+    table = Reminder.__table__
+    dialect = db.get_bind().dialect
+    
+    stmt = conflict_insert(table, dialect.name)
+    if stmt is not None:
+        stmt = stmt.on_conflict_do_nothing(
+            index_elements=["patient_medication_id", "scheduled_time"]
+        )
+    else:
+        stmt = insert(table)
+    
+    if dialect.insert_executemany_returning:
+        return list(db.execute(stmt.returning(table.c.id), rows).scalars())
+    
+    # No RETURNING: read the new ids back with one query
+    db.execute(stmt, rows)
+    wanted = {(row["patient_medication_id"], row["scheduled_time"]) for row in rows}
+    return [
+        reminder_id
+        for reminder_id, patient_medication_id, scheduled_time in db.query(
+            Reminder.id, Reminder.patient_medication_id, Reminder.scheduled_time
+        ).filter(
+            Reminder.patient_medication_id.in_({pm_id for pm_id, _ in wanted}),
+            Reminder.scheduled_time.in_({scheduled_time for _, scheduled_time in wanted})
+        ).order_by(Reminder.scheduled_time).all()
+        if (patient_medication_id, scheduled_time) in wanted
+    ]
+
+
+def _local_naive(value: datetime) -> datetime:
+    """Datetime as naive local time, like the rest of the reminder timestamps"""
+    if value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
@@ -0,0 +1,178 @@
+"""
+Reminder horizon sweeper
+Keeps reminders generated a rolling number of days ahead for every active reminder
+schedule, in keyset-ordered chunks with one read and one insert per chunk
+"""
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+from app.medications.models import Medication, PatientMedication, MedicationStatusEnum
+from app.reminders.models import Reminder, ReminderSchedule
+from app.reminders.services import insert_reminders, reminder_rows, reminder_slots
+
+# Error messages kept in the summary; later failures are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+class ReminderHorizonSweeper:
+    """Background job that extends every active schedule's reminders to the horizon"""
+
+    @staticmethod
+    def run(
+        db: Session,
+        days_ahead: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        now: Optional[datetime] = None
+    ) -> Dict:
+        """
+        Generate the missing reminders up to the horizon (today plus days_ahead days).
+        Schedules whose generated_until watermark already reaches the horizon are skipped,
+        so a rerun (or a run after an interrupted one) only touches unfinished schedules.
+        Each chunk is committed with its watermarks.
+        """
+        started = time.monotonic()
+        now = now or datetime.now()
+        days_ahead = days_ahead or settings.REMINDER_HORIZON_DAYS
+        chunk_size = chunk_size or settings.REMINDER_SWEEP_CHUNK_SIZE
+        horizon = datetime.combine(now.date() + timedelta(days=days_ahead), datetime.min.time())
+
+        summary = {
+            "schedules_scanned": 0,
+            "schedules_up_to_date": ReminderHorizonSweeper._count_up_to_date(db, horizon),
+            "chunks": 0,
+            "generated_count": 0,
+            "failed_schedules": 0,
+            "errors": [],
+        }
+
+        last_id = 0
+        while True:
+            chunk = ReminderHorizonSweeper._next_chunk(db, last_id, horizon, chunk_size)
+            if not chunk:
+                break
+
+            generated, filled = ReminderHorizonSweeper._sweep_chunk(db, chunk, now, horizon, summary)
+            if filled:
+                db.query(ReminderSchedule).filter(
+                    ReminderSchedule.id.in_(filled)
+                ).update({"generated_until": horizon}, synchronize_session=False)
+            db.commit()
+
+            summary["schedules_scanned"] += len(chunk)
+            summary["generated_count"] += generated
+            summary["chunks"] += 1
+            last_id = chunk[-1].id
+
+        elapsed = time.monotonic() - started
+        summary["elapsed_seconds"] = round(elapsed, 3)
+        summary["schedules_per_second"] = round(summary["schedules_scanned"] / elapsed, 1) if elapsed > 0 else 0
+        summary["reminders_per_second"] = round(summary["generated_count"] / elapsed, 1) if elapsed > 0 else 0
+        return summary
+
+    # ==================== INTERNAL HELPERS ====================
+
+    @staticmethod
+    def _active_schedules(db: Session):
+        """Active schedules of active medications, with what reminder rows need"""
+        return db.query(
+            ReminderSchedule.id,
+            ReminderSchedule.patient_medication_id,
+            ReminderSchedule.patient_id,
+            ReminderSchedule.reminder_times,
+            ReminderSchedule.advance_minutes,
+            ReminderSchedule.channel_whatsapp,
+            ReminderSchedule.channel_sms,
+            ReminderSchedule.channel_email,
+            ReminderSchedule.start_date,
+            ReminderSchedule.end_date,
+            ReminderSchedule.generated_until,
+            PatientMedication.dosage,
+            Medication.name.label('medication_name')
+        ).join(
+            PatientMedication, PatientMedication.id == ReminderSchedule.patient_medication_id
+        ).join(
+            Medication, Medication.id == PatientMedication.medication_id
+        ).filter(
+            ReminderSchedule.is_active == True,
+            PatientMedication.status == MedicationStatusEnum.active
+        )
+
+    @staticmethod
+    def _count_up_to_date(db: Session, horizon: datetime) -> int:
+        """Active schedules the run will skip because their horizon is already filled"""
+        return db.query(func.count(ReminderSchedule.id)).join(
+            PatientMedication, PatientMedication.id == ReminderSchedule.patient_medication_id
+        ).filter(
+            ReminderSchedule.is_active == True,
+            PatientMedication.status == MedicationStatusEnum.active,
+            ReminderSchedule.generated_until >= horizon
+        ).scalar() or 0
+
+    @staticmethod
+    def _next_chunk(db: Session, after_id: int, horizon: datetime, chunk_size: int) -> list:
+        """Next page (keyset on id) of active schedules not yet generated up to the horizon"""
+        return ReminderHorizonSweeper._active_schedules(db).filter(
+            ReminderSchedule.id > after_id,
+            or_(ReminderSchedule.generated_until.is_(None), ReminderSchedule.generated_until < horizon)
+        ).order_by(ReminderSchedule.id).limit(chunk_size).all()
+
+    @staticmethod
+    def _sweep_chunk(db: Session, chunk: list, now: datetime, horizon: datetime, summary: Dict) -> tuple:
+        """
+        Insert the missing reminders of one chunk; the caller commits.
+        Returns (reminders inserted, ids of the schedules now filled to the horizon)
+        """
+        last_day = horizon.date() - timedelta(days=1)
+        slots_by_schedule = {}
+        filled = []
+
+        for row in chunk:
+            first_day = max(now.date(), row.start_date.date())
+            if row.generated_until:
+                first_day = max(first_day, row.generated_until.date())
+            schedule_last_day = min(last_day, row.end_date.date()) if row.end_date else last_day
+
+            try:
+                slots_by_schedule[row.id] = reminder_slots(
+                    row.reminder_times, row.advance_minutes, first_day, schedule_last_day, now
+                )
+            except ValueError as e:
+                # Leave the watermark alone so the schedule is retried (and reported) next run
+                summary["failed_schedules"] += 1
+                if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+                    summary["errors"].append(f"Schedule {row.id}: {e}")
+                continue
+            filled.append(row.id)
+
+        all_slots = [slot for slots in slots_by_schedule.values() for slot in slots]
+        if not all_slots:
+            return 0, filled
+
+        # Slots of this chunk that already have a reminder, in one range query
+        existing = {
+            (patient_medication_id, scheduled_time)
+            for patient_medication_id, scheduled_time in db.query(
+                Reminder.patient_medication_id, Reminder.scheduled_time
+            ).filter(
+                Reminder.patient_medication_id.in_([row.patient_medication_id for row in chunk]),
+                Reminder.scheduled_time.between(min(all_slots), max(all_slots))
+            ).all()
+        }
+
+        rows = []
+        for row in chunk:
+            slots = slots_by_schedule.get(row.id)
+            if not slots:
+                continue
+            missing = {
+                reminder_time: dose_time for reminder_time, dose_time in slots.items()
+                if (row.patient_medication_id, reminder_time) not in existing
+            }
+            rows.extend(reminder_rows(row, row.medication_name, row.dosage, missing))
+
+        return len(insert_reminders(db, rows)), filled
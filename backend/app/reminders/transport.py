@@ -0,0 +1,40 @@
+"""
+Reminder transports
+What the dispatcher hands due reminders to; each returns one result per reminder
+"""
+from typing import Iterable, List, NamedTuple, Optional
+
+
+class SendResult(NamedTuple):
+    """Outcome of sending one reminder"""
+    reminder_id: int
+    ok: bool
+    message_sid: Optional[str] = None
+    status: Optional[str] = None  # Provider status (queued, sent, ...)
+    error_code: Optional[str] = None
+    error_message: Optional[str] = None
+
+
+class StubTransport:
+    """
+    Local transport that accepts every reminder without contacting any provider
+    For development and load tests; reminders whose id is in fail_ids are reported failed.
+    """
+
+    def __init__(self, fail_ids: Iterable[int] = ()):
+        self.fail_ids = set(fail_ids)
+        self.sent: List[int] = []
+
+    def send_batch(self, reminders: list) -> List[SendResult]:
+        """Send due reminders, returning their results in the same order"""
+        results = []
+        for reminder in reminders:
+            if reminder.id in self.fail_ids:
+                results.append(SendResult(reminder.id, False, error_code="stub", error_message="Stub failure"))
+                continue
+            self.sent.append(reminder.id)
+            results.append(SendResult(reminder.id, True, message_sid=f"STUB{reminder.id}", status="sent"))
+        return results
+
+    def close(self) -> None:
+        """Nothing to release"""
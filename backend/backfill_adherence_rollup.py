@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Script to backfill the daily adherence rollup from existing medication logs.
+Run once after upgrading an existing database (new writes keep the rollup
+up to date on their own). Safe to re-run: rows are recounted, not added to.
+
+Usage:
+    python backfill_adherence_rollup.py              # every patient
+    python backfill_adherence_rollup.py --patient 7  # a single patient
+"""
+
+import argparse
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.orm import sessionmaker
+from app.database.db import engine, Base
+from app.database.migrations import create_missing_columns, create_missing_indexes
+import app  # noqa: F401  (registers all models)
+from app.adherence.rollup import AdherenceRollup
+from app.cache.versions import DataVersions
+
+
+def backfill_rollup(patient_id=None):
+    """Rebuild rollup rows from medication_logs in one transaction."""
+    Base.metadata.create_all(bind=engine)
+    create_missing_columns(engine)
+    create_missing_indexes(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+
+    try:
+        scope = f"patient {patient_id}" if patient_id else "all patients"
+        print(f"Rebuilding daily adherence rollup for {scope}...")
+
+        rows = AdherenceRollup.rebuild(db, patient_id=patient_id)
+        # Rebuilt counts change what analytics return, so cached responses must revalidate
+        DataVersions.bump(db, "medication_logs", patient_id)
+        db.commit()
+
+        print(f"Backfill completed! Wrote {rows} rollup rows.")
+
+    except Exception as e:
+        print(f"Error during backfill: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the daily adherence rollup table")
+    parser.add_argument("--patient", type=int, default=None, help="Only rebuild rows for this patient id")
+    args = parser.parse_args()
+
+    backfill_rollup(args.patient)
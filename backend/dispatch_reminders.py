@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Script to send due reminders.
+Runs one dispatcher worker: claims pending reminders shortly before they are due and
+sends each at its time. Start as many as needed (on one or several hosts); claims are
+leases, so workers never send the same reminder and a crashed worker's reminders are
+picked up by the others once its leases expire. Stops cleanly on Ctrl+C / SIGTERM.
+
+The http transport sends through the providers configured in settings; point their
+URLs at fake_provider.py to run the whole send path offline.
+
+Usage:
+    python dispatch_reminders.py
+    python dispatch_reminders.py --once --transport stub
+    python dispatch_reminders.py --transport http
+"""
+
+import argparse
+import signal
+import sys
+import os
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.orm import sessionmaker
+from app.database.db import engine, Base
+from app.database.migrations import create_missing_columns, create_missing_indexes
+import app  # noqa: F401  (registers all models)
+from app.reminders.dispatcher import ReminderDispatcher
+from app.reminders.http_transport import AsyncNotificationTransport
+from app.reminders.transport import StubTransport
+
+TRANSPORTS = {
+    "stub": lambda session_factory: StubTransport(),
+    "http": lambda session_factory: AsyncNotificationTransport(session_factory),
+}
+
+
+def dispatch_reminders(transport_name="stub", once=False, worker_id=None, batch_size=None):
+    """Run a dispatcher worker until stopped (or, with once, until nothing is due) and print a summary."""
+    Base.metadata.create_all(bind=engine)
+    create_missing_columns(engine)
+    create_missing_indexes(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    transport = TRANSPORTS[transport_name](SessionLocal)
+    dispatcher = ReminderDispatcher(SessionLocal, transport, worker_id=worker_id, batch_size=batch_size)
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+
+    print(f"Dispatcher {dispatcher.worker_id} started with the {transport_name} transport.")
+    started = time.monotonic()
+    try:
+        stats = dispatcher.run(stop, until_idle=once)
+    finally:
+        transport.close()
+    elapsed = time.monotonic() - started
+
+    rate = stats["sent"] / elapsed if elapsed > 0 else 0
+    print(
+        f"Sent {stats['sent']} reminders ({stats['failed']} failed, {stats['retried']} of them rescheduled) in {stats['batches']} batches "
+        f"over {elapsed:.1f}s ({rate:.0f} reminders/s)."
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send due reminders")
+    parser.add_argument("--transport", choices=sorted(TRANSPORTS), default="stub", help="Delivery transport")
+    parser.add_argument("--once", action="store_true", help="Exit once nothing is due")
+    parser.add_argument("--worker-id", default=None, help="Lease owner name (default host:pid)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Reminders per claim and per send")
+    args = parser.parse_args()
+
+    dispatch_reminders(args.transport, args.once, args.worker_id, args.batch_size)
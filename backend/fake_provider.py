@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Script to run a local fake notification provider.
+Serves stand-ins for the Twilio Messages API, the email API and the push API with
+simulated latency, failures, throttling and Twilio status callbacks. Point the provider
+URLs at it to load-test the send path offline, e.g.:
+
+    python fake_provider.py --port 8099 --failure-rate 0.02
+    TWILIO_API_URL=http://127.0.0.1:8099 EMAIL_API_URL=http://127.0.0.1:8099 \\
+    PUSH_API_URL=http://127.0.0.1:8099 TWILIO_ACCOUNT_SID=ACfake \\
+    TWILIO_STATUS_CALLBACK_URL=http://127.0.0.1:8000/reminders/webhooks/twilio/status \\
+    python dispatch_reminders.py --transport http
+
+Counters are served at GET /stats.
+"""
+
+import argparse
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import uvicorn
+from app.reminders.fake_provider import create_fake_provider
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local fake notification provider")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--min-latency", type=float, default=0.02, help="Seconds")
+    parser.add_argument("--max-latency", type=float, default=0.08, help="Seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of requests answered 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests answered 429")
+    parser.add_argument("--undelivered-rate", type=float, default=0.0, help="Share of messages reported undelivered")
+    parser.add_argument("--callback-delay", type=float, default=0.1, help="Seconds between status callbacks")
+    parser.add_argument("--auth-token", default=os.environ.get("TWILIO_AUTH_TOKEN", ""), help="Signs status callbacks")
+    args = parser.parse_args()
+
+    app = create_fake_provider(
+        latency=(args.min_latency, args.max_latency),
+        failure_rate=args.failure_rate,
+        throttle_rate=args.throttle_rate,
+        undelivered_rate=args.undelivered_rate,
+        callback_delay=args.callback_delay,
+        auth_token=args.auth_token
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
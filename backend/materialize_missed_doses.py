@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Script to record missed doses.
+Expands every active patient medication into its expected dose slots and writes a
+`missed` log for each slot that has passed the grace window without a log.
+Meant to run periodically (e.g. hourly from cron). Reruns are idempotent and an
+interrupted run resumes from its checkpoint.
+
+Usage:
+    python materialize_missed_doses.py
+    python materialize_missed_doses.py --chunk-size 500
+"""
+
+import argparse
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.orm import sessionmaker
+from app.database.db import engine, Base
+from app.database.migrations import create_missing_columns, create_missing_indexes
+import app  # noqa: F401  (registers all models)
+from app.adherence.missed_doses import MissedDoseMaterializer
+
+
+def materialize_missed_doses(chunk_size=None):
+    """Run the missed-dose materializer once and print a summary."""
+    Base.metadata.create_all(bind=engine)
+    create_missing_columns(engine)
+    create_missing_indexes(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+
+    try:
+        started = time.monotonic()
+        summary = MissedDoseMaterializer.run(db, chunk_size=chunk_size)
+        elapsed = time.monotonic() - started
+
+        if summary["resumed"]:
+            print("Resumed an interrupted run from its checkpoint.")
+        print(
+            f"Scanned {summary['medications_scanned']} medications in {summary['chunks']} chunks, "
+            f"recorded {summary['missed_logged']} missed doses in {elapsed:.1f}s."
+        )
+
+    except Exception as e:
+        db.rollback()
+        print(f"Error while materializing missed doses: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record missed doses for every active patient medication")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Patient medications per transaction")
+    args = parser.parse_args()
+
+    materialize_missed_doses(args.chunk_size)
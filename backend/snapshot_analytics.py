@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Script to take analytics snapshots.
+Precomputes the clinic-wide analytics served by the /analytics endpoints (adherence
+overview and trends, patient status and demographics, medication usage) and stores
+them as of a date. Meant to run nightly (e.g. from cron); rerunning for the same date
+replaces that date's snapshots.
+
+Usage:
+    python snapshot_analytics.py
+    python snapshot_analytics.py --as-of 2024-06-30
+"""
+
+import argparse
+import sys
+import os
+import time
+from datetime import date
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.orm import sessionmaker
+from app.database.db import engine, Base
+from app.database.migrations import create_missing_columns, create_missing_indexes
+import app  # noqa: F401  (registers all models)
+from app.analytics.services.snapshots import AnalyticsSnapshotService
+
+
+def snapshot_analytics(as_of=None):
+    """Take every analytics snapshot as of a date and print a summary."""
+    Base.metadata.create_all(bind=engine)
+    create_missing_columns(engine)
+    create_missing_indexes(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+
+    try:
+        started = time.monotonic()
+        kinds = AnalyticsSnapshotService.take_snapshots(db, as_of)
+        elapsed = time.monotonic() - started
+
+        print(f"Stored {len(kinds)} analytics snapshots as of {as_of or date.today()} in {elapsed:.1f}s:")
+        for kind in kinds:
+            print(f"   - {kind}")
+
+    except Exception as e:
+        db.rollback()
+        print(f"Error while taking analytics snapshots: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute analytics snapshots")
+    parser.add_argument("--as-of", type=date.fromisoformat, default=None, help="Snapshot date (YYYY-MM-DD), default today")
+    args = parser.parse_args()
+
+    snapshot_analytics(args.as_of)
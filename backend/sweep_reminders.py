@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Script to keep reminders generated ahead.
+Extends every active reminder schedule's reminders to a rolling horizon of N days,
+skipping schedules already generated that far. Meant to run periodically (e.g. hourly
+from cron). Reruns are idempotent and an interrupted run continues where it stopped.
+
+Usage:
+    python sweep_reminders.py
+    python sweep_reminders.py --days-ahead 30 --chunk-size 2000
+"""
+
+import argparse
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.orm import sessionmaker
+from app.database.db import engine, Base
+from app.database.migrations import create_missing_columns, create_missing_indexes
+import app  # noqa: F401  (registers all models)
+from app.reminders.sweeper import ReminderHorizonSweeper
+
+
+def sweep_reminders(days_ahead=None, chunk_size=None):
+    """Run the reminder horizon sweeper once and print a summary."""
+    Base.metadata.create_all(bind=engine)
+    create_missing_columns(engine)
+    create_missing_indexes(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+
+    try:
+        summary = ReminderHorizonSweeper.run(db, days_ahead=days_ahead, chunk_size=chunk_size)
+
+        print(
+            f"Swept {summary['schedules_scanned']} schedules in {summary['chunks']} chunks "
+            f"({summary['schedules_up_to_date']} already up to date), "
+            f"generated {summary['generated_count']} reminders in {summary['elapsed_seconds']:.1f}s "
+            f"({summary['schedules_per_second']:.0f} schedules/s, {summary['reminders_per_second']:.0f} reminders/s)."
+        )
+        if summary["failed_schedules"]:
+            print(f"⚠️  {summary['failed_schedules']} schedules could not be expanded:")
+            for error in summary["errors"]:
+                print(f"   {error}")
+
+    except Exception as e:
+        db.rollback()
+        print(f"Error while sweeping reminders: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate reminders ahead for every active reminder schedule")
+    parser.add_argument("--days-ahead", type=int, default=None, help="Horizon in days")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Reminder schedules per transaction")
+    args = parser.parse_args()
+
+    sweep_reminders(args.days_ahead, args.chunk_size)
@@ -47,7 +47,9 @@ client = TestClient(app)
 @pytest.fixture(autouse=True)
 def setup_database():
     """Create tables before each test and drop them after."""
+    from app.adherence.services import dashboard_cache
     Base.metadata.create_all(bind=engine)
+    dashboard_cache.clear()
     yield
     Base.metadata.drop_all(bind=engine)
 
@@ -649,3 +651,1007 @@ def test_on_time_score_calculation():
     stats = response.json()
     assert stats["total_taken"] == 5
     assert stats["on_time_score"] == 60.0  # 3 out of 5 on time
+
+
+# ==================== INCREMENTAL STATS ENGINE TESTS ====================
+
+def test_incremental_stats_match_full_recount():
+    """Stats maintained on create/update/delete match a full recount"""
+    from app.adherence.stats_engine import AdherenceStatsEngine
+
+    admin_token = get_admin_token()
+    patient_token = get_patient_token()
+    patient_id, assignment_id = setup_patient_medication(admin_token, patient_token)
+
+    today = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    log_ids = []
+
+    for i in range(10):
+        log_time = today - timedelta(days=i * 4)
+        status = "taken" if i % 3 else "missed"
+        response = client.post(
+            "/adherence/logs",
+            json={
+                "patient_medication_id": assignment_id,
+                "scheduled_time": log_time.isoformat(),
+                "status": status,
+                "actual_time": (log_time + timedelta(minutes=45 * (i % 2))).isoformat() if status == "taken" else None
+            },
+            headers={"Authorization": f"Bearer {patient_token}"}
+        )
+        log_ids.append(response.json()["id"])
+
+    # missed -> taken transition
+    client.put(
+        f"/adherence/logs/{log_ids[0]}",
+        json={"status": "taken", "actual_time": today.isoformat()},
+        headers={"Authorization": f"Bearer {patient_token}"}
+    )
+    client.delete(f"/adherence/logs/{log_ids[1]}", headers={"Authorization": f"Bearer {patient_token}"})
+
+    db = TestingSessionLocal()
+    try:
+        assert AdherenceStatsEngine.verify(db, patient_id, assignment_id) == []
+        assert AdherenceStatsEngine.verify(db, patient_id, None) == []
+    finally:
+        db.close()
+
+    response = client.get("/adherence/stats?period=overall", headers={"Authorization": f"Bearer {patient_token}"})
+    stats = response.json()
+    assert stats["total_scheduled"] == 9
+    assert stats["total_missed"] == 3
+
+
+def test_incremental_stats_roll_over_day_boundary():
+    """Windows roll forward when a write lands on a later day"""
+    from app.adherence.stats_engine import AdherenceStatsEngine
+
+    admin_token = get_admin_token()
+    patient_token = get_patient_token()
+    patient_id, assignment_id = setup_patient_medication(admin_token, patient_token)
+
+    today = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    for i in range(8):
+        log_time = today - timedelta(days=i)
+        client.post(
+            "/adherence/logs",
+            json={
+                "patient_medication_id": assignment_id,
+                "scheduled_time": log_time.isoformat(),
+                "status": "taken",
+                "actual_time": log_time.isoformat()
+            },
+            headers={"Authorization": f"Bearer {patient_token}"}
+        )
+
+    # Two days later a new dose arrives: the oldest days leave the weekly window
+    later = date.today() + timedelta(days=2)
+    db = TestingSessionLocal()
+    try:
+        log = MedicationLog(
+            patient_medication_id=assignment_id,
+            patient_id=patient_id,
+            scheduled_time=datetime.combine(later, datetime.min.time()),
+            scheduled_date=later,
+            status=MedicationLogStatusEnum.missed
+        )
+        db.add(log)
+        db.flush()
+        AdherenceStatsEngine.apply_change(
+            db, patient_id, assignment_id, before=None,
+            after=AdherenceStatsEngine.snapshot(log), log_id=log.id, today=later
+        )
+        db.commit()
+
+        weekly = db.query(AdherenceStats).filter(
+            AdherenceStats.patient_id == patient_id,
+            AdherenceStats.patient_medication_id == None,
+            AdherenceStats.period_type == "weekly"
+        ).first()
+        assert weekly.period_end == later
+        assert weekly.total_scheduled == 7  # 6 taken still in window + today's missed dose
+        assert weekly.total_missed == 1
+        assert AdherenceStatsEngine.verify(db, patient_id, assignment_id, today=later) == []
+    finally:
+        db.close()
+
+
+def test_stats_deltas_apply_to_the_latest_committed_counters():
+    """A write adds its delta to the counters as committed, not to a copy read earlier, and on-time is counted exactly"""
+    from app.adherence.stats_engine import AdherenceStatsEngine
+
+    admin_token = get_admin_token()
+    patient_token = get_patient_token()
+    patient_id, assignment_id = setup_patient_medication(admin_token, patient_token)
+    headers = {"Authorization": f"Bearer {patient_token}"}
+
+    today = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+
+    def post_taken(days_ago, minutes_late):
+        scheduled = today - timedelta(days=days_ago)
+        client.post(
+            "/adherence/logs",
+            json={"patient_medication_id": assignment_id, "scheduled_time": scheduled.isoformat(),
+                  "status": "taken", "actual_time": (scheduled + timedelta(minutes=minutes_late)).isoformat()},
+            headers=headers
+        )
+
+    post_taken(1, 0)
+    db = TestingSessionLocal()
+    try:
+        # This session holds the stats rows while another request commits a log
+        held = db.query(AdherenceStats).filter(AdherenceStats.patient_id == patient_id).all()
+        post_taken(2, 45)
+
+        scheduled = today - timedelta(days=3)
+        log = MedicationLog(
+            patient_medication_id=assignment_id, patient_id=patient_id, scheduled_time=scheduled,
+            scheduled_date=scheduled.date(), status=MedicationLogStatusEnum.taken, actual_time=scheduled, on_time=True
+        )
+        db.add(log)
+        db.flush()
+        AdherenceStatsEngine.apply_change(db, patient_id, assignment_id, None, AdherenceStatsEngine.snapshot(log), log_id=log.id)
+        db.commit()
+
+        overall = db.query(AdherenceStats).filter(
+            AdherenceStats.patient_id == patient_id,
+            AdherenceStats.patient_medication_id == None,
+            AdherenceStats.period_type == "overall"
+        ).one()
+        assert overall in held
+        assert (overall.total_taken, overall.on_time_taken) == (3, 2)
+        assert AdherenceStatsEngine.verify(db, patient_id, assignment_id) == []
+
+        # Rows written before the on_time_taken column fall back to the score once
+        db.query(AdherenceStats).filter(AdherenceStats.patient_id == patient_id).update({"on_time_taken": None})
+        db.commit()
+    finally:
+        db.close()
+
+    post_taken(4, 60)
+    db = TestingSessionLocal()
+    try:
+        assert AdherenceStatsEngine.verify(db, patient_id, assignment_id) == []
+        assert AdherenceStatsEngine.verify(db, patient_id) == []
+    finally:
+        db.close()
+
+def test_streaks_computed_in_sql_with_gaps():
+    """A day without logs breaks a streak; longest run is found across history"""
+    from app.adherence.services import AdherenceService
+
+    admin_token = get_admin_token()
+    patient_token = get_patient_token()
+    patient_id, assignment_id = setup_patient_medication(admin_token, patient_token)
+
+    today = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    # Run of 2 ending today, gap on day 2, run of 4 on days 3-6, missed on day 7
+    for i in [0, 1, 3, 4, 5, 6, 7]:
+        log_time = today - timedelta(days=i)
+        status = "missed" if i == 7 else "taken"
+        client.post(
+            "/adherence/logs",
+            json={
+                "patient_medication_id": assignment_id,
+                "scheduled_time": log_time.isoformat(),
+                "status": status,
+                "actual_time": log_time.isoformat() if status == "taken" else None
+            },
+            headers={"Authorization": f"Bearer {patient_token}"}
+        )
+
+    db = TestingSessionLocal()
+    try:
+        assert AdherenceService._calculate_streaks(db, patient_id, assignment_id) == (2, 4)
+        assert AdherenceService._calculate_streaks(db, patient_id) == (2, 4)
+    finally:
+        db.close()
+
+    stats = client.get("/adherence/stats?period=overall", headers={"Authorization": f"Bearer {patient_token}"}).json()
+    assert stats["current_streak"] == 2
+    assert stats["longest_streak"] == 4
+
+
+def test_streak_state_extends_and_breaks():
+    """Persisted streak state follows appended days and recovers from a broken run"""
+    from app.adherence.models import AdherenceStreakState
+
+    admin_token = get_admin_token()
+    patient_token = get_patient_token()
+    patient_id, assignment_id = setup_patient_medication(admin_token, patient_token)
+
+    today = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    for i in [3, 2, 1, 0]:
+        log_time = today - timedelta(days=i)
+        client.post(
+            "/adherence/logs",
+            json={
+                "patient_medication_id": assignment_id,
+                "scheduled_time": log_time.isoformat(),
+                "status": "taken",
+                "actual_time": log_time.isoformat()
+            },
+            headers={"Authorization": f"Bearer {patient_token}"}
+        )
+
+    db = TestingSessionLocal()
+    try:
+        state = db.query(AdherenceStreakState).filter(
+            AdherenceStreakState.patient_id == patient_id,
+            AdherenceStreakState.patient_medication_id == assignment_id
+        ).first()
+        assert state.run_start == date.today() - timedelta(days=3)
+        assert state.run_end == date.today()
+        assert state.longest_streak == 4
+    finally:
+        db.close()
+
+    # A second, missed dose today breaks the current run
+    client.post(
+        "/adherence/logs",
+        json={
+            "patient_medication_id": assignment_id,
+            "scheduled_time": (today + timedelta(hours=12)).isoformat(),
+            "status": "missed"
+        },
+        headers={"Authorization": f"Bearer {patient_token}"}
+    )
+    stats = client.get("/adherence/stats?period=overall", headers={"Authorization": f"Bearer {patient_token}"}).json()
+    assert stats["current_streak"] == 0
+    assert stats["longest_streak"] == 3  # Today no longer counts as a perfect day
+
+
+def test_chart_data_constant_queries_and_medication_filter():
+    """Chart data costs the same number of queries for any window"""
+    from sqlalchemy import event
+    from app.adherence.services import AdherenceService
+
+    admin_token = get_admin_token()
+    patient_token = get_patient_token()
+    patient_id, assignment_id = setup_patient_medication(admin_token, patient_token)
+
+    today = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    for i in range(3):
+        client.post(
+            "/adherence/logs",
+            json={
+                "patient_medication_id": assignment_id,
+                "scheduled_time": (today - timedelta(days=i)).isoformat(),
+                "status": "taken",
+                "actual_time": (today - timedelta(days=i)).isoformat()
+            },
+            headers={"Authorization": f"Bearer {patient_token}"}
+        )
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db = TestingSessionLocal()
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        short_window = AdherenceService.get_chart_data(db, patient_id, 7)
+        short_count = len(statements)
+        statements.clear()
+        long_window = AdherenceService.get_chart_data(db, patient_id, 90)
+        assert len(statements) == short_count == 1
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+        db.close()
+
+    assert len(short_window) == 8
+    assert len(long_window) == 91
+    assert [day.taken for day in long_window[-3:]] == [1, 1, 1]
+
+    response = client.get(
+        f"/adherence/chart?days=7&patient_medication_id={assignment_id + 1}",
+        headers={"Authorization": f"Bearer {patient_token}"}
+    )
+    assert response.status_code == 200
+    assert sum(day["scheduled"] for day in response.json()) == 0
+
+
+# ==================== BULK LOGGING TESTS ====================
+
+def test_bulk_log_medications():
+    """Bulk logging reports created, duplicate and error entries"""
+    from app.adherence.stats_engine import AdherenceStatsEngine
+
+    admin_token = get_admin_token()
+    patient_token = get_patient_token()
+    patient_id, assignment_id = setup_patient_medication(admin_token, patient_token)
+
+    today = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    already_logged = today - timedelta(days=1)
+    client.post(
+        "/adherence/logs",
+        json={
+            "patient_medication_id": assignment_id,
+            "scheduled_time": already_logged.isoformat(),
+            "status": "taken",
+            "actual_time": already_logged.isoformat()
+        },
+        headers={"Authorization": f"Bearer {patient_token}"}
+    )
+
+    logs = [
+        {
+            "patient_medication_id": assignment_id,
+            "scheduled_time": (today - timedelta(days=i)).isoformat(),
+            "status": "taken" if i != 3 else "missed",
+            "actual_time": (today - timedelta(days=i)).isoformat() if i != 3 else None
+        }
+        for i in [0, 1, 2, 3]
+    ]
+    logs.append(dict(logs[0]))  # Repeated within the batch
+    logs.append({"patient_medication_id": assignment_id + 100, "scheduled_time": today.isoformat(), "status": "missed"})
+
+    response = client.post(
+        "/adherence/logs/bulk",
+        json={"logs": logs},
+        headers={"Authorization": f"Bearer {patient_token}"}
+    )
+
+    assert response.status_code == 201
+    data = response.json()
+    assert data["created_count"] == 3
+    assert data["duplicate_count"] == 2
+    assert data["failed_count"] == 1
+    assert [result["status"] for result in data["results"]] == [
+        "created", "duplicate", "created", "created", "duplicate", "error"
+    ]
+
+    db = TestingSessionLocal()
+    try:
+        assert AdherenceStatsEngine.verify(db, patient_id, assignment_id) == []
+        assert AdherenceStatsEngine.verify(db, patient_id, None) == []
+    finally:
+        db.close()
+
+    stats = client.get("/adherence/stats?period=weekly", headers={"Authorization": f"Bearer {patient_token}"}).json()
+    assert stats["total_scheduled"] == 4
+    assert stats["total_missed"] == 1
+    assert stats["current_streak"] == 3
+
+
+def test_bulk_replay_with_aware_timestamps_reports_duplicates():
+    """A synced batch replayed with "Z" timestamps is reported as duplicates instead of failing"""
+    admin_token = get_admin_token()
+    patient_token = get_patient_token()
+    patient_id, assignment_id = setup_patient_medication(admin_token, patient_token)
+
+    dose = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    logs = [{
+        "patient_medication_id": assignment_id,
+        "scheduled_time": dose.isoformat() + "Z",
+        "status": "taken",
+        "actual_time": dose.isoformat() + "Z"
+    }]
+
+    first = client.post("/adherence/logs/bulk", json={"logs": logs}, headers={"Authorization": f"Bearer {patient_token}"})
+    assert first.status_code == 201
+    assert first.json()["created_count"] == 1
+
+    replay = client.post("/adherence/logs/bulk", json={"logs": logs}, headers={"Authorization": f"Bearer {patient_token}"})
+    assert replay.status_code == 201
+    assert replay.json()["duplicate_count"] == 1
+    assert [result["status"] for result in replay.json()["results"]] == ["duplicate"]
+
+# ==================== DAILY ROLLUP TESTS ====================
+
+def test_daily_rollup_tracks_writes_and_matches_backfill():
+    """Rollup rows follow create/update/delete and equal a rebuild from the logs"""
+    from app.adherence.models import DailyAdherenceRollup
+    from app.adherence.rollup import AdherenceRollup
+
+    admin_token = get_admin_token()
+    patient_token = get_patient_token()
+    patient_id, assignment_id = setup_patient_medication(admin_token, patient_token)
+
+    today = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    log_ids = []
+    for i in range(4):
+        for hour_offset in (0, 12):
+            log_time = today - timedelta(days=i) + timedelta(hours=hour_offset)
+            response = client.post(
+                "/adherence/logs",
+                json={
+                    "patient_medication_id": assignment_id,
+                    "scheduled_time": log_time.isoformat(),
+                    "status": "taken",
+                    "actual_time": (log_time + timedelta(minutes=60 * hour_offset // 12)).isoformat()
+                },
+                headers={"Authorization": f"Bearer {patient_token}"}
+            )
+            log_ids.append(response.json()["id"])
+
+    headers = {"Authorization": f"Bearer {patient_token}"}
+    client.put(f"/adherence/logs/{log_ids[0]}", json={"status": "skipped", "skipped_reason": "nausea"}, headers=headers)
+    # Empty out the oldest day completely
+    client.delete(f"/adherence/logs/{log_ids[6]}", headers=headers)
+    client.delete(f"/adherence/logs/{log_ids[7]}", headers=headers)
+
+    def rollup_rows(db):
+        return sorted(
+            (row.date, row.taken_count, row.skipped_count, row.missed_count, row.on_time_count)
+            for row in db.query(DailyAdherenceRollup).filter(DailyAdherenceRollup.patient_id == patient_id).all()
+        )
+
+    db = TestingSessionLocal()
+    try:
+        maintained = rollup_rows(db)
+        assert len(maintained) == 3
+        assert maintained[-1] == (today.date(), 1, 1, 0, 0)
+        assert maintained[0] == ((today - timedelta(days=2)).date(), 2, 0, 0, 1)
+
+        assert AdherenceRollup.rebuild(db) == 3
+        db.commit()
+        assert rollup_rows(db) == maintained
+    finally:
+        db.close()
+
+    chart = client.get("/adherence/chart?days=7", headers=headers).json()
+    assert [(day["taken"], day["scheduled"]) for day in chart[-4:]] == [(0, 0), (2, 2), (2, 2), (1, 2)]
+
+
+# ==================== MISSED DOSE MATERIALIZER TESTS ====================
+
+def test_missed_dose_materializer_is_idempotent():
+    """Unlogged past slots become missed logs once; logged slots are left alone"""
+    from app.adherence.missed_doses import MissedDoseMaterializer
+    from app.adherence.stats_engine import AdherenceStatsEngine
+
+    admin_token = get_admin_token()
+    patient_token = get_patient_token()
+    patient_id, assignment_id = setup_patient_medication(admin_token, patient_token)
+
+    today = date.today()
+    db = TestingSessionLocal()
+    try:
+        db.query(PatientMedication).filter(PatientMedication.id == assignment_id).update(
+            {PatientMedication.start_date: today - timedelta(days=3)}
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    # Logged a few minutes off the 08:00 slot: still counts as that slot
+    logged_time = datetime.combine(today - timedelta(days=1), datetime.min.time()).replace(hour=8, minute=10)
+    client.post(
+        "/adherence/logs",
+        json={
+            "patient_medication_id": assignment_id,
+            "scheduled_time": logged_time.isoformat(),
+            "status": "taken",
+            "actual_time": logged_time.isoformat()
+        },
+        headers={"Authorization": f"Bearer {patient_token}"}
+    )
+
+    now = datetime.combine(today, datetime.min.time()).replace(hour=23)
+    db = TestingSessionLocal()
+    try:
+        summary = MissedDoseMaterializer.run(db, now=now)
+        assert summary["missed_logged"] == 3  # 4 daily slots, one logged
+
+        missed = db.query(MedicationLog).filter(
+            MedicationLog.patient_id == patient_id,
+            MedicationLog.status == MedicationLogStatusEnum.missed
+        ).all()
+        assert sorted(log.scheduled_date for log in missed) == [
+            today - timedelta(days=3), today - timedelta(days=2), today
+        ]
+        assert all(log.logged_via == "auto" for log in missed)
+        assert AdherenceStatsEngine.verify(db, patient_id, assignment_id) == []
+
+        # Rerunning, even over the same window, adds nothing
+        assert MissedDoseMaterializer.run(db, now=now)["missed_logged"] == 0
+        assert MissedDoseMaterializer.run(db, now=now + timedelta(hours=1))["missed_logged"] == 0
+    finally:
+        db.close()
+
+
+def test_missed_dose_materializer_resumes_from_checkpoint():
+    """An interrupted run continues after the last committed chunk"""
+    from app.adherence.missed_doses import MissedDoseMaterializer
+    from app.adherence.models import MaterializerCheckpoint
+
+    admin_token = get_admin_token()
+    patient_token = get_patient_token()
+    patient_id, assignment_id = setup_patient_medication(admin_token, patient_token)
+
+    now = datetime.combine(date.today(), datetime.min.time()).replace(hour=23)
+    db = TestingSessionLocal()
+    try:
+        # Pretend a run crashed after committing the chunk that contained this medication
+        db.add(MaterializerCheckpoint(
+            job_name="missed_doses",
+            run_cutoff=now - timedelta(hours=2),
+            last_patient_medication_id=assignment_id
+        ))
+        db.commit()
+
+        summary = MissedDoseMaterializer.run(db, now=now, chunk_size=1)
+        assert summary["resumed"] == 1
+        assert summary["medications_scanned"] == 0
+        assert db.query(MedicationLog).count() == 0
+
+        checkpoint = db.query(MaterializerCheckpoint).one()
+        assert checkpoint.run_cutoff is None
+        assert checkpoint.materialized_through == now - timedelta(hours=2)
+
+        # The next run only covers time after the completed run
+        assert MissedDoseMaterializer.run(db, now=now + timedelta(hours=1))["missed_logged"] == 0
+    finally:
+        db.close()
+
+
+def test_missed_dose_materializer_matches_each_log_to_one_close_slot(monkeypatch):
+    """A log covers at most one of two close slots, and only rows actually inserted are counted"""
+    from app.adherence.missed_doses import MissedDoseMaterializer, match_windows, dose_times
+    from app.adherence.stats_engine import AdherenceStatsEngine
+    from app.reminders.models import ReminderSchedule
+
+    # An hour apart: each slot only claims logs within 30 minutes
+    windows = match_windows(dose_times(2, ["08:00", "09:00"]))
+    assert set(windows.values()) == {timedelta(minutes=30)}
+    assert set(match_windows(dose_times(2)).values()) == {timedelta(minutes=90)}
+
+    admin_token = get_admin_token()
+    patient_token = get_patient_token()
+    patient_id, assignment_id = setup_patient_medication(admin_token, patient_token)
+
+    today = date.today()
+    yesterday = datetime.combine(today - timedelta(days=1), datetime.min.time())
+    db = TestingSessionLocal()
+    try:
+        db.query(PatientMedication).filter(PatientMedication.id == assignment_id).update(
+            {PatientMedication.start_date: today - timedelta(days=1)}
+        )
+        db.add(ReminderSchedule(
+            patient_medication_id=assignment_id, patient_id=patient_id, reminder_times=["08:00", "09:00"],
+            start_date=yesterday
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+    # One dose taken at 08:20: the 08:00 slot, not also the 09:00 one
+    client.post(
+        "/adherence/logs",
+        json={
+            "patient_medication_id": assignment_id,
+            "scheduled_time": yesterday.replace(hour=8, minute=20).isoformat(),
+            "status": "taken",
+            "actual_time": yesterday.replace(hour=8, minute=20).isoformat()
+        },
+        headers={"Authorization": f"Bearer {patient_token}"}
+    )
+    # Today's 08:00 dose is logged at the slot time, but the materializer does not see it
+    # (as if the patient logged it while the chunk ran): the unique index skips the insert
+    client.post(
+        "/adherence/logs",
+        json={
+            "patient_medication_id": assignment_id,
+            "scheduled_time": datetime.combine(today, datetime.min.time()).replace(hour=8).isoformat(),
+            "status": "taken"
+        },
+        headers={"Authorization": f"Bearer {patient_token}"}
+    )
+    real_has_log_near = MissedDoseMaterializer._has_log_near
+    monkeypatch.setattr(
+        MissedDoseMaterializer, "_has_log_near",
+        staticmethod(lambda times, slot, window: slot.date() != today and real_has_log_near(times, slot, window))
+    )
+
+    now = datetime.combine(today, datetime.min.time()).replace(hour=23)
+    db = TestingSessionLocal()
+    try:
+        summary = MissedDoseMaterializer.run(db, now=now)
+        missed = db.query(MedicationLog).filter(
+            MedicationLog.patient_id == patient_id,
+            MedicationLog.status == MedicationLogStatusEnum.missed
+        ).order_by(MedicationLog.scheduled_time).all()
+        assert [log.scheduled_time for log in missed] == [
+            yesterday.replace(hour=9), datetime.combine(today, datetime.min.time()).replace(hour=9)
+        ]
+        # Today's 08:00 row was attempted but not inserted
+        assert summary["missed_logged"] == 2
+        # Recounted after the batch, the stats agree with a full recount
+        assert AdherenceStatsEngine.verify(db, patient_id, assignment_id) == []
+        assert AdherenceStatsEngine.verify(db, patient_id) == []
+    finally:
+        db.close()
+
+
+
+@pytest.mark.parametrize("stats_written", ["yesterday", "never"])
+def test_missed_dose_materializer_leaves_stats_consistent(stats_written):
+    """Missed doses are counted once, whether the stats rows are stale or missing"""
+    from app.adherence.missed_doses import MissedDoseMaterializer
+    from app.adherence.models import AdherenceStreakState
+    from app.adherence.stats_engine import AdherenceStatsEngine
+
+    admin_token = get_admin_token()
+    patient_token = get_patient_token()
+    patient_id, assignment_id = setup_patient_medication(admin_token, patient_token)
+
+    today = date.today()
+    db = TestingSessionLocal()
+    try:
+        db.query(PatientMedication).filter(PatientMedication.id == assignment_id).update(
+            {PatientMedication.start_date: today - timedelta(days=5)}
+        )
+        if stats_written == "yesterday":
+            AdherenceStatsEngine.refresh(db, patient_id, [assignment_id], [], today=today - timedelta(days=1))
+        db.commit()
+
+        now = datetime.combine(today, datetime.min.time()).replace(hour=23)
+        assert MissedDoseMaterializer.run(db, now=now)["missed_logged"] == 6
+        db.expire_all()
+
+        assert AdherenceStatsEngine.verify(db, patient_id, assignment_id) == []
+        assert AdherenceStatsEngine.verify(db, patient_id) == []
+        assert db.query(AdherenceStats).filter(AdherenceStats.patient_id == patient_id).count() == 8
+        assert db.query(AdherenceStreakState).filter(AdherenceStreakState.patient_id == patient_id).count() == 2
+    finally:
+        db.close()
+
+# ==================== READ-ONLY STATS TESTS ====================
+
+def test_get_adherence_stats_never_writes():
+    """Stale or missing stats are served/computed without writing; refresh happens in the background"""
+    from fastapi import BackgroundTasks
+    from sqlalchemy import event
+    from app.adherence.services import AdherenceService
+
+    admin_token = get_admin_token()
+    patient_token = get_patient_token()
+    patient_id, assignment_id = setup_patient_medication(admin_token, patient_token)
+
+    today = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    for i in range(3):
+        client.post(
+            "/adherence/logs",
+            json={
+                "patient_medication_id": assignment_id,
+                "scheduled_time": (today - timedelta(days=i)).isoformat(),
+                "status": "taken",
+                "actual_time": (today - timedelta(days=i)).isoformat()
+            },
+            headers={"Authorization": f"Bearer {patient_token}"}
+        )
+
+    writes = []
+
+    def record_writes(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE")):
+            writes.append(statement)
+
+    db = TestingSessionLocal()
+    event.listen(engine, "before_cursor_execute", record_writes)
+    try:
+        # Freshly written row: served as is, nothing scheduled
+        tasks = BackgroundTasks()
+        stats = AdherenceService.get_adherence_stats(db, patient_id, "weekly", background_tasks=tasks)
+        assert stats.id is not None
+        assert tasks.tasks == []
+
+        # Stale row: still served, one refresh queued however often it is read
+        db.query(AdherenceStats).update({AdherenceStats.calculated_at: datetime.now() - timedelta(hours=3)})
+        db.commit()
+        writes.clear()
+        AdherenceService.get_adherence_stats(db, patient_id, "weekly", background_tasks=tasks)
+        stats = AdherenceService.get_adherence_stats(db, patient_id, "weekly", background_tasks=tasks)
+        assert stats.total_taken == 3
+        assert len(tasks.tasks) == 1
+
+        # Without background tasks a stale row is recomputed in memory only
+        computed = AdherenceService.get_adherence_stats(db, patient_id, "monthly")
+        assert computed.total_taken == 3
+        assert computed not in db
+        assert writes == []
+    finally:
+        event.remove(engine, "before_cursor_execute", record_writes)
+        db.close()
+
+    # Running the queued refresh stores fresh stats
+    for task in tasks.tasks:
+        task.func(*task.args, **task.kwargs)
+
+    db = TestingSessionLocal()
+    try:
+        stats = db.query(AdherenceStats).filter(
+            AdherenceStats.patient_medication_id == None,
+            AdherenceStats.period_type == "weekly"
+        ).one()
+        assert AdherenceService._is_fresh(stats, stats.period_start, stats.period_end)
+    finally:
+        db.close()
+
+    response = client.get("/adherence/stats?period=weekly", headers={"Authorization": f"Bearer {patient_token}"})
+    assert response.status_code == 200
+    assert response.json()["total_taken"] == 3
+
+
+# ==================== DASHBOARD CACHE TESTS ====================
+
+def test_dashboard_cache_hit_and_invalidation():
+    """Repeated dashboard reads hit the cache; a log write invalidates it"""
+    from sqlalchemy import event
+    from app.adherence.services import dashboard_cache
+
+    admin_token = get_admin_token()
+    patient_token = get_patient_token()
+    patient_id, assignment_id = setup_patient_medication(admin_token, patient_token)
+    headers = {"Authorization": f"Bearer {patient_token}"}
+
+    today = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    client.post(
+        "/adherence/logs",
+        json={"patient_medication_id": assignment_id, "scheduled_time": today.isoformat(),
+              "status": "taken", "actual_time": today.isoformat()},
+        headers=headers
+    )
+
+    queries = []
+
+    def count_queries(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    before = dashboard_cache.stats()
+    first = client.get("/adherence/dashboard", headers=headers).json()
+
+    event.listen(engine, "before_cursor_execute", count_queries)
+    try:
+        second = client.get("/adherence/dashboard", headers=headers).json()
+    finally:
+        event.remove(engine, "before_cursor_execute", count_queries)
+
+    assert second == first
+    assert len(queries) <= 2  # Only the current-user and data-version lookups
+    after = dashboard_cache.stats()
+    assert after["hits"] - before["hits"] == 1
+    assert after["misses"] - before["misses"] == 1
+
+    # A new log drops the cached entry, so the next read sees it
+    yesterday = today - timedelta(days=1)
+    client.post(
+        "/adherence/logs",
+        json={"patient_medication_id": assignment_id, "scheduled_time": yesterday.isoformat(), "status": "missed"},
+        headers=headers
+    )
+    third = client.get("/adherence/dashboard", headers=headers).json()
+    assert third["overall_stats"]["total_missed"] == 1
+    assert len(third["recent_logs"]) == 2
+
+    response = client.get("/adherence/cache/stats", headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 200
+    assert response.json()["backend"] == "memory"
+    assert client.get("/adherence/cache/stats", headers=headers).status_code == 403
+
+
+def test_dashboard_fill_started_before_a_write_is_never_served():
+    """A dashboard computed before a log write, but cached after it, stays under the old version"""
+    from app.adherence.services import AdherenceService, dashboard_cache, dashboard_cache_key, dashboard_version_keys
+    from app.cache.versions import DataVersions
+
+    admin_token = get_admin_token()
+    patient_token = get_patient_token()
+    patient_id, assignment_id = setup_patient_medication(admin_token, patient_token)
+    headers = {"Authorization": f"Bearer {patient_token}"}
+
+    db = TestingSessionLocal()
+    try:
+        old_versions = DataVersions.current(db, dashboard_version_keys(patient_id))
+        stale = AdherenceService.get_dashboard(db, patient_id, versions=old_versions)
+        old_key = dashboard_cache_key(patient_id, old_versions)
+        dashboard_cache.delete(old_key)
+    finally:
+        db.close()
+
+    today = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    client.post(
+        "/adherence/logs",
+        json={"patient_medication_id": assignment_id, "scheduled_time": today.isoformat(), "status": "missed"},
+        headers=headers
+    )
+
+    # The slow reader finishes after the write and caches what it saw
+    dashboard_cache.set(old_key, stale.model_dump_json())
+
+    fresh = client.get("/adherence/dashboard", headers=headers).json()
+    assert fresh["overall_stats"]["total_missed"] == 1
+    assert len(fresh["recent_logs"]) == 1
+
+
+def test_cache_backends(tmp_path):
+    """Memory backend evicts LRU/expired entries; SQLite backend is shared between instances"""
+    from app.cache.backends import MemoryCache, SQLiteCache
+
+    cache = MemoryCache("test", ttl_seconds=60, max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"  # "b" is now least recently used
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+
+    expired = MemoryCache("test", ttl_seconds=0)
+    expired.set("a", "1")
+    assert expired.get("a") is None
+
+    path = str(tmp_path / "cache.db")
+    writer = SQLiteCache("dashboard", ttl_seconds=60, path=path)
+    reader = SQLiteCache("dashboard", ttl_seconds=60, path=path)
+    other_namespace = SQLiteCache("other", ttl_seconds=60, path=path)
+    writer.set("7", '{"x": 1}')
+    assert reader.get("7") == '{"x": 1}'
+    assert other_namespace.get("7") is None
+    reader.delete("7")
+    assert writer.get("7") is None
+    assert writer.stats()["hits"] == 0 and writer.stats()["misses"] == 1
+
+
+# ==================== LOG PAGINATION TESTS ====================
+
+def test_get_medication_logs_keyset_pagination():
+    """Cursor pages cover every log once, in order, even when logs arrive between pages"""
+    admin_token = get_admin_token()
+    patient_token = get_patient_token()
+    patient_id, assignment_id = setup_patient_medication(admin_token, patient_token)
+    headers = {"Authorization": f"Bearer {patient_token}"}
+
+    today = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    for i in range(7):
+        client.post(
+            "/adherence/logs",
+            json={"patient_medication_id": assignment_id,
+                  "scheduled_time": (today - timedelta(days=i)).isoformat(), "status": "missed"},
+            headers=headers
+        )
+
+    first = client.get("/adherence/logs?cursor=&limit=3", headers=headers).json()
+    assert len(first["items"]) == 3
+    assert first["next_cursor"]
+
+    # A newer log arriving between pages does not shift the next page
+    client.post(
+        "/adherence/logs",
+        json={"patient_medication_id": assignment_id,
+              "scheduled_time": (today + timedelta(hours=4)).isoformat(), "status": "missed"},
+        headers=headers
+    )
+
+    seen = [log["id"] for log in first["items"]]
+    cursor = first["next_cursor"]
+    while cursor:
+        page = client.get(f"/adherence/logs?cursor={cursor}&limit=3", headers=headers).json()
+        seen.extend(log["id"] for log in page["items"])
+        cursor = page["next_cursor"]
+
+    assert len(seen) == 7 and len(set(seen)) == 7
+    times = [log["scheduled_time"] for log in client.get("/adherence/logs?limit=500", headers=headers).json()]
+    assert times == sorted(times, reverse=True)
+
+    # Offset mode still returns a plain list; admins get the same cursor mode
+    assert isinstance(client.get("/adherence/logs?skip=2&limit=2", headers=headers).json(), list)
+    admin_page = client.get(
+        f"/adherence/patients/{patient_id}/logs?cursor=&limit=5&status=missed",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    ).json()
+    assert len(admin_page["items"]) == 5
+
+    assert client.get("/adherence/logs?cursor=not-a-cursor", headers=headers).status_code == 400
+
+
+# ==================== INDEX MIGRATION TESTS ====================
+
+def test_create_missing_indexes_on_existing_database(tmp_path):
+    """Indexes missing from an existing database are created; duplicates block only the unique one"""
+    from sqlalchemy import inspect, text
+    from app.database.migrations import create_missing_indexes, unique_index_missing
+
+    legacy_engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(bind=legacy_engine)
+    new_indexes = [
+        "uq_medication_logs_medication_time", "ix_medication_logs_patient_date_status",
+        "ix_medication_logs_patient_time_id", "ix_reminders_patient_time", "ix_patient_medications_patient_status"
+    ]
+    with legacy_engine.begin() as conn:
+        for name in new_indexes:
+            conn.execute(text(f"DROP INDEX {name}"))
+        # Duplicate dose logs written before the constraint existed
+        for _ in range(2):
+            conn.execute(text(
+                "INSERT INTO medication_logs (patient_medication_id, patient_id, scheduled_time, scheduled_date, status) "
+                "VALUES (1, 1, '2024-01-01 08:00:00', '2024-01-01', 'taken')"
+            ))
+
+    created = create_missing_indexes(legacy_engine)
+    assert sorted(created) == sorted(new_indexes[1:])
+    assert unique_index_missing("uq_medication_logs_medication_time")
+
+    with legacy_engine.begin() as conn:
+        conn.execute(text("DELETE FROM medication_logs WHERE id = 2"))
+    assert create_missing_indexes(legacy_engine) == ["uq_medication_logs_medication_time"]
+    assert not unique_index_missing("uq_medication_logs_medication_time")
+    assert create_missing_indexes(legacy_engine) == []
+
+    index_names = {index["name"] for index in inspect(legacy_engine).get_indexes("medication_logs")}
+    assert set(new_indexes[:3]) <= index_names
+    legacy_engine.dispose()
+
+
+def test_duplicate_log_rejected_without_unique_index(monkeypatch):
+    """On a database whose unique index could not be built, log_medication still refuses duplicates"""
+    from sqlalchemy import text
+    from app.database import migrations
+
+    admin_token = get_admin_token()
+    patient_token = get_patient_token()
+    patient_id, assignment_id = setup_patient_medication(admin_token, patient_token)
+
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX uq_medication_logs_medication_time"))
+    monkeypatch.setattr(migrations, "_skipped_unique_indexes", {"uq_medication_logs_medication_time"})
+
+    scheduled_time = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    log_data = {"patient_medication_id": assignment_id, "scheduled_time": scheduled_time.isoformat(), "status": "taken"}
+    headers = {"Authorization": f"Bearer {patient_token}"}
+
+    assert client.post("/adherence/logs", json=log_data, headers=headers).status_code == 201
+    response = client.post("/adherence/logs", json=log_data, headers=headers)
+    assert response.status_code == 400
+    assert "already exists" in response.json()["detail"].lower()
+
+    db = TestingSessionLocal()
+    try:
+        assert db.query(MedicationLog).filter(MedicationLog.patient_medication_id == assignment_id).count() == 1
+    finally:
+        db.close()
+
+
+def test_dashboard_etag_answers_304_until_logs_change():
+    """A matching If-None-Match gets a 304 without building the dashboard; a new log changes the ETag"""
+    from unittest.mock import patch
+    from app.adherence.services import AdherenceService
+
+    admin_token = get_admin_token()
+    patient_token = get_patient_token()
+    patient_id, assignment_id = setup_patient_medication(admin_token, patient_token)
+    headers = {"Authorization": f"Bearer {patient_token}"}
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+
+    response = client.get("/adherence/dashboard", headers=headers)
+    etag = response.headers["ETag"]
+    assert etag.startswith('"') and etag.endswith('"')
+
+    with patch.object(AdherenceService, "get_dashboard", side_effect=AssertionError("aggregate ran")):
+        response = client.get("/adherence/dashboard", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+    # Admin view of the same patient has its own URL, hence its own tag
+    admin_etag = client.get(f"/adherence/patients/{patient_id}/dashboard", headers=admin_headers).headers["ETag"]
+    assert admin_etag != etag
+
+    today = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    client.post(
+        "/adherence/logs",
+        json={"patient_medication_id": assignment_id, "scheduled_time": today.isoformat(), "status": "taken"},
+        headers=headers
+    )
+
+    response = client.get("/adherence/dashboard", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(response.json()["recent_logs"]) == 1
+
+    response = client.get(
+        f"/adherence/patients/{patient_id}/dashboard", headers={**admin_headers, "If-None-Match": admin_etag}
+    )
+    assert response.status_code == 200
+
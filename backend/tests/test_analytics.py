@@ -0,0 +1,782 @@
+"""
+Unit tests for analytics
+Tests for the clinic-wide adherence analytics endpoints
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from datetime import datetime, date, timedelta
+
+from main import app
+from app.database.db import get_db
+from app.auth.models import Base, User, RoleEnum
+from app.medications.models import Medication, PatientMedication, MedicationFormEnum, MedicationStatusEnum
+from app.adherence.models import MedicationLog, MedicationLogStatusEnum
+from app.adherence.rollup import AdherenceRollup
+
+
+# Create in-memory SQLite database for testing
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    """Override database dependency for testing."""
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+
+# Override the database dependency
+app.dependency_overrides[get_db] = override_get_db
+
+# Create test client
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def setup_database():
+    """Create tables before each test and drop them after."""
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+# Test data
+admin_data = {
+    "full_name": "Dr. Analytics Test",
+    "email": "analytics.admin@test.com",
+    "phone": "+3333333333",
+    "password": "admin123",
+    "role": "admin"
+}
+
+
+def get_admin_headers():
+    """Register and login as admin"""
+    client.post("/auth/register", json=admin_data)
+    response = client.post("/auth/login", data={
+        "username": admin_data["email"],
+        "password": admin_data["password"]
+    })
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def seed_patients(taken_per_patient, days=10, medication_name="Analytics Medication", email_prefix="analytics.patient"):
+    """
+    Create one patient per entry with one active medication and `days` daily doses,
+    the first `taken` of them taken and the rest missed. Returns the patient ids.
+    """
+    db = TestingSessionLocal()
+    try:
+        admin = db.query(User).filter(User.email == admin_data["email"]).first()
+        medication = Medication(
+            name=medication_name, form=MedicationFormEnum.tablet, default_dosage="10mg", created_by=admin.id
+        )
+        db.add(medication)
+        db.flush()
+
+        patient_ids = []
+        first_day = datetime.combine(date.today() - timedelta(days=days - 1), datetime.min.time())
+        for index, taken in enumerate(taken_per_patient):
+            patient = User(
+                full_name=f"Analytics Patient {index}",
+                email=f"{email_prefix}{index}@test.com",
+                password_hash="x",
+                role=RoleEnum.patient
+            )
+            db.add(patient)
+            db.flush()
+            assignment = PatientMedication(
+                patient_id=patient.id,
+                medication_id=medication.id,
+                dosage="10mg",
+                times_per_day=1,
+                start_date=first_day.date(),
+                status=MedicationStatusEnum.active,
+                confirmed_by_patient=True,
+                assigned_by_doctor=admin.id
+            )
+            db.add(assignment)
+            db.flush()
+
+            for day in range(days):
+                scheduled_time = first_day + timedelta(days=day, hours=8)
+                status = MedicationLogStatusEnum.taken if day < taken else MedicationLogStatusEnum.missed
+                db.add(MedicationLog(
+                    patient_medication_id=assignment.id,
+                    patient_id=patient.id,
+                    scheduled_time=scheduled_time,
+                    scheduled_date=scheduled_time.date(),
+                    status=status,
+                    actual_time=scheduled_time if status == MedicationLogStatusEnum.taken else None,
+                    on_time=status == MedicationLogStatusEnum.taken
+                ))
+            patient_ids.append(patient.id)
+
+        db.flush()
+        AdherenceRollup.rebuild(db)
+        db.commit()
+        return patient_ids
+    finally:
+        db.close()
+
+
+class QueryCounter:
+    """Count SQL statements executed on the test engine"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine, "before_cursor_execute", self)
+
+
+# ==================== PATIENT SUMMARY TESTS ====================
+
+def test_patient_summary_filters_orders_and_paginates_in_sql():
+    """min_adherence, ordering and pagination are applied by the database"""
+    headers = get_admin_headers()
+    patient_ids = seed_patients([10, 2, 7, 5])
+
+    response = client.get("/analytics/adherence/patients", headers=headers)
+    assert response.status_code == 200
+    rates = [(row["patient_id"], row["adherence_rate"]) for row in response.json()]
+    assert rates == [(patient_ids[0], 100.0), (patient_ids[2], 70.0), (patient_ids[3], 50.0), (patient_ids[1], 20.0)]
+
+    first = response.json()[0]
+    assert first["total_medications"] == 1
+    assert first["doses_scheduled"] == 10
+    assert first["doses_taken"] == 10
+    assert first["last_log_date"] == str(date.today())
+
+    response = client.get("/analytics/adherence/patients?min_adherence=50&order=asc", headers=headers)
+    assert [row["adherence_rate"] for row in response.json()] == [50.0, 70.0, 100.0]
+
+    response = client.get("/analytics/adherence/patients?order=asc&limit=2&skip=1", headers=headers)
+    assert [row["patient_id"] for row in response.json()] == [patient_ids[3], patient_ids[2]]
+
+
+def test_patient_summary_query_count_is_constant():
+    """The summary no longer issues one query per patient"""
+    headers = get_admin_headers()
+    seed_patients([3, 5, 8, 1, 9, 4, 6])
+
+    with QueryCounter() as small:
+        response = client.get("/analytics/adherence/patients?limit=2", headers=headers)
+    assert len(response.json()) == 2
+
+    with QueryCounter() as large:
+        response = client.get("/analytics/adherence/patients?limit=100", headers=headers)
+    assert len(response.json()) == 7
+
+    assert large.count == small.count
+
+
+# ==================== ADHERENCE STATS TESTS ====================
+
+def test_adherence_stats_grouped_in_sql_match_log_breakdown():
+    """Hour and weekday breakdowns computed in SQL equal a count over the raw logs"""
+    headers = get_admin_headers()
+    patient_ids = seed_patients([9, 4, 12], days=14)
+
+    # Evening doses for one patient so there is more than one hour bucket
+    db = TestingSessionLocal()
+    try:
+        assignment = db.query(PatientMedication).filter(PatientMedication.patient_id == patient_ids[0]).first()
+        for day in range(6):
+            scheduled_time = datetime.combine(date.today() - timedelta(days=day), datetime.min.time()) + timedelta(hours=20)
+            status = MedicationLogStatusEnum.taken if day % 2 else MedicationLogStatusEnum.skipped
+            db.add(MedicationLog(
+                patient_medication_id=assignment.id,
+                patient_id=patient_ids[0],
+                scheduled_time=scheduled_time,
+                scheduled_date=scheduled_time.date(),
+                status=status,
+                on_time=False
+            ))
+        db.flush()
+        AdherenceRollup.rebuild(db)
+        db.commit()
+        logs = db.query(MedicationLog).all()
+    finally:
+        db.close()
+
+    def rate(subset):
+        taken = len([log for log in subset if log.status == MedicationLogStatusEnum.taken])
+        return round(taken / len(subset) * 100, 2) if subset else 0
+
+    day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    response = client.get("/analytics/adherence/stats?days=14", headers=headers)
+    assert response.status_code == 200
+    stats = response.json()
+
+    assert stats["overall_adherence"] == rate(logs)
+    assert stats["weekday_adherence"] == rate([log for log in logs if log.scheduled_date.weekday() < 5])
+    assert stats["weekend_adherence"] == rate([log for log in logs if log.scheduled_date.weekday() >= 5])
+    assert stats["adherence_by_hour"] == {
+        "8": rate([log for log in logs if log.scheduled_time.hour == 8]),
+        "20": rate([log for log in logs if log.scheduled_time.hour == 20]),
+    }
+    assert stats["adherence_by_day"] == {
+        name: rate([log for log in logs if day_names[log.scheduled_date.weekday()] == name])
+        for name in {day_names[log.scheduled_date.weekday()] for log in logs}
+    }
+
+    # One patient only
+    response = client.get(f"/analytics/adherence/stats?days=14&patient_id={patient_ids[1]}", headers=headers)
+    assert response.json()["overall_adherence"] == rate([log for log in logs if log.patient_id == patient_ids[1]])
+    assert response.json()["adherence_by_hour"] == {"8": rate([log for log in logs if log.patient_id == patient_ids[1]])}
+
+
+def test_adherence_stats_empty_window():
+    """A window with no logs returns zeros"""
+    headers = get_admin_headers()
+    response = client.get("/analytics/adherence/stats", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["overall_adherence"] == 0
+    assert response.json()["adherence_by_hour"] == {}
+
+
+# ==================== SCORING TESTS ====================
+
+def test_patient_scores_batch_endpoint():
+    """Every patient gets a least-squares trend and a variance-based consistency score"""
+    import statistics
+
+    headers = get_admin_headers()
+    patient_ids = seed_patients([10, 5, 0], days=10)
+
+    with QueryCounter() as counter:
+        response = client.get("/analytics/adherence/scores?days=9", headers=headers)
+    assert response.status_code == 200
+    scores = {row["patient_id"]: row for row in response.json()}
+    assert set(scores) == set(patient_ids)
+
+    # Same rate every day: flat and perfectly consistent
+    assert scores[patient_ids[0]]["improvement_trend"] == 0
+    assert scores[patient_ids[0]]["consistency_score"] == 100
+    assert scores[patient_ids[2]]["consistency_score"] == 100
+    assert scores[patient_ids[2]]["adherence_rate"] == 0
+
+    # Five days taken then five missed: declining, and as inconsistent as a series can be
+    declining = scores[patient_ids[1]]
+    expected_slope = statistics.linear_regression(range(10), [100] * 5 + [0] * 5).slope * 7
+    assert declining["improvement_trend"] == round(expected_slope, 2)
+    assert declining["improvement_trend"] < 0
+    assert declining["consistency_score"] == 0
+    assert declining["days_with_doses"] == 10
+
+    # Paged and scored without per-patient queries
+    response = client.get("/analytics/adherence/scores?days=9&limit=1&skip=1", headers=headers)
+    assert [row["patient_id"] for row in response.json()] == [patient_ids[1]]
+    with QueryCounter() as paged:
+        client.get("/analytics/adherence/scores?days=9&limit=1", headers=headers)
+    assert paged.count == counter.count
+
+
+def test_scoring_numpy_matches_python_fallback():
+    """The vectorized path and the fallback agree"""
+    from app.analytics.services import scoring
+
+    if scoring.np is None:
+        pytest.skip("NumPy not installed")
+
+    start = date(2024, 1, 1)
+    rows = [
+        (key, start + timedelta(days=day), taken, 4)
+        for key in range(5)
+        for day, taken in enumerate([(day * key + key) % 5 for day in range(20)])
+        if (day + key) % 3
+    ]
+    points = [(key, (day - start).days, taken * 100.0 / scheduled) for key, day, taken, scheduled in rows]
+    vectorized = scoring.AdherenceScoring._score_numpy(points, 20)
+    fallback = scoring.AdherenceScoring._score_python(points)
+    assert vectorized.keys() == fallback.keys()
+    for key in fallback:
+        assert vectorized[key] == pytest.approx(fallback[key])
+
+
+# ==================== MEDICATION DETAIL TESTS ====================
+
+def test_medication_details_aggregate_per_medication():
+    """Names and skip reasons come from the grouped query and limit applies to medications"""
+    headers = get_admin_headers()
+    seed_patients([8, 6], days=10, medication_name="Metformin")
+    seed_patients([3], days=10, medication_name="Lisinopril", email_prefix="lisinopril.patient")
+
+    db = TestingSessionLocal()
+    try:
+        reasons = ["nausea", "nausea", "forgot", "traveling"]
+        skipped = db.query(MedicationLog).join(PatientMedication).join(Medication).filter(
+            Medication.name == "Metformin", MedicationLog.status == MedicationLogStatusEnum.missed
+        ).order_by(MedicationLog.id).limit(len(reasons)).all()
+        for log, reason in zip(skipped, reasons):
+            log.status = MedicationLogStatusEnum.skipped
+            log.skipped_reason = reason
+        db.flush()
+        AdherenceRollup.rebuild(db)
+        db.commit()
+    finally:
+        db.close()
+
+    with QueryCounter() as counter:
+        response = client.get("/analytics/adherence/medications", headers=headers)
+    assert response.status_code == 200
+    details = {row["medication_name"]: row for row in response.json()}
+    assert set(details) == {"Metformin", "Lisinopril"}
+
+    metformin = details["Metformin"]
+    assert metformin["total_patients"] == 2
+    assert metformin["doses_scheduled"] == 20
+    assert metformin["doses_taken"] == 14
+    assert metformin["doses_skipped"] == 4
+    assert metformin["doses_missed"] == 2
+    assert metformin["average_adherence_rate"] == 70.0
+    assert metformin["most_common_skip_reason"] == "nausea"
+    assert details["Lisinopril"]["most_common_skip_reason"] is None
+
+    # The limit counts medications, not patient assignments
+    response = client.get("/analytics/adherence/medications?limit=1", headers=headers)
+    assert [row["medication_name"] for row in response.json()] == ["Metformin"]
+    assert response.json()[0]["total_patients"] == 2
+    with QueryCounter() as limited:
+        client.get("/analytics/adherence/medications?limit=1", headers=headers)
+    assert limited.count == counter.count
+
+
+# ==================== REQUEST MEMO TESTS ====================
+
+def test_analytics_calls_memoized_per_session():
+    """Repeated and nested aggregate calls run once per request session, not across sessions"""
+    from app.analytics.services.patients import PatientAnalyticsService
+    from app.analytics.services.medications import MedicationAnalyticsService
+
+    headers = get_admin_headers()
+    seed_patients([4, 6])
+
+    db = TestingSessionLocal()
+    try:
+        with QueryCounter() as first:
+            summary = PatientAnalyticsService.get_patient_analytics_summary(db)
+            MedicationAnalyticsService.get_medication_analytics_summary(db)
+        assert first.count > 0
+
+        with QueryCounter() as repeated:
+            assert PatientAnalyticsService.get_patient_analytics_summary(db) is summary
+            # Already computed inside the summaries
+            PatientAnalyticsService.get_patient_status_distribution(db)
+            MedicationAnalyticsService.get_medication_status_distribution(db)
+            MedicationAnalyticsService.get_medication_popularity(db, limit=10)
+        assert repeated.count == 0
+
+        # Different arguments are a different entry
+        with QueryCounter() as other_args:
+            MedicationAnalyticsService.get_medication_popularity(db, 5)
+        assert other_args.count > 0
+    finally:
+        db.close()
+
+    db = TestingSessionLocal()
+    try:
+        with QueryCounter() as new_session:
+            PatientAnalyticsService.get_patient_analytics_summary(db)
+        assert new_session.count > 0
+    finally:
+        db.close()
+
+    response = client.get("/analytics/patients/summary", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["demographics"]["total_patients"] == summary.demographics.total_patients
+
+
+# ==================== EVENT LOOP TESTS ====================
+
+def test_health_stays_responsive_during_heavy_analytics(monkeypatch):
+    """A slow analytics aggregate runs on the threadpool instead of blocking other requests"""
+    import asyncio
+    import time
+    import httpx
+    from app.analytics.services.adherence import AdherenceAnalyticsService
+
+    headers = get_admin_headers()
+    original = AdherenceAnalyticsService.get_adherence_stats
+
+    def slow_stats(*args, **kwargs):
+        time.sleep(1.0)  # Stands in for a long aggregate holding the worker
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(AdherenceAnalyticsService, "get_adherence_stats", slow_stats)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            heavy = asyncio.create_task(async_client.get("/analytics/adherence/stats", headers=headers))
+
+            # Measured from when the health check is due: a blocked loop delays the wake-up too
+            started = time.perf_counter()
+            await asyncio.sleep(0.2)
+            health = await async_client.get("/health")
+            health_latency = time.perf_counter() - started - 0.2
+
+            return (await heavy), health, health_latency
+
+    heavy_response, health_response, health_latency = asyncio.run(run())
+    assert heavy_response.status_code == 200
+    assert health_response.status_code == 200
+    assert health_latency < 0.5
+
+
+# ==================== PANEL FAN-OUT TESTS ====================
+
+def test_run_panels_parallel_with_timeouts_and_failures(tmp_path, monkeypatch):
+    """Panels run concurrently on their own sessions; failures and timeouts degrade to fallbacks"""
+    import time
+    from sqlalchemy import text
+    from app.analytics import fanout
+    from app.analytics.memo import request_memoized
+
+    monkeypatch.setattr(fanout.settings, "ANALYTICS_FANOUT_WORKERS", 4)
+    file_engine = create_engine(f"sqlite:///{tmp_path / 'panels.db'}", connect_args={"check_same_thread": False})
+    sessions = set()
+
+    @request_memoized
+    def shared_aggregate(db):
+        time.sleep(0.05)
+        return db.execute(text("SELECT 42")).scalar()
+
+    def slow_query(session):
+        sessions.add(id(session))
+        time.sleep(0.3)
+        return session.execute(text("SELECT 1")).scalar()
+
+    def broken(session):
+        raise RuntimeError("panel bug")
+
+    def stuck(session):
+        time.sleep(2)
+
+    db = sessionmaker(bind=file_engine)()
+    try:
+        shared_aggregate(db)
+        started = time.perf_counter()
+        results, degraded = fanout.run_panels(db, {
+            "a": slow_query,
+            "b": slow_query,
+            "c": slow_query,
+            "shared": shared_aggregate,
+            "broken": broken,
+            "stuck": stuck,
+        }, fallbacks={"broken": [], "stuck": "n/a"}, timeout=1.0)
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+
+    assert results["a"] == results["b"] == results["c"] == 1
+    assert results["shared"] == 42
+    assert results["broken"] == []
+    assert results["stuck"] == "n/a"
+    assert sorted(degraded) == ["broken", "stuck"]
+    assert len(sessions) == 3
+    # Three 0.3s panels in parallel, bounded by the 1s timeout rather than the 2s panel
+    assert elapsed < 1.5
+
+
+def test_run_panels_computes_shared_aggregate_once(tmp_path, monkeypatch):
+    """Parallel panels needing the same aggregate wait for one computation instead of each running it"""
+    import threading
+    import time
+    from sqlalchemy import text
+    from app.analytics import fanout
+    from app.analytics.memo import request_memoized
+
+    monkeypatch.setattr(fanout.settings, "ANALYTICS_FANOUT_WORKERS", 4)
+    file_engine = create_engine(f"sqlite:///{tmp_path / 'memo.db'}", connect_args={"check_same_thread": False})
+    calls = {"status": 0, "flaky": 0}
+    calls_lock = threading.Lock()
+
+    @request_memoized
+    def status_distribution(db):
+        with calls_lock:
+            calls["status"] += 1
+        time.sleep(0.2)
+        return db.execute(text("SELECT 7")).scalar()
+
+    @request_memoized
+    def summary(db):
+        # Like get_patient_analytics_summary, builds on the distribution another panel shows
+        return {"status": status_distribution(db)}
+
+    @request_memoized
+    def flaky(db):
+        with calls_lock:
+            calls["flaky"] += 1
+        raise RuntimeError("aggregate failed")
+
+    db = sessionmaker(bind=file_engine)()
+    try:
+        results, degraded = fanout.run_panels(db, {
+            "status": status_distribution,
+            "status_again": status_distribution,
+            "summary": summary,
+            "flaky": flaky,
+        })
+        # A failed call is not memoized: the next caller computes it again
+        with pytest.raises(RuntimeError):
+            flaky(db)
+    finally:
+        db.close()
+
+    assert results["status"] == results["status_again"] == 7
+    assert results["summary"] == {"status": 7}
+    assert calls["status"] == 1
+    assert degraded == ["flaky"]
+    assert calls["flaky"] == 2
+
+
+def test_run_panels_inline_on_shared_connection():
+    """With one shared connection the panels run in turn on the request session"""
+    from sqlalchemy import text
+    from app.analytics import fanout
+
+    db = TestingSessionLocal()
+    try:
+        results, degraded = fanout.run_panels(db, {
+            "users": lambda session: session.query(User).count(),
+            "broken": lambda session: session.execute(text("SELECT * FROM missing_table")),
+            "after": lambda session: session.query(User).count(),
+        })
+    finally:
+        db.close()
+
+    assert results == {"users": 0, "broken": None, "after": 0}
+    assert degraded == ["broken"]
+
+
+# ==================== SNAPSHOT TESTS ====================
+
+def test_snapshots_serve_latest_as_of_and_fresh():
+    """Endpoints serve the latest snapshot, historical ones by as_of, and live data with fresh"""
+    from app.analytics.services.snapshots import AnalyticsSnapshotService, SNAPSHOT_KINDS, CURRENT_ONLY_KINDS
+
+    headers = get_admin_headers()
+    seed_patients([5], days=10)
+
+    # No snapshot yet: computed live
+    response = client.get("/analytics/adherence/overview", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["X-Analytics-Snapshot"] == "live"
+    assert response.json()["total_doses_taken"] == 5
+
+    db = TestingSessionLocal()
+    try:
+        last_week = date.today() - timedelta(days=7)
+        assert AnalyticsSnapshotService.take_snapshots(db, last_week) == [
+            kind for kind in SNAPSHOT_KINDS if kind not in CURRENT_ONLY_KINDS
+        ]
+        AnalyticsSnapshotService.take_snapshots(db)
+        AnalyticsSnapshotService.take_snapshots(db)  # Rerun replaces today's rows
+    finally:
+        db.close()
+
+    # New data after the snapshot is not visible until the next one...
+    seed_patients([10], days=10, email_prefix="late.patient")
+
+    with QueryCounter() as counter:
+        response = client.get("/analytics/adherence/overview", headers=headers)
+    assert response.headers["X-Analytics-Snapshot"] == str(date.today())
+    assert response.json()["total_doses_taken"] == 5
+    # Auth lookup plus one snapshot read
+    assert counter.count <= 3
+
+    # ...unless a live recompute is asked for
+    response = client.get("/analytics/adherence/overview?fresh=true", headers=headers)
+    assert response.headers["X-Analytics-Snapshot"] == "live"
+    assert response.json()["total_doses_taken"] == 15
+
+    # Historical snapshot in effect on a date
+    response = client.get(
+        f"/analytics/adherence/trends?as_of={date.today() - timedelta(days=3)}", headers=headers
+    )
+    assert response.headers["X-Analytics-Snapshot"] == str(last_week)
+    assert sum(day["doses_taken"] for day in response.json()) == 3  # Only days up to last week
+
+    response = client.get(f"/analytics/adherence/overview?as_of={date.today() - timedelta(days=30)}", headers=headers)
+    assert response.status_code == 404
+
+    # Custom windows and patient filters are always computed live
+    response = client.get("/analytics/adherence/trends?days=7", headers=headers)
+    assert response.status_code == 200
+    assert "X-Analytics-Snapshot" not in response.headers
+
+    for path in ("/analytics/patients/status-distribution", "/analytics/patients/demographics", "/analytics/medications/usage-stats"):
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200
+        assert response.headers["X-Analytics-Snapshot"] == str(date.today())
+
+    db = TestingSessionLocal()
+    try:
+        from app.analytics.models import AnalyticsSnapshot
+        assert db.query(AnalyticsSnapshot).count() == 2 * len(SNAPSHOT_KINDS) - len(CURRENT_ONLY_KINDS)
+    finally:
+        db.close()
+
+
+def test_past_snapshots_leave_out_current_only_kinds():
+    """Backdated snapshots hold only kinds computable as of the date; current-only data is never stored as history"""
+    from app.analytics.services.snapshots import AnalyticsSnapshotService, CURRENT_ONLY_KINDS
+
+    headers = get_admin_headers()
+    seed_patients([5], days=10)
+    last_week = date.today() - timedelta(days=7)
+
+    db = TestingSessionLocal()
+    try:
+        written = AnalyticsSnapshotService.take_snapshots(db, last_week)
+        assert CURRENT_ONLY_KINDS.isdisjoint(written)
+        with pytest.raises(ValueError):
+            AnalyticsSnapshotService.take_snapshots(db, last_week, kinds=["patient_status_distribution"])
+        # Today they can be taken
+        assert AnalyticsSnapshotService.take_snapshots(db, kinds=["patient_status_distribution"]) == [
+            "patient_status_distribution"
+        ]
+    finally:
+        db.close()
+
+    # No status distribution is on record for last week
+    response = client.get(f"/analytics/patients/status-distribution?as_of={last_week}", headers=headers)
+    assert response.status_code == 404
+    response = client.get(f"/analytics/adherence/overview?as_of={last_week}", headers=headers)
+    assert response.headers["X-Analytics-Snapshot"] == str(last_week)
+
+
+# ==================== CONDITIONAL RESPONSE TESTS ====================
+
+def test_analytics_etag_answers_304_until_data_changes():
+    """Analytics endpoints return 304 for an unchanged ETag without running the aggregate"""
+    from unittest.mock import patch
+    from app.analytics.services.adherence import AdherenceAnalyticsService
+    from app.cache.versions import DataVersions
+
+    headers = get_admin_headers()
+    seed_patients([6, 3])
+
+    response = client.get("/analytics/adherence/patients", headers=headers)
+    etag = response.headers["ETag"]
+
+    with patch.object(AdherenceAnalyticsService, "get_patient_adherence_summary", side_effect=AssertionError("aggregate ran")):
+        with QueryCounter() as counter:
+            response = client.get("/analytics/adherence/patients", headers={**headers, "If-None-Match": f'W/"x", {etag}'})
+    assert response.status_code == 304
+    assert counter.count <= 2  # Current-user lookup and the data-version lookup
+
+    # Different query string, different representation
+    response = client.get("/analytics/adherence/patients?limit=1", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+
+    # Unauthenticated requests never get a 304
+    response = client.get("/analytics/adherence/patients", headers={"If-None-Match": etag})
+    assert response.status_code == 401
+
+    # A write to a table the endpoint reads changes the tag
+    db = TestingSessionLocal()
+    try:
+        DataVersions.bump(db, "medication_logs", 1)
+        db.commit()
+    finally:
+        db.close()
+    response = client.get("/analytics/adherence/patients", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    # ...while unrelated tables leave other routers' tags alone
+    status_etag = client.get("/analytics/patients/status-distribution", headers=headers).headers["ETag"]
+    db = TestingSessionLocal()
+    try:
+        DataVersions.bump(db, "medication_logs", 1)
+        db.commit()
+    finally:
+        db.close()
+    response = client.get("/analytics/patients/status-distribution", headers={**headers, "If-None-Match": status_etag})
+    assert response.status_code == 304
+
+
+
+def test_age_and_bmi_distribution_bucketed_in_sql():
+    """Age groups follow date-of-birth cutoffs and BMI groups are bucketed by the database"""
+    from app.patients.models import Patient
+    from app.analytics.services.patients import PatientAnalyticsService, _years_before
+
+    headers = get_admin_headers()
+    today = date.today()
+    # (date of birth, height cm, weight kg)
+    profiles = [
+        (_years_before(today, 18) + timedelta(days=1), 170, 50),   # 17 until tomorrow, BMI 17.3
+        (_years_before(today, 18), 170, 65),                       # 18 today, BMI 22.5
+        (_years_before(today, 40), 180, 90),                       # BMI 27.8
+        (_years_before(today, 40), 160, 80),                       # BMI 31.2
+        (_years_before(today, 75), None, 70),                      # no BMI
+        (None, 175, 70),                                           # unknown age, BMI 22.9
+    ]
+    db = TestingSessionLocal()
+    try:
+        for index, (date_of_birth, height, weight) in enumerate(profiles):
+            user = User(
+                full_name=f"Profile Patient {index}",
+                email=f"profile.patient{index}@test.com",
+                password_hash="x",
+                role=RoleEnum.patient
+            )
+            db.add(user)
+            db.flush()
+            db.add(Patient(user_id=user.id, date_of_birth=date_of_birth, height=height, weight=weight))
+        db.commit()
+    finally:
+        db.close()
+
+    response = client.get("/analytics/patients/age-distribution", headers=headers)
+    assert response.status_code == 200
+    groups = {group["age_group"]: group for group in response.json()}
+    assert list(groups) == ["under_18", "18_29", "30_49", "50_69", "70_plus"]
+    assert [group["count"] for group in groups.values()] == [1, 1, 2, 0, 1]
+    assert groups["30_49"]["percentage"] == 40.0
+    assert groups["30_49"]["average_bmi"] == round((90 / 1.8 ** 2 + 80 / 1.6 ** 2) / 2, 1)
+    assert groups["18_29"]["average_age"] == 18.0
+    assert groups["50_69"]["average_bmi"] is None
+    assert groups["70_plus"]["average_bmi"] is None
+
+    demographics = client.get("/analytics/patients/demographics?fresh=true", headers=headers).json()
+    assert demographics["age_distribution"] == {"under_18": 1, "18_29": 1, "30_49": 2, "70_plus": 1}
+    assert 38 < demographics["average_age"] < 38.5
+    assert demographics["registration_trend"] == {today.strftime("%Y-%m"): len(profiles)}
+
+    metrics = client.get("/analytics/patients/health-metrics", headers=headers).json()
+    assert metrics["bmi_distribution"] == {"underweight": 1, "normal": 2, "overweight": 1, "obese": 1}
+    expected_bmis = [50 / 1.7 ** 2, 65 / 1.7 ** 2, 90 / 1.8 ** 2, 80 / 1.6 ** 2, 70 / 1.75 ** 2]
+    assert metrics["average_bmi"] == round(sum(expected_bmis) / len(expected_bmis), 1)
+
+    # One grouped query serves both the age panel and the demographics age figures
+    db = TestingSessionLocal()
+    try:
+        with QueryCounter() as counter:
+            PatientAnalyticsService.get_age_distribution(db)
+        assert counter.count == 1
+    finally:
+        db.close()
@@ -4,7 +4,7 @@ Tests for reminder schedules and reminder instances (without Twilio integration)
 """
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 from datetime import datetime, date, timedelta, time as dt_time
@@ -634,6 +634,72 @@ def test_generate_reminders():
     assert "reminders" in data
 
 
+def test_generate_reminders_set_based():
+    """Generation costs a fixed number of queries, skips existing slots and returns new ids"""
+    from app.reminders.services import ReminderService
+    
+    admin_token = get_admin_token()
+    patient_token, patient_id = get_patient_token()
+    medication = create_test_medication(admin_token)
+    assignment = assign_medication_to_patient(admin_token, patient_id, medication["id"])
+    
+    created = client.post(
+        "/reminders/schedules",
+        json={
+            "patient_medication_id": assignment["id"],
+            "frequency": "custom",
+            "reminder_times": ["06:00", "12:00", "18:00", "22:00"],
+            "advance_minutes": 15,
+            "start_date": datetime.now().isoformat()
+        },
+        headers={"Authorization": f"Bearer {patient_token}"}
+    )
+    schedule_id = created.json()["id"]
+    
+    # One slot already has a reminder
+    taken_slot = datetime.combine(date.today() + timedelta(days=2), dt_time(11, 45))
+    db = TestingSessionLocal()
+    try:
+        db.add(Reminder(
+            patient_medication_id=assignment["id"],
+            patient_id=patient_id,
+            scheduled_time=taken_slot,
+            actual_dose_time=taken_slot + timedelta(minutes=15),
+            message_text="existing"
+        ))
+        db.commit()
+    finally:
+        db.close()
+    
+    statements = []
+    
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    db = TestingSessionLocal()
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        reminder_ids = ReminderService(db).generate_reminders_for_schedule(schedule_id, days_ahead=30)
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+    
+    try:
+        # schedule, medication assignment, medication, existing slots, insert
+        assert len(statements) <= 5
+        assert len(reminder_ids) >= 29 * 4 - 1
+        
+        rows = db.query(Reminder).filter(Reminder.patient_medication_id == assignment["id"]).all()
+        assert len(rows) == len(reminder_ids) + 1
+        assert len({row.scheduled_time for row in rows}) == len(rows)
+        assert {row.id for row in rows if row.scheduled_time != taken_slot} == set(reminder_ids)
+        assert all(row.status == ReminderStatusEnum.pending and row.retry_count == 0 for row in rows)
+        
+        # Running again creates nothing
+        assert ReminderService(db).generate_reminders_for_schedule(schedule_id, days_ahead=30) == []
+    finally:
+        db.close()
+
+
 def test_get_reminders():
     """Test getting reminder instances"""
     admin_token = get_admin_token()
@@ -762,3 +828,690 @@ def test_get_reminder_stats():
     assert "sent" in stats
     assert "delivered" in stats
     assert "delivery_rate" in stats
+
+
+# ==================== HORIZON SWEEPER TESTS ====================
+
+def seed_schedules(count, reminder_times=("08:00", "20:00")):
+    """Create `count` patients, each with one active medication and reminder schedule. Returns schedule ids."""
+    import json
+    
+    db = TestingSessionLocal()
+    try:
+        admin = User(full_name="Sweep Admin", email="sweep.admin@test.com", password_hash="x", role=RoleEnum.admin)
+        db.add(admin)
+        db.flush()
+        medication = Medication(name="Sweepamol", form=MedicationFormEnum.tablet, default_dosage="5mg", created_by=admin.id)
+        db.add(medication)
+        db.flush()
+        
+        schedule_ids = []
+        for index in range(count):
+            patient = User(full_name=f"Sweep Patient {index}", email=f"sweep{index}@test.com", password_hash="x", role=RoleEnum.patient)
+            db.add(patient)
+            db.flush()
+            assignment = PatientMedication(
+                patient_id=patient.id, medication_id=medication.id, dosage="5mg", times_per_day=len(reminder_times),
+                start_date=date.today(), status=MedicationStatusEnum.active, assigned_by_doctor=admin.id
+            )
+            db.add(assignment)
+            db.flush()
+            schedule = ReminderSchedule(
+                patient_medication_id=assignment.id, patient_id=patient.id,
+                reminder_times=json.dumps(list(reminder_times)), advance_minutes=15,
+                start_date=datetime.combine(date.today(), dt_time.min)
+            )
+            db.add(schedule)
+            db.flush()
+            schedule_ids.append(schedule.id)
+        db.commit()
+        return schedule_ids
+    finally:
+        db.close()
+
+
+def test_sweeper_fills_horizon_in_chunks_and_skips_filled_schedules():
+    """Every active schedule is generated to the horizon once; reruns skip it until the horizon moves"""
+    from app.reminders.sweeper import ReminderHorizonSweeper
+    
+    schedule_ids = seed_schedules(25)
+    now = datetime.combine(date.today(), dt_time(0, 0))
+    db = TestingSessionLocal()
+    try:
+        # One inactive schedule, one with a malformed time, one slot already generated
+        db.query(ReminderSchedule).filter(ReminderSchedule.id == schedule_ids[0]).update({"is_active": False})
+        db.query(ReminderSchedule).filter(ReminderSchedule.id == schedule_ids[1]).update({"reminder_times": '["8am"]'})
+        existing = db.query(ReminderSchedule).get(schedule_ids[2])
+        db.add(Reminder(
+            patient_medication_id=existing.patient_medication_id, patient_id=existing.patient_id,
+            scheduled_time=now + timedelta(hours=7, minutes=45), actual_dose_time=now + timedelta(hours=8),
+            message_text="existing"
+        ))
+        db.commit()
+        
+        summary = ReminderHorizonSweeper.run(db, days_ahead=7, chunk_size=10, now=now)
+        assert summary["schedules_scanned"] == 24
+        assert summary["chunks"] == 3
+        assert summary["schedules_up_to_date"] == 0
+        assert summary["failed_schedules"] == 1
+        assert summary["errors"] == [f"Schedule {schedule_ids[1]}: Invalid reminder time '8am'"]
+        assert summary["generated_count"] == 23 * 7 * 2 - 1
+        assert summary["reminders_per_second"] > 0
+        assert db.query(Reminder).count() == 23 * 7 * 2
+        
+        horizon = now + timedelta(days=7)
+        watermarks = dict(db.query(ReminderSchedule.id, ReminderSchedule.generated_until).all())
+        assert watermarks[schedule_ids[0]] is None
+        assert watermarks[schedule_ids[1]] is None
+        assert all(watermarks[schedule_id] == horizon for schedule_id in schedule_ids[2:])
+        
+        # Nothing left but the broken schedule
+        rerun = ReminderHorizonSweeper.run(db, days_ahead=7, chunk_size=10, now=now)
+        assert rerun["schedules_scanned"] == 1
+        assert rerun["schedules_up_to_date"] == 23
+        assert rerun["generated_count"] == 0
+        
+        # The next day only the new last day is generated
+        next_day = ReminderHorizonSweeper.run(db, days_ahead=7, chunk_size=10, now=now + timedelta(days=1))
+        assert next_day["generated_count"] == 23 * 2
+        assert db.query(Reminder).filter(Reminder.scheduled_time >= horizon).count() == 23 * 2
+    finally:
+        db.close()
+
+
+def test_schedule_edits_and_pauses_replace_pregenerated_reminders():
+    """Editing or pausing a schedule drops its upcoming unclaimed reminders before the sweeper refills"""
+    from app.reminders.services import ReminderService
+    from app.reminders.schemas import ReminderScheduleUpdate
+    from app.reminders.sweeper import ReminderHorizonSweeper
+    
+    schedule_id = seed_schedules(1)[0]
+    db = TestingSessionLocal()
+    try:
+        schedule = db.query(ReminderSchedule).get(schedule_id)
+        patient_id = schedule.patient_id
+        ReminderHorizonSweeper.run(db, days_ahead=3, now=datetime.now())
+        upcoming = db.query(Reminder).filter(Reminder.scheduled_time >= datetime.now())
+        assert upcoming.count() > 0
+        
+        # A reminder already claimed by a dispatcher is left to it
+        claimed = upcoming.order_by(Reminder.scheduled_time.desc()).first()
+        claimed.claimed_by = "worker-1"
+        claimed.lease_expires_at = datetime.now() + timedelta(minutes=5)
+        db.commit()
+        
+        service = ReminderService(db)
+        service.update_reminder_schedule(patient_id, schedule_id, ReminderScheduleUpdate(reminder_times=["09:00", "21:00"]))
+        assert [reminder.id for reminder in upcoming.all()] == [claimed.id]
+        
+        ReminderHorizonSweeper.run(db, days_ahead=3, now=datetime.now())
+        regenerated = [reminder for reminder in upcoming.all() if reminder.id != claimed.id]
+        assert regenerated
+        assert {reminder.actual_dose_time.time() for reminder in regenerated} <= {dt_time(9, 0), dt_time(21, 0)}
+        
+        # Paused: nothing upcoming is left to send and the sweeper adds nothing
+        service.toggle_reminder_schedule(patient_id, schedule_id, False)
+        assert [reminder.id for reminder in upcoming.all()] == [claimed.id]
+        assert ReminderHorizonSweeper.run(db, days_ahead=3, now=datetime.now())["generated_count"] == 0
+        assert [reminder.id for reminder in upcoming.all()] == [claimed.id]
+    finally:
+        db.close()
+
+def test_sweep_and_range_generate_endpoints_are_admin_only():
+    """The sweep and bulk generate endpoints use the bulk schemas and require an admin"""
+    schedule_ids = seed_schedules(3)
+    admin_token = get_admin_token()
+    patient_token, _ = get_patient_token()
+    
+    assert client.post(
+        "/reminders/admin/sweep", headers={"Authorization": f"Bearer {patient_token}"}
+    ).status_code == 403
+    
+    response = client.post(
+        "/reminders/admin/sweep?days_ahead=3", headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["schedules_scanned"] == 3
+    assert data["errors"] == []
+    assert data["generated_count"] > 0
+    
+    db = TestingSessionLocal()
+    try:
+        patient_medication_id = db.query(ReminderSchedule).get(schedule_ids[0]).patient_medication_id
+    finally:
+        db.close()
+    
+    start = datetime.combine(date.today() + timedelta(days=10), dt_time.min)
+    response = client.post(
+        "/reminders/admin/generate",
+        json={
+            "patient_medication_id": patient_medication_id,
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=1, hours=12)).isoformat()
+        },
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["generated_count"] == 3
+    assert len(data["reminder_ids"]) == 3
+    assert data["errors"] == []
+    
+    response = client.post(
+        "/reminders/admin/generate",
+        json={"patient_medication_id": 9999, "start_date": start.isoformat(), "end_date": start.isoformat()},
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 400
+
+
+def test_create_missing_columns_on_existing_database(tmp_path):
+    """A nullable column added to a model is added to the existing table"""
+    from sqlalchemy import inspect, text
+    from app.database.migrations import create_missing_columns
+    
+    legacy_engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(bind=legacy_engine)
+    with legacy_engine.begin() as conn:
+        conn.execute(text("ALTER TABLE reminder_schedules DROP COLUMN generated_until"))
+    
+    assert create_missing_columns(legacy_engine) == ["reminder_schedules.generated_until"]
+    assert create_missing_columns(legacy_engine) == []
+    
+    columns = {column["name"] for column in inspect(legacy_engine).get_columns("reminder_schedules")}
+    assert "generated_until" in columns
+    legacy_engine.dispose()
+
+
+# ==================== DISPATCHER TESTS ====================
+
+def seed_reminders(times):
+    """One pending reminder per scheduled time, all for one seeded medication. Returns their ids."""
+    schedule_id = seed_schedules(1)[0]
+    db = TestingSessionLocal()
+    try:
+        schedule = db.query(ReminderSchedule).get(schedule_id)
+        reminders = [
+            Reminder(
+                patient_medication_id=schedule.patient_medication_id, patient_id=schedule.patient_id,
+                scheduled_time=scheduled_time, actual_dose_time=scheduled_time + timedelta(minutes=15),
+                message_text="Take your medication"
+            )
+            for scheduled_time in times
+        ]
+        db.add_all(reminders)
+        db.commit()
+        return [reminder.id for reminder in reminders]
+    finally:
+        db.close()
+
+
+def test_dispatchers_claim_disjoint_batches_and_send_each_reminder_once():
+    """Two workers polling the same table never hold or send the same reminder"""
+    from app.reminders.dispatcher import ReminderDispatcher
+    from app.reminders.transport import StubTransport
+    
+    now = datetime.now()
+    reminder_ids = seed_reminders([now - timedelta(seconds=index) for index in range(50)])
+    transports = [StubTransport(fail_ids=reminder_ids[:2]), StubTransport(fail_ids=reminder_ids[:2])]
+    workers = [
+        ReminderDispatcher(
+            TestingSessionLocal, transport, worker_id=f"worker-{index}", batch_size=20, lookahead_seconds=0, poll_seconds=0
+        )
+        for index, transport in enumerate(transports)
+    ]
+    
+    # Interleave claims: both workers take batches before either sends
+    assert workers[0].poll() == 20
+    assert workers[1].poll() == 20
+    assert workers[0].poll() == 10
+    assert workers[1].poll() == 0
+    assert workers[0].held + workers[1].held == 50
+    
+    for worker in workers:
+        worker.run(until_idle=True)
+    
+    sent = transports[0].sent + transports[1].sent
+    assert len(sent) == len(set(sent)) == 50 - 2
+    assert workers[0].stats["sent"] + workers[1].stats["sent"] == 48
+    
+    db = TestingSessionLocal()
+    try:
+        reminders = db.query(Reminder).all()
+        assert all(reminder.claimed_by is None and reminder.lease_expires_at is None for reminder in reminders)
+        # Failed sends wait in pending for their retry
+        failed = [reminder for reminder in reminders if reminder.status == ReminderStatusEnum.pending]
+        assert {reminder.id for reminder in failed} == set(reminder_ids[:2])
+        assert all(reminder.retry_count == 1 and reminder.twilio_error_code == "stub" for reminder in failed)
+        assert all(reminder.next_attempt_at > reminder.last_retry_at for reminder in failed)
+        sent_rows = [reminder for reminder in reminders if reminder.status == ReminderStatusEnum.sent]
+        assert len(sent_rows) == 48
+        assert all(reminder.twilio_message_sid == f"STUB{reminder.id}" and reminder.sent_at for reminder in sent_rows)
+    finally:
+        db.close()
+
+
+def test_dispatcher_fires_on_time_and_recovers_crashed_leases():
+    """Reminders wait on the heap until due; a crashed worker's leases are taken over after expiry"""
+    from app.reminders.dispatcher import ReminderDispatcher
+    from app.reminders.transport import StubTransport
+    
+    now = datetime.now().replace(microsecond=0)
+    reminder_ids = seed_reminders([now + timedelta(seconds=10), now + timedelta(seconds=30), now + timedelta(minutes=10)])
+    clock = {"now": now}
+    
+    crashed = ReminderDispatcher(
+        TestingSessionLocal, StubTransport(), worker_id="crashed", lookahead_seconds=60, lease_seconds=120,
+        clock=lambda: clock["now"]
+    )
+    # Only the two reminders inside the lookahead window are claimed, and neither is due yet
+    assert crashed.poll() == 2
+    assert crashed.fire_due() == 0
+    clock["now"] = now + timedelta(seconds=10)
+    assert crashed.fire_due() == 1
+    # The worker dies holding the second reminder
+    
+    transport = StubTransport()
+    survivor = ReminderDispatcher(
+        TestingSessionLocal, transport, worker_id="survivor", lookahead_seconds=60, lease_seconds=120,
+        clock=lambda: clock["now"]
+    )
+    clock["now"] = now + timedelta(seconds=40)
+    assert survivor.poll() == 0
+    
+    db = TestingSessionLocal()
+    try:
+        assert db.query(Reminder).get(reminder_ids[1]).claimed_by == "crashed"
+    finally:
+        db.close()
+    
+    # After the lease (lookahead + lease from the claim) expires, the survivor takes it over
+    clock["now"] = now + timedelta(seconds=181)
+    assert survivor.poll() == 1
+    assert survivor.fire_due() == 1
+    assert crashed.transport.sent == [reminder_ids[0]]
+    assert transport.sent == [reminder_ids[1]]
+    
+    db = TestingSessionLocal()
+    try:
+        statuses = [reminder.status for reminder in db.query(Reminder).order_by(Reminder.scheduled_time)]
+        assert statuses == [ReminderStatusEnum.sent, ReminderStatusEnum.sent, ReminderStatusEnum.pending]
+    finally:
+        db.close()
+
+
+def test_dispatcher_skips_reminders_of_paused_schedules_and_stopped_medications():
+    """Due reminders are only claimed while their schedule and medication are active"""
+    from app.reminders.dispatcher import ReminderDispatcher
+    from app.reminders.transport import StubTransport
+    
+    now = datetime.now()
+    reminder_ids = seed_reminders([now - timedelta(minutes=1), now - timedelta(minutes=2)])
+    transport = StubTransport()
+    worker = ReminderDispatcher(TestingSessionLocal, transport, worker_id="worker", lookahead_seconds=0, poll_seconds=0)
+    
+    db = TestingSessionLocal()
+    try:
+        schedule = db.query(ReminderSchedule).one()
+        assignment = db.query(PatientMedication).get(schedule.patient_medication_id)
+        
+        schedule.is_active = False
+        db.commit()
+        assert worker.poll() == 0
+        
+        schedule.is_active = True
+        assignment.status = MedicationStatusEnum.stopped
+        db.commit()
+        assert worker.poll() == 0
+        
+        db.delete(schedule)
+        assignment.status = MedicationStatusEnum.active
+        db.commit()
+        assert worker.poll() == 0
+    finally:
+        db.close()
+    
+    assert worker.run(until_idle=True)["sent"] == 0
+    assert transport.sent == []
+    
+    db = TestingSessionLocal()
+    try:
+        reminders = db.query(Reminder).filter(Reminder.id.in_(reminder_ids)).all()
+        assert all(reminder.status == ReminderStatusEnum.pending and reminder.claimed_by is None for reminder in reminders)
+    finally:
+        db.close()
+
+
+# ==================== NOTIFICATION TRANSPORT TESTS ====================
+
+def test_http_transport_sends_each_channel_through_fake_provider(monkeypatch):
+    """Reminders on every channel go out through the fake provider; Twilio status callbacks mark delivery"""
+    import time
+    import httpx
+    from app.config.settings import settings
+    from app.reminders.dispatcher import ReminderDispatcher
+    from app.reminders.fake_provider import create_fake_provider
+    from app.reminders.http_transport import AsyncNotificationTransport
+    from app.reminders.models import ReminderChannelEnum
+    
+    for name in ("TWILIO_API_URL", "EMAIL_API_URL", "PUSH_API_URL"):
+        monkeypatch.setattr(settings, name, "http://fake-provider")
+    monkeypatch.setattr(settings, "TWILIO_ACCOUNT_SID", "ACtest")
+    monkeypatch.setattr(settings, "TWILIO_AUTH_TOKEN", "callback-secret")
+    monkeypatch.setattr(settings, "TWILIO_STATUS_CALLBACK_URL", "http://testserver/reminders/webhooks/twilio/status")
+    
+    provider = create_fake_provider(
+        latency=(0, 0.01), callback_delay=0.01, auth_token="callback-secret",
+        callback_transport=httpx.ASGITransport(app=app)
+    )
+    
+    now = datetime.now()
+    reminder_ids = seed_reminders([now - timedelta(seconds=index) for index in range(5)])
+    channels = [ReminderChannelEnum.whatsapp, ReminderChannelEnum.sms, ReminderChannelEnum.email, ReminderChannelEnum.push]
+    db = TestingSessionLocal()
+    try:
+        reminders = db.query(Reminder).order_by(Reminder.id).all()
+        for reminder, channel in zip(reminders, channels + [ReminderChannelEnum.sms]):
+            reminder.channel = channel
+        patient = db.query(User).get(reminders[0].patient_id)
+        patient.phone = "+15550001111"
+        # The last reminder belongs to a patient without a phone number
+        other = User(full_name="No Phone", email="nophone@test.com", password_hash="x", role=RoleEnum.patient)
+        db.add(other)
+        db.flush()
+        reminders[4].patient_id = other.id
+        db.commit()
+    finally:
+        db.close()
+    
+    transport = AsyncNotificationTransport(TestingSessionLocal, http_transport=httpx.ASGITransport(app=provider))
+    try:
+        stats = ReminderDispatcher(TestingSessionLocal, transport, worker_id="http-worker").run(until_idle=True)
+        
+        # Two Twilio messages, two callbacks each
+        deadline = time.monotonic() + 5
+        while provider.state.stats["callbacks_sent"] < 4 and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        transport.close()
+    
+    assert stats["sent"] == 4 and stats["failed"] == 1
+    assert provider.state.stats["twilio_accepted"] == 2
+    assert provider.state.stats["email_accepted"] == 1
+    assert provider.state.stats["push_accepted"] == 1
+    assert provider.state.stats["callbacks_sent"] == 4
+    
+    db = TestingSessionLocal()
+    try:
+        by_id = {reminder.id: reminder for reminder in db.query(Reminder).all()}
+        assert [by_id[reminder_id].status for reminder_id in reminder_ids] == [
+            ReminderStatusEnum.delivered, ReminderStatusEnum.delivered,
+            ReminderStatusEnum.sent, ReminderStatusEnum.sent, ReminderStatusEnum.failed
+        ]
+        assert by_id[reminder_ids[0]].twilio_message_sid.startswith("SM")
+        assert by_id[reminder_ids[0]].twilio_status == "delivered"
+        assert by_id[reminder_ids[4]].twilio_error_code == "no_recipient"
+    finally:
+        db.close()
+    
+    # Callbacks without a valid signature are rejected
+    response = client.post(
+        "/reminders/webhooks/twilio/status",
+        data={"MessageSid": by_id[reminder_ids[0]].twilio_message_sid, "MessageStatus": "undelivered"},
+        headers={"X-Twilio-Signature": "forged"}
+    )
+    assert response.status_code == 403
+
+
+def test_twilio_status_callback_requires_token_and_signs_public_url(monkeypatch):
+    """Callbacks are refused without an auth token and verified against the configured public URL"""
+    from app.config.settings import settings
+    from app.reminders.adapters import twilio_signature
+    
+    reminder_id = seed_reminders([datetime.now()])[0]
+    db = TestingSessionLocal()
+    try:
+        reminder = db.query(Reminder).get(reminder_id)
+        reminder.status = ReminderStatusEnum.sent
+        reminder.twilio_message_sid = "SMpublicurl"
+        db.commit()
+    finally:
+        db.close()
+    
+    params = {"MessageSid": "SMpublicurl", "MessageStatus": "delivered"}
+    public_url = "https://reminders.example.org/api/reminders/webhooks/twilio/status"
+    
+    # No token configured: nothing can be verified, so nothing is accepted
+    monkeypatch.setattr(settings, "TWILIO_AUTH_TOKEN", "")
+    response = client.post("/reminders/webhooks/twilio/status", data=params)
+    assert response.status_code == 403
+    
+    monkeypatch.setattr(settings, "TWILIO_AUTH_TOKEN", "callback-secret")
+    monkeypatch.setattr(settings, "TWILIO_STATUS_CALLBACK_URL", public_url)
+    
+    # Signed for the internal URL the proxy forwarded to: rejected
+    internal = twilio_signature("http://testserver/reminders/webhooks/twilio/status", params, "callback-secret")
+    response = client.post(
+        "/reminders/webhooks/twilio/status", data=params, headers={"X-Twilio-Signature": internal}
+    )
+    assert response.status_code == 403
+    
+    # Signed for the public URL Twilio posted to: accepted
+    response = client.post(
+        "/reminders/webhooks/twilio/status", data=params,
+        headers={"X-Twilio-Signature": twilio_signature(public_url, params, "callback-secret")}
+    )
+    assert response.status_code == 204
+    
+    db = TestingSessionLocal()
+    try:
+        assert db.query(Reminder).get(reminder_id).status == ReminderStatusEnum.delivered
+    finally:
+        db.close()
+
+
+def test_http_transport_bounds_concurrency_and_rate_limits_per_provider():
+    """In-flight sends never exceed the cap and each provider is held to its token bucket"""
+    import asyncio
+    import time
+    import httpx
+    from app.reminders.dispatcher import ClaimedReminder
+    from app.reminders.http_transport import AsyncNotificationTransport, TokenBucket
+    
+    in_flight = {"now": 0, "peak": 0}
+    
+    async def provider(request):
+        in_flight["now"] += 1
+        in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        await asyncio.sleep(0.02)
+        in_flight["now"] -= 1
+        if request.url.path.endswith("Messages.json"):
+            return httpx.Response(429, json={"code": 20429, "message": "Too Many Requests"})
+        return httpx.Response(200, json={"name": "projects/fake/messages/1"})
+    
+    def reminder(reminder_id, channel):
+        return ClaimedReminder(reminder_id, 1, 1, channel, datetime.now(), "Take your medication")
+    
+    transport = AsyncNotificationTransport(
+        rate_limits={"push": 1000}, max_in_flight=5, http_transport=httpx.MockTransport(provider)
+    )
+    reminders = [reminder(index, "push") for index in range(40)] + [reminder(99, "sms")]
+    contacts = {1: None}
+    
+    async def send():
+        try:
+            return await transport.send_many(reminders, contacts)
+        finally:
+            await transport.aclose()
+    
+    results = asyncio.run(send())
+    assert in_flight["peak"] == 5
+    assert all(result.ok for result in results[:40])
+    # No SMS number on file: failed without a request
+    assert results[40].error_code == "no_recipient"
+    
+    async def drain(bucket, count):
+        started = time.monotonic()
+        for _ in range(count):
+            await bucket.acquire()
+        return time.monotonic() - started
+    
+    # A burst of one, then 50 per second: 11 tokens take at least 0.2s
+    assert asyncio.run(drain(TokenBucket(50, capacity=1), 11)) >= 0.19
+
+
+# ==================== RETRY & DEAD LETTER TESTS ====================
+
+def test_failed_reminders_back_off_then_dead_letter():
+    """Retries wait out a growing, jittered delay, stop at max_retries and land in the dead-letter view"""
+    import random
+    from app.config.settings import settings
+    from app.reminders.dispatcher import ReminderDispatcher
+    from app.reminders.retry import RetryScheduler
+    from app.reminders.services import ReminderService
+    from app.reminders.transport import StubTransport
+    
+    class NoRecipientTransport(StubTransport):
+        """Fails every reminder; the second one as if its patient had no address"""
+        def send_batch(self, reminders):
+            return [
+                result._replace(error_code="no_recipient") if result.reminder_id == reminder_ids[1] else result
+                for result in super().send_batch(reminders)
+            ]
+    
+    now = datetime.now().replace(microsecond=0)
+    reminder_ids = seed_reminders([now - timedelta(seconds=2), now - timedelta(seconds=1)])
+    clock = {"now": now}
+    dispatcher = ReminderDispatcher(
+        TestingSessionLocal, NoRecipientTransport(fail_ids=reminder_ids), worker_id="retry-worker",
+        lookahead_seconds=0, clock=lambda: clock["now"], retries=RetryScheduler(rng=random.Random(7))
+    )
+    
+    # A permanent error is dead-lettered at once; the other reminder is retried max_retries (3) times
+    delays = []
+    for attempt in range(1, 5):
+        assert dispatcher.poll() == (2 if attempt == 1 else 1)
+        assert dispatcher.fire_due() == (2 if attempt == 1 else 1)
+        db = TestingSessionLocal()
+        try:
+            reminder = db.query(Reminder).get(reminder_ids[0])
+            assert reminder.retry_count == attempt
+            if attempt == 1:
+                # Not offered to pending-reminder readers until its next attempt time
+                assert reminder_ids[0] not in [r.id for r in ReminderService(db).get_pending_reminders()]
+            if attempt < 4:
+                assert reminder.status == ReminderStatusEnum.pending
+                delays.append((reminder.next_attempt_at - clock["now"]).total_seconds())
+                # Too early: nothing to claim yet
+                assert dispatcher.poll() == 0
+                clock["now"] = reminder.next_attempt_at
+            else:
+                assert reminder.status == ReminderStatusEnum.failed and reminder.next_attempt_at is None
+        finally:
+            db.close()
+    
+    base = settings.REMINDER_RETRY_BASE_SECONDS
+    for attempt, delay in enumerate(delays, start=1):
+        assert base * 2 ** (attempt - 1) / 2 <= delay <= base * 2 ** (attempt - 1)
+    
+    admin_token = get_admin_token()
+    response = client.get(
+        "/reminders/admin/dead-letters",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 200
+    summary = response.json()
+    assert summary["total"] == 2
+    assert {(group["error_code"], group["count"]) for group in summary["error_codes"]} == {("stub", 1), ("no_recipient", 1)}
+    assert {reminder["id"] for reminder in summary["reminders"]} == set(reminder_ids)
+    
+    response = client.get(
+        "/reminders/admin/dead-letters?error_code=no_recipient",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert [reminder["retry_count"] for reminder in response.json()["reminders"]] == [1]
+    
+    patient_token, _ = get_patient_token()
+    response = client.get("/reminders/admin/dead-letters", headers={"Authorization": f"Bearer {patient_token}"})
+    assert response.status_code == 403
+
+
+def test_undelivered_status_callback_is_retried_unless_permanent(monkeypatch):
+    """An undelivered callback reschedules the reminder; a permanent carrier error dead-letters it"""
+    from app.config.settings import settings
+    from app.reminders.adapters import twilio_signature
+    
+    monkeypatch.setattr(settings, "TWILIO_AUTH_TOKEN", "callback-secret")
+    monkeypatch.setattr(settings, "TWILIO_STATUS_CALLBACK_URL", "http://testserver/reminders/webhooks/twilio/status")
+    
+    reminder_ids = seed_reminders([datetime.now() - timedelta(minutes=1), datetime.now()])
+    db = TestingSessionLocal()
+    try:
+        for index, reminder in enumerate(db.query(Reminder).filter(Reminder.id.in_(reminder_ids)).order_by(Reminder.id)):
+            reminder.status = ReminderStatusEnum.sent
+            reminder.twilio_message_sid = f"SMcallback{index}"
+        db.commit()
+    finally:
+        db.close()
+    
+    def callback(params):
+        signature = twilio_signature(settings.TWILIO_STATUS_CALLBACK_URL, params, "callback-secret")
+        response = client.post(
+            "/reminders/webhooks/twilio/status", data=params, headers={"X-Twilio-Signature": signature}
+        )
+        assert response.status_code == 204
+    
+    # 30003: handset unreachable, worth another try
+    callback({"MessageSid": "SMcallback0", "MessageStatus": "undelivered", "ErrorCode": "30003"})
+    # 30005: unknown destination, a resend cannot help
+    callback({"MessageSid": "SMcallback1", "MessageStatus": "undelivered", "ErrorCode": "30005"})
+    
+    db = TestingSessionLocal()
+    try:
+        retried, dead = db.query(Reminder).get(reminder_ids[0]), db.query(Reminder).get(reminder_ids[1])
+        assert retried.status == ReminderStatusEnum.pending
+        assert retried.retry_count == 1 and retried.twilio_error_code == "30003"
+        assert retried.next_attempt_at > retried.last_retry_at
+        assert dead.status == ReminderStatusEnum.failed
+        assert dead.next_attempt_at is None and dead.twilio_error_code == "30005"
+    finally:
+        db.close()
+
+
+def test_provider_outage_retries_are_coalesced_and_paced():
+    """A burst of throttled sends shares one resume time and is released at the provider's rate"""
+    import random
+    from collections import Counter
+    from app.reminders.dispatcher import ClaimedReminder
+    from app.reminders.retry import RetryScheduler
+    from app.reminders.transport import SendResult
+    
+    now = datetime.now().replace(microsecond=0)
+    scheduler = RetryScheduler(outage_threshold=20, rates={"twilio": 100, "email": 100}, rng=random.Random(3))
+    sms = [ClaimedReminder(index, 1, 1, "sms", now, "Take it") for index in range(2000)]
+    emails = [ClaimedReminder(5000 + index, 1, 1, "email", now, "Take it") for index in range(10)]
+    results = [SendResult(reminder.id, False, error_code="20429") for reminder in sms]
+    results += [SendResult(reminder.id, True) for reminder in emails]
+    
+    retry_at = scheduler.schedule(sms + emails, results, now)
+    assert len(retry_at) == 2000
+    assert scheduler.in_outage("twilio") and not scheduler.in_outage("email")
+    
+    # The first failures before the outage was recognised back off on their own
+    coalesced = sorted(retry_at[reminder.id] for reminder in sms[19:])
+    resume_at = coalesced[0]
+    assert now + timedelta(seconds=15) <= resume_at <= now + timedelta(seconds=30)
+    # Then one retry per 1/rate seconds: never more than the provider's rate in any second
+    per_second = Counter(int((moment - resume_at).total_seconds()) for moment in coalesced)
+    assert max(per_second.values()) <= 100
+    assert coalesced[-1] - resume_at >= timedelta(seconds=19)
+    
+    # Still failing after the pause: the next pause is longer
+    later = resume_at + timedelta(seconds=1)
+    retry = scheduler.schedule(sms[:20], [SendResult(reminder.id, False, error_code="timeout") for reminder in sms[:20]], later)
+    assert min(retry.values()) >= later + timedelta(seconds=30)
+    
+    # A success once the pause is over ends the outage
+    scheduler.schedule(sms[:1], [SendResult(0, True)], max(retry.values()))
+    assert not scheduler.in_outage("twilio")